@@ -0,0 +1,156 @@
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Optional, Tuple
+
+import metrics
+
+
+class AdmissionRejected(Exception):
+    """A request was shed; carries the HTTP status and Retry-After to send."""
+
+    def __init__(self, status: int, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.status = status
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """Classic token bucket: `rate` tokens per second, up to `capacity`."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def take(self, now: Optional[float] = None) -> Tuple[bool, float]:
+        """
+        Try to take one token.
+
+        Returns:
+            (allowed, seconds until a token is available)
+        """
+        now = time.monotonic() if now is None else now
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True, 0.0
+        return False, (1 - self.tokens) / self.rate if self.rate > 0 else float("inf")
+
+
+class AdmissionController:
+    """
+    Bounds the work in flight for an endpoint.
+
+    - At most `max_in_flight` requests run at once.
+    - Up to `max_queue` more wait, each for at most `queue_timeout` seconds.
+    - Each client gets its own token bucket (`rate` per second, `burst` deep).
+    Everything else is rejected immediately, so an overloaded upstream turns
+    into fast 429/503 responses instead of unbounded latency.
+    """
+
+    def __init__(self, max_in_flight: int = 4, max_queue: int = 8, queue_timeout: float = 2.0,
+                 rate: float = 1.0, burst: float = 5.0, max_clients: int = 10000, name: str = "chat"):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self.name = name
+        self.in_flight = 0
+        self.waiting = 0
+        self._buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        self._condition = threading.Condition()
+
+    @classmethod
+    def from_env(cls, name: str = "chat") -> "AdmissionController":
+        """Build a controller from CHAT_* environment variables."""
+        return cls(
+            max_in_flight=int(os.environ.get("CHAT_MAX_IN_FLIGHT", 4)),
+            max_queue=int(os.environ.get("CHAT_MAX_QUEUE", 8)),
+            queue_timeout=float(os.environ.get("CHAT_QUEUE_TIMEOUT", 2.0)),
+            rate=float(os.environ.get("CHAT_RATE_PER_CLIENT", 1.0)),
+            burst=float(os.environ.get("CHAT_BURST_PER_CLIENT", 5)),
+            name=name,
+        )
+
+    def _publish(self):
+        metrics.set_gauge(f"{self.name}.in_flight", self.in_flight)
+        metrics.set_gauge(f"{self.name}.queue_depth", self.waiting)
+
+    def _shed(self, status: int, reason: str, retry_after: float):
+        metrics.increment(f"{self.name}.shed", reason=reason)
+        raise AdmissionRejected(status, reason, max(1, math.ceil(retry_after)))
+
+    def _check_rate(self, client_id: str):
+        bucket = self._buckets.get(client_id)
+        if bucket is None:
+            bucket = TokenBucket(self.rate, self.burst)
+            self._buckets[client_id] = bucket
+            if len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(client_id)
+        allowed, wait = bucket.take()
+        if not allowed:
+            self._shed(429, "rate_limited", wait)
+
+    def acquire(self, client_id: str):
+        """
+        Admit a request or raise AdmissionRejected.
+
+        Args:
+            client_id: Key for the per-client token bucket (e.g. client IP)
+        """
+        with self._condition:
+            self._check_rate(client_id)
+
+            if self.in_flight < self.max_in_flight:
+                self.in_flight += 1
+                self._publish()
+                metrics.increment(f"{self.name}.admitted")
+                return
+
+            if self.waiting >= self.max_queue:
+                self._shed(503, "queue_full", self.queue_timeout)
+
+            self.waiting += 1
+            self._publish()
+            deadline = time.monotonic() + self.queue_timeout
+            try:
+                while self.in_flight >= self.max_in_flight:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._shed(503, "queue_timeout", self.queue_timeout)
+                    self._condition.wait(remaining)
+            finally:
+                self.waiting -= 1
+                self._publish()
+
+            self.in_flight += 1
+            self._publish()
+            metrics.increment(f"{self.name}.admitted")
+            metrics.increment(f"{self.name}.queued")
+
+    def release(self):
+        """Mark an admitted request as finished and wake one waiter."""
+        with self._condition:
+            self.in_flight -= 1
+            self._publish()
+            self._condition.notify()
+
+    @contextmanager
+    def admit(self, client_id: str):
+        """Context manager around acquire()/release()."""
+        self.acquire(client_id)
+        try:
+            yield
+        finally:
+            self.release()
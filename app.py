@@ -1,10 +1,21 @@
 import os
-from flask import Flask, request, jsonify
+import gc
+import hashlib
+import hmac
+import sys
+from flask import Blueprint, Flask, current_app, g, request, jsonify
 from dotenv import load_dotenv
 from flask_cors import CORS
+from werkzeug.exceptions import HTTPException, RequestedRangeNotSatisfiable
+from werkzeug.wsgi import wrap_file
 import logging
-from langchain_core.messages import HumanMessage
-from sayyes_agent import process_message  # import the process_message function
+import metrics
+from admission import AdmissionController, AdmissionRejected
+from compression import cache_compressed, init_compression, etag_variants
+from profiling import init_profiling
+from memory_diagnostics import MemoryDiagnostics, object_counts, rss_bytes, session_memory
+from catalog import start_catalog_reloader, catalog_stats, get_catalog
+from image_proxy import ImageProxy, ProxyError
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -13,18 +24,71 @@ logger = logging.getLogger(__name__)
 # Load environment variables
 load_dotenv()
 
-# Initialize Flask app
-app = Flask(__name__)
-CORS(app)  # Enable CORS for all routes
+# Routes are registered on the app built by create_app()
+api = Blueprint("api", __name__)
 
 # Get port from environment variable or default to 8080
 port = int(os.environ.get('PORT', 8080))
 
-@app.route('/api/chat', methods=['POST'])
+# Largest chat request body accepted; the state grows with the conversation
+MAX_CHAT_BODY_BYTES = int(os.environ.get('CHAT_MAX_BODY_BYTES', 256 * 1024))
+
+# Cache lifetime for unversioned catalog pages; versioned URLs are immutable
+IMAGES_MAX_AGE = int(os.environ.get('IMAGES_MAX_AGE', 3600))
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# Browser cache lifetime of images served by /api/img
+IMAGE_PROXY_MAX_AGE = int(os.environ.get('IMAGE_PROXY_MAX_AGE', 30 * 24 * 3600))
+
+# Bearer token for /api/admin/*; unset disables those endpoints
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN')
+
+# Longest wait between the two snapshots of /api/admin/memory/diff?interval=
+MAX_MEMORY_DIFF_INTERVAL = float(os.environ.get('MAX_MEMORY_DIFF_INTERVAL', 60))
+
+# Reverse proxies in front of the app that append to X-Forwarded-For (1 on
+# Render), 0 when clients connect directly
+TRUSTED_PROXY_COUNT = int(os.environ.get('TRUSTED_PROXY_COUNT', 1))
+
+def client_id() -> str:
+    """
+    Identify the caller for rate limiting.
+
+    Clients can put anything at the start of X-Forwarded-For, so the address
+    is the hop appended by the outermost trusted proxy, counting from the end.
+    Without enough hops the peer address is used.
+    """
+    hops = [hop.strip() for hop in request.headers.get('X-Forwarded-For', '').split(',') if hop.strip()]
+    if 0 < TRUSTED_PROXY_COUNT <= len(hops):
+        return hops[-TRUSTED_PROXY_COUNT]
+    return request.remote_addr or 'unknown'
+
+@api.route('/api/chat', methods=['POST'])
 def chat():
     """
     Endpoint to handle chat requests from the landing page.
+    
+    Requests pass admission control first: oversized bodies are rejected
+    before parsing, and when capacity runs out the client gets a fast
+    429/503 with Retry-After instead of waiting behind a slow upstream.
     """
+    if request.content_length is not None and request.content_length > MAX_CHAT_BODY_BYTES:
+        metrics.increment("chat.shed", reason="body_too_large")
+        logger.warning(f"Rejected chat body of {request.content_length} bytes")
+        return jsonify({"error": "Request body too large"}), 413
+    
+    try:
+        with current_app.extensions["admission"].admit(client_id()):
+            return handle_chat()
+    except AdmissionRejected as e:
+        logger.warning(f"Shed chat request from {client_id()}: {e.reason}")
+        response = jsonify({"error": "Too many requests" if e.status == 429 else "Server busy, please retry"})
+        response.status_code = e.status
+        response.headers["Retry-After"] = str(e.retry_after)
+        return response
+
+def handle_chat():
+    """Parse, validate and answer an admitted chat request."""
     try:
         data = request.get_json()
         if not data:
@@ -72,30 +136,204 @@ def chat():
                 logger.info("Using empty string as fallback")
 
         state = data.get("state", None)
-        
+
+        # The session id keys per-session server state such as prefetched carousels
+        session_id = data.get("session_id")
+        if session_id and not (isinstance(state, dict) and state.get("session_id")):
+            state = dict(state if isinstance(state, dict) else {}, session_id=str(session_id))
+
         # Debug logging
         logger.info(f"[DEBUG] Extracted message: {message}")
         logger.info(f"[DEBUG] Extracted state: {state}")
         
-        # Process the message
-        result = process_message(message, state)
+        # Process the message (the agent and its LLM client load on first use)
+        from sayyes_agent import process_message, state_from_json, state_to_json
+        g.planning_stage = state.get("planning_stage", "initial") if isinstance(state, dict) else "initial"
+        result = process_message(message, state_from_json(state))
+        g.session_id = (result.get("state") or {}).get("session_id")
+        result["state"] = state_to_json(result.get("state"))
         
         # Return the result
         return jsonify(result), 200
 
+    except HTTPException:
+        # e.g. 413 from MAX_CONTENT_LENGTH while reading a chunked body
+        raise
     except Exception as e:
         logger.error(f"Error processing chat request: {str(e)}")
         return jsonify({"error": "Internal server error"}), 500
 
-@app.route('/api/health', methods=['GET'])
+@api.route('/api/images/<category>', methods=['GET'])
+@cache_compressed
+def images(category):
+    """
+    Read-only catalog page for a category, cacheable by browsers and the CDN.
+    
+    Query parameters `style` and `location` filter the items. The strong ETag
+    changes with the catalog version, so revalidation is a cheap 304. URLs
+    carrying the current version as `v` never change and are cached as
+    immutable.
+    """
+    from image_utils import CATEGORY_LISTS, get_images_by_category
+    
+    category = category.lower()
+    if category not in CATEGORY_LISTS:
+        return jsonify({"error": f"Unknown category: {category}"}), 404
+    
+    style = request.args.get('style') or None
+    location = request.args.get('location') or None
+    version = get_catalog().version
+    digest = hashlib.sha1(repr((category, style, location)).encode()).hexdigest()[:12]
+    etag = f"{version}-{digest}"
+    
+    if request.args.get('v') == version:
+        cache_control = IMMUTABLE_CACHE_CONTROL
+    else:
+        cache_control = f"public, max-age={IMAGES_MAX_AGE}, stale-while-revalidate={IMAGES_MAX_AGE * 24}"
+    
+    if any(request.if_none_match.contains(tag) for tag in etag_variants(etag)):
+        metrics.increment("images.not_modified", category=category)
+        response = current_app.response_class(status=304)
+    else:
+        metrics.increment("images.served", category=category)
+        result = get_images_by_category(category, style=style, location=location)
+        result["version"] = version
+        response = jsonify(result)
+    
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = cache_control
+    return response
+
+@api.route('/api/img', methods=['GET'])
+def image_proxy():
+    """
+    Third-party image (`url` query parameter) served from the local cache.
+    
+    Only URLs signed by proxied_url (`sig` parameter) are fetched, so this
+    is not an open proxy. The first request downloads the image; later ones
+    are file responses with Range and conditional request support and a
+    long cache lifetime.
+    """
+    proxy = current_app.extensions["image_proxy"]
+    if not proxy.secret:
+        return jsonify({"error": "Not found"}), 404
+    url = request.args.get('url')
+    if not url:
+        return jsonify({"error": "Missing url parameter"}), 400
+    if not proxy.verify(url, request.args.get('sig')):
+        return jsonify({"error": "Invalid signature"}), 403
+    try:
+        cached = proxy.get(url)
+    except ProxyError as e:
+        return jsonify({"error": str(e)}), e.status
+    
+    # Served from the open file: eviction by another worker may unlink the path meanwhile
+    response = current_app.response_class(wrap_file(request.environ, cached.file), mimetype=cached.mimetype,
+                                          direct_passthrough=True)
+    response.content_length = cached.size
+    response.set_etag(cached.key)
+    try:
+        response = response.make_conditional(request.environ, accept_ranges=True, complete_length=cached.size)
+    except RequestedRangeNotSatisfiable:
+        cached.file.close()
+        raise
+    if response.status_code == 304:
+        cached.file.close()
+    response.headers["Cache-Control"] = f"public, max-age={IMAGE_PROXY_MAX_AGE}, immutable"
+    response.headers["X-Content-Type-Options"] = "nosniff"
+    return response
+
+@api.route('/api/health', methods=['GET'])
 def health_check():
     """Health check endpoint for Render.com"""
     return jsonify({
         "status": "healthy",
-        "chat_available": True
+        "chat_available": True,
+        "catalog": catalog_stats()
+    }), 200
+
+@api.route('/api/metrics', methods=['GET'])
+def metrics_endpoint():
+    """In-process metrics of the worker serving this request"""
+    return jsonify(metrics.snapshot()), 200
+
+def admin_denied():
+    """Error response unless the request carries the admin token (404 when admin endpoints are off)."""
+    if not ADMIN_TOKEN:
+        return jsonify({"error": "Not found"}), 404
+    scheme, _, supplied = request.headers.get('Authorization', '').partition(' ')
+    if scheme.lower() != 'bearer':
+        supplied = ''
+    if not hmac.compare_digest(supplied.strip(), ADMIN_TOKEN):
+        return jsonify({"error": "Unauthorized"}), 401
+    return None
+
+@api.route('/api/admin/memory', methods=['GET'])
+def memory_report():
+    """
+    Memory of the worker serving this request: RSS, live LangChain messages,
+    compiled graphs and chat logs, and the average bytes kept per session.
+    `?collect=1` runs a full garbage collection first.
+    """
+    denied = admin_denied()
+    if denied:
+        return denied
+    if request.args.get('collect') == '1':
+        gc.collect()
+    agent = sys.modules.get('sayyes_agent')
+    return jsonify({
+        "pid": os.getpid(),
+        "rss_bytes": rss_bytes(),
+        "tracemalloc": current_app.extensions["memory"].status(),
+        "objects": object_counts(),
+        # The agent loads on the first chat request; before that no session state exists
+        "sessions": session_memory(agent.session_stores()) if agent else None,
     }), 200
 
-@app.route('/', methods=['GET'])
+@api.route('/api/admin/memory/snapshots', methods=['POST', 'DELETE'])
+def memory_snapshots():
+    """POST takes a tracemalloc snapshot (starting tracing); DELETE stops tracing and drops them."""
+    denied = admin_denied()
+    if denied:
+        return denied
+    diagnostics = current_app.extensions["memory"]
+    if request.method == 'DELETE':
+        diagnostics.stop()
+        return jsonify(diagnostics.status()), 200
+    return jsonify(diagnostics.take_snapshot()), 201
+
+@api.route('/api/admin/memory/diff', methods=['GET'])
+def memory_diff():
+    """
+    Allocation sites that grew between two snapshots (`from`, `to`; default
+    the last two), grouped by `group` (lineno, filename or traceback).
+
+    Snapshots are kept per worker, so a diff only finds snapshots taken by
+    the worker that serves it. `?interval=<seconds>` takes both snapshots in
+    this request instead, waiting up to MAX_MEMORY_DIFF_INTERVAL between them.
+    """
+    denied = admin_denied()
+    if denied:
+        return denied
+    diagnostics = current_app.extensions["memory"]
+    kept = diagnostics.snapshots()
+    try:
+        limit = int(request.args.get('limit', 25))
+        if 'interval' in request.args:
+            interval = float(request.args['interval'])
+            if not 0 <= interval <= MAX_MEMORY_DIFF_INTERVAL:
+                raise ValueError(f"interval must be between 0 and {MAX_MEMORY_DIFF_INTERVAL} seconds")
+            return jsonify(diagnostics.measure(interval, request.args.get('group', 'lineno'), limit)), 200
+        first = int(request.args.get('from', kept[-2] if len(kept) > 1 else 0))
+        second = int(request.args.get('to', kept[-1] if kept else 0))
+        return jsonify(diagnostics.diff(first, second, request.args.get('group', 'lineno'), limit)), 200
+    except KeyError as e:
+        return jsonify({"error": f"Unknown snapshot {e} in worker {os.getpid()}",
+                        "pid": os.getpid(), "snapshots": kept}), 404
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+@api.route('/', methods=['GET'])
 def home():
     """Root endpoint"""
     return jsonify({
@@ -104,7 +342,40 @@ def home():
         "environment": "production"
     }), 200
 
+def create_app(start_reloader: bool = True) -> Flask:
+    """
+    Create and configure the Flask app.
+    
+    Importing this module stays cheap: the agent, LangChain and the OpenAI
+    client are only loaded by the first chat request.
+    
+    Args:
+        start_reloader: Start the catalog hot reload thread. Pre-fork servers
+            pass False and start it in each worker instead.
+    """
+    app = Flask(__name__)
+    # Also enforced for chunked bodies that don't declare a Content-Length
+    app.config["MAX_CONTENT_LENGTH"] = MAX_CHAT_BODY_BYTES
+    CORS(app)  # Enable CORS for all routes
+    app.register_blueprint(api)
+    app.extensions["admission"] = AdmissionController.from_env("chat")
+    # gzip/brotli/zstd by Accept-Encoding for JSON responses
+    init_compression(app)
+    # Opt-in per-request profiles (X-Profile header or PROFILE_SAMPLE_RATE)
+    init_profiling(app)
+    # Disk-cached third-party images for /api/img
+    app.extensions["image_proxy"] = ImageProxy.from_env()
+    # tracemalloc snapshots for /api/admin/memory/*
+    app.extensions["memory"] = MemoryDiagnostics()
+    
+    # Pick up catalog changes in the background without restarting
+    if start_reloader:
+        start_catalog_reloader()
+    
+    return app
+
 if __name__ == '__main__':
+    app = create_app()
     logger.info(f"Starting server on port {port}")
     logger.info("Chat functionality: ENABLED (production mode)")
-    app.run(host='0.0.0.0', port=port) 
\ No newline at end of file
+    app.run(host='0.0.0.0', port=port)
\ No newline at end of file
@@ -1,96 +1,21 @@
 import os
 from dotenv import load_dotenv
-from urllib.parse import quote
 from typing import List, Dict, Optional
 from image_utils import get_images_by_category, clean_title, clean_description
+from catalog import get_catalog
 
 # Load environment variables
 load_dotenv()
 
 def list_venue_images():
-    # Hardcoded or fetched from a file/blob listing
-    filenames = [
-        "eventsbomb_09464_A_very_elegant_and_luxurious.png",
-        "amadeowang99_French_modern_wedding.png",
-        "amadeowang99_Luxury_wedding_venue.png",
-        "amadeowang99_Rustic_wedding_venue.png",
-        "amadeowang99_Modern_wedding_venue.png"
-    ]
-    folder = "wedding venues"
-    images = [
-        {
-            "image": f"https://{os.getenv('VERCEL_PROJECT_ID')}.public.blob.vercel-storage.com/{quote(folder)}/{quote(filename)}",
-            "title": clean_title(filename),
-            "description": "Elegant wedding venue in Austin",
-            "location": "Austin, TX",
-            "price": "$$",
-            "tags": ["Garden", "Outdoor"],
-        }
-        for filename in filenames
-    ]
-    
-    # Print each image URL for debugging
-    for image in images:
-        print("Returning image URL:", image["image"])
-    
-    return images
+    # Served from the compiled catalog shared with image_utils
+    return get_catalog().category_items("venues")
 
 def list_dress_images():
-    filenames = [
-        "alexb_79_Classic_Wedding_Dress.png",
-        "amadeowang99_Modern_Wedding_Dress.png",
-        "amadeowang99_Luxury_Wedding_Dress.png",
-        "amadeowang99_Rustic_Wedding_Dress.png",
-        "amadeowang99_Bohemian_Wedding_Dress.png"
-    ]
-    folder = "wedding dresses"
-    return [
-        {
-            "image": f"https://{os.getenv('VERCEL_PROJECT_ID')}.public.blob.vercel-storage.com/{quote(folder)}/{quote(filename)}",
-            "title": clean_title(filename),
-            "description": "Beautiful wedding dress",
-            "designer": "Designer Collection",
-            "price": "$$$",
-            "tags": ["Dress", "Wedding"],
-        }
-        for filename in filenames
-    ]
+    return get_catalog().category_items("dresses")
 
 def list_hairstyle_images():
-    filenames = [
-        "alexb_79_Classic_Wedding_Hairstyle.png",
-        "amadeowang99_Modern_Wedding_Hairstyle.png",
-        "amadeowang99_Luxury_Wedding_Hairstyle.png",
-        "amadeowang99_Rustic_Wedding_Hairstyle.png",
-        "amadeowang99_Bohemian_Wedding_Hairstyle.png"
-    ]
-    folder = "wedding hairstyles"
-    return [
-        {
-            "image": f"https://{os.getenv('VERCEL_PROJECT_ID')}.public.blob.vercel-storage.com/{quote(folder)}/{quote(filename)}",
-            "title": clean_title(filename),
-            "description": "Stunning wedding hairstyle",
-            "tags": ["Hairstyle", "Wedding"],
-        }
-        for filename in filenames
-    ]
+    return get_catalog().category_items("hairstyles")
 
 def list_cake_images():
-    filenames = [
-        "alexb_79_Classic_Wedding_Cake.png",
-        "amadeowang99_Modern_Wedding_Cake.png",
-        "amadeowang99_Luxury_Wedding_Cake.png",
-        "amadeowang99_Rustic_Wedding_Cake.png",
-        "amadeowang99_Bohemian_Wedding_Cake.png"
-    ]
-    folder = "wedding cakes"
-    return [
-        {
-            "image": f"https://{os.getenv('VERCEL_PROJECT_ID')}.public.blob.vercel-storage.com/{quote(folder)}/{quote(filename)}",
-            "title": clean_title(filename),
-            "description": "Delicious wedding cake",
-            "price": "$$$",
-            "tags": ["Cake", "Wedding"],
-        }
-        for filename in filenames
-    ] 
\ No newline at end of file
+    return get_catalog().category_items("cakes")
@@ -0,0 +1,407 @@
+import argparse
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import quote
+
+import numpy as np
+
+# Source of truth for every catalog item, compiled into CATALOG_DIR at build time
+CATALOG_SOURCE = os.environ.get("CATALOG_SOURCE", os.path.join("data", "catalog.json"))
+CATALOG_DIR = os.environ.get("CATALOG_DIR", os.path.join("build", "catalog"))
+CATALOG_FORMAT = 2
+
+# The one place blob URLs are built. The artifact stores only the path, the
+# host comes from VERCEL_PROJECT_ID when the catalog is opened.
+BLOB_HOST = "https://{project_id}.public.blob.vercel-storage.com"
+
+# Columns stored in the artifact, each as a UTF-8 blob plus an offsets array
+COLUMNS = ["category", "image", "title", "description", "location", "price", "designer", "tags"]
+TAG_SEPARATOR = "|"
+
+# Seconds between checks of the catalog source for changes, 0 disables hot reload
+CATALOG_RELOAD_INTERVAL = float(os.environ.get("CATALOG_RELOAD_INTERVAL", "30"))
+
+# Compiled catalog, memory-mapped on first use. Reloads replace the reference,
+# so readers never need a lock.
+_CATALOG: Optional["Catalog"] = None
+_RELOADER: Optional["CatalogReloader"] = None
+
+
+def blob_host(project_id: Optional[str] = None) -> str:
+    """Blob storage host for `project_id`, defaulting to VERCEL_PROJECT_ID, which must be set."""
+    project_id = project_id or os.getenv("VERCEL_PROJECT_ID")
+    if not project_id:
+        raise ValueError("VERCEL_PROJECT_ID environment variable is not set")
+    return BLOB_HOST.format(project_id=project_id)
+
+
+def blob_path(folder: str, filename: str) -> str:
+    return f"{quote(folder)}/{quote(filename)}"
+
+
+def blob_url(folder: str, filename: str, project_id: Optional[str] = None) -> str:
+    """Build the public blob storage URL for a catalog image."""
+    return f"{blob_host(project_id)}/{blob_path(folder, filename)}"
+
+
+def _compile_rows(source: Dict) -> List[Dict[str, str]]:
+    """Flatten the source file into one row per item, grouped by category."""
+    from image_utils import clean_title
+
+    rows = []
+    for category, spec in source["categories"].items():
+        folder = spec["folder"]
+        for item in spec["items"]:
+            rows.append({
+                "category": category,
+                "image": blob_path(folder, item["filename"]),
+                "title": item.get("title") or clean_title(item["filename"]),
+                "description": item.get("description", ""),
+                "location": item.get("location", ""),
+                "price": item.get("price", ""),
+                "designer": item.get("designer", ""),
+                "tags": TAG_SEPARATOR.join(item.get("tags", [])),
+            })
+    return rows
+
+
+def build_catalog(source_path: str = CATALOG_SOURCE, output_dir: str = CATALOG_DIR) -> str:
+    """
+    Compile the catalog source into a versioned columnar artifact.
+
+    Each build is written to <output_dir>/<version>/ and the CURRENT pointer is
+    swapped atomically, so running workers never see a half-written catalog.
+    Image URLs are stored without their host, so the artifact doesn't depend
+    on the environment it was built in.
+
+    Args:
+        source_path: Path to the catalog source JSON
+        output_dir: Directory holding the compiled versions
+
+    Returns:
+        The version string of the compiled catalog
+    """
+    with open(source_path, "rb") as f:
+        raw = f.read()
+    rows = _compile_rows(json.loads(raw))
+    version = _source_version(raw)
+
+    version_dir = os.path.join(output_dir, version)
+    if not os.path.exists(os.path.join(version_dir, "manifest.json")):
+        os.makedirs(output_dir, exist_ok=True)
+        staging_dir = tempfile.mkdtemp(prefix=".build-", dir=output_dir)
+        # mkdtemp is private to the builder; workers may run as another user
+        os.chmod(staging_dir, 0o755)
+        for column in COLUMNS:
+            encoded = [row[column].encode("utf-8") for row in rows]
+            offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+            offsets[1:] = np.cumsum([len(value) for value in encoded])
+            data = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+            np.save(os.path.join(staging_dir, f"{column}.data.npy"), data)
+            np.save(os.path.join(staging_dir, f"{column}.offsets.npy"), offsets)
+
+        categories: Dict[str, List[int]] = {}
+        for index, row in enumerate(rows):
+            start, _ = categories.get(row["category"], [index, index])
+            categories[row["category"]] = [start, index + 1]
+
+        with open(os.path.join(staging_dir, "manifest.json"), "w") as f:
+            json.dump({
+                "format": CATALOG_FORMAT,
+                "version": version,
+                "count": len(rows),
+                "columns": COLUMNS,
+                "categories": categories,
+            }, f, indent=2)
+        try:
+            os.rename(staging_dir, version_dir)
+        except OSError:
+            # Another process compiled the same version first
+            pass
+
+    if _read_current(output_dir) != version:
+        with tempfile.NamedTemporaryFile("w", dir=output_dir, delete=False) as f:
+            f.write(version)
+        os.chmod(f.name, 0o644)
+        os.replace(f.name, os.path.join(output_dir, "CURRENT"))
+    return version
+
+
+def _source_version(raw: bytes) -> str:
+    """Version of a compiled catalog: a hash of its source and the artifact format."""
+    digest = hashlib.sha256(raw)
+    digest.update(str(CATALOG_FORMAT).encode())
+    return digest.hexdigest()[:12]
+
+
+def _read_current(output_dir: str) -> Optional[str]:
+    """Version the CURRENT pointer refers to, or None before the first build."""
+    try:
+        with open(os.path.join(output_dir, "CURRENT")) as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return None
+
+
+def _is_stale(source_path: str, output_dir: str) -> bool:
+    """
+    Whether CURRENT is missing or was compiled from another source or format.
+
+    Checked at startup, so edits made while no server was watching the source
+    are picked up. Deployments that ship only the artifact have no source and
+    are never stale.
+    """
+    try:
+        with open(source_path, "rb") as f:
+            raw = f.read()
+    except FileNotFoundError:
+        return _read_current(output_dir) is None
+    return _read_current(output_dir) != _source_version(raw)
+
+
+class Catalog:
+    """
+    Read-only view over a compiled catalog version.
+
+    Columns are memory-mapped, so opening a catalog is O(1) and the pages are
+    shared by every worker process on the host. Image paths get the blob host
+    of `project_id` (default VERCEL_PROJECT_ID) when items are decoded.
+    """
+
+    def __init__(self, version_dir: str, project_id: Optional[str] = None):
+        with open(os.path.join(version_dir, "manifest.json")) as f:
+            manifest = json.load(f)
+        if manifest["format"] != CATALOG_FORMAT:
+            raise ValueError(f"Unsupported catalog format {manifest['format']} in {version_dir}")
+
+        self.blob_host = blob_host(project_id)
+        self.version: str = manifest["version"]
+        self.count: int = manifest["count"]
+        self.categories: Dict[str, List[int]] = manifest["categories"]
+        self._columns = {
+            column: (
+                np.load(os.path.join(version_dir, f"{column}.data.npy"), mmap_mode="r"),
+                np.load(os.path.join(version_dir, f"{column}.offsets.npy"), mmap_mode="r"),
+            )
+            for column in manifest["columns"]
+        }
+        self._items: Dict[str, List[Dict]] = {}
+
+    def __len__(self) -> int:
+        return self.count
+
+    def value(self, column: str, row: int) -> str:
+        """Decode a single cell."""
+        data, offsets = self._columns[column]
+        return data[offsets[row]:offsets[row + 1]].tobytes().decode("utf-8")
+
+    def item(self, row: int) -> Dict:
+        """Decode one row into the carousel item format used by the list_*_images functions."""
+        item = {
+            "image": f"{self.blob_host}/{self.value('image', row)}",
+            "title": self.value("title", row),
+            "description": self.value("description", row),
+        }
+        for column in ("location", "price", "designer"):
+            value = self.value(column, row)
+            if value:
+                item[column] = value
+        tags = self.value("tags", row)
+        item["tags"] = tags.split(TAG_SEPARATOR) if tags else []
+        return item
+
+    def category_items(self, category: str) -> List[Dict]:
+        """
+        Get every item in a category.
+
+        Args:
+            category: Catalog category (venues, dresses, hairstyles, cakes)
+
+        Returns:
+            List of item dictionaries, empty for unknown categories. Callers get
+            their own copies, so they may modify them freely.
+        """
+        items = self._items.get(category)
+        if items is None:
+            start, end = self.categories.get(category, [0, 0])
+            items = [self.item(row) for row in range(start, end)]
+            self._items[category] = items
+        return [dict(item, tags=list(item["tags"])) for item in items]
+
+
+def open_catalog(output_dir: str = CATALOG_DIR, project_id: Optional[str] = None) -> Catalog:
+    """Open the version the CURRENT pointer refers to."""
+    version = _read_current(output_dir)
+    if version is None:
+        raise FileNotFoundError(f"No compiled catalog in {output_dir}")
+    return Catalog(os.path.join(output_dir, version), project_id)
+
+
+def get_catalog() -> Catalog:
+    """
+    Get the process-wide catalog, opening it on first use.
+
+    If no compiled artifact exists (e.g. a fresh checkout), or it was compiled
+    from an older source, the source is compiled first so the catalog never
+    lags behind edits made while the server was down.
+    """
+    global _CATALOG
+    if _CATALOG is None:
+        if _is_stale(CATALOG_SOURCE, CATALOG_DIR):
+            print(f"Compiled catalog in {CATALOG_DIR} is missing or out of date, building it from {CATALOG_SOURCE}")
+            try:
+                build_catalog(CATALOG_SOURCE, CATALOG_DIR)
+            except OSError as e:
+                # e.g. a read-only image: serve what was compiled, if anything
+                if _read_current(CATALOG_DIR) is None:
+                    raise
+                print(f"Error rebuilding catalog, serving the compiled version: {e}")
+        _CATALOG = open_catalog(CATALOG_DIR)
+    return _CATALOG
+
+
+def _file_fingerprint(path: str) -> Optional[Tuple[int, int]]:
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+class CatalogReloader:
+    """
+    Background thread that swaps in a new catalog when its source changes.
+
+    It watches both the source file and the compiled CURRENT pointer, so a
+    worker picks up edits to data/catalog.json as well as builds made by
+    another process or by `python catalog.py build`. The new catalog is
+    compiled and warmed off to the side; the swap is a single reference
+    assignment.
+    """
+
+    def __init__(self, source_path: str = CATALOG_SOURCE, output_dir: str = CATALOG_DIR,
+                 interval: float = CATALOG_RELOAD_INTERVAL):
+        self.source_path = source_path
+        self.output_dir = output_dir
+        self.interval = interval
+        self.last_reload: Optional[Dict] = None
+        self._fingerprint = self._current_fingerprint()
+        if _is_stale(source_path, output_dir):
+            # Source edited while nothing was watching: rebuild on the first poll
+            self._fingerprint = (None, self._fingerprint[1])
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _current_fingerprint(self) -> Tuple:
+        return (
+            _file_fingerprint(self.source_path),
+            _file_fingerprint(os.path.join(self.output_dir, "CURRENT")),
+        )
+
+    def poll(self) -> bool:
+        """
+        Reload the catalog if its source changed since the last poll.
+
+        Returns:
+            True if a new catalog was swapped in
+        """
+        global _CATALOG
+        fingerprint = self._current_fingerprint()
+        if fingerprint == self._fingerprint:
+            return False
+
+        start = time.perf_counter()
+        try:
+            if fingerprint[0] != self._fingerprint[0]:
+                build_catalog(self.source_path, self.output_dir)
+            self._fingerprint = self._current_fingerprint()
+            version = _read_current(self.output_dir)
+            if version is None or (_CATALOG is not None and _CATALOG.version == version):
+                return False
+            catalog = Catalog(os.path.join(self.output_dir, version))
+            # Decode every category now so the first request after the swap doesn't pay for it
+            for category in catalog.categories:
+                catalog.category_items(category)
+        except Exception as e:
+            # Keep serving the current catalog and retry on the next change
+            print(f"Error reloading catalog from {self.source_path}: {e}")
+            self._fingerprint = fingerprint
+            return False
+
+        _CATALOG = catalog
+        self.last_reload = {
+            "version": catalog.version,
+            "items": len(catalog),
+            "duration_ms": round((time.perf_counter() - start) * 1000, 2),
+            "reloaded_at": time.time(),
+        }
+        print(f"Reloaded catalog {catalog.version}: {len(catalog)} items in {self.last_reload['duration_ms']} ms")
+        return True
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.poll()
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="catalog-reloader", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+def start_catalog_reloader(interval: float = CATALOG_RELOAD_INTERVAL) -> Optional[CatalogReloader]:
+    """
+    Start the process-wide catalog reloader.
+
+    Threads don't survive fork, so multi-process servers call this in each
+    worker after forking. Calling it again restarts a stopped reloader.
+
+    Args:
+        interval: Seconds between checks, 0 disables hot reload
+
+    Returns:
+        The running reloader, or None when disabled
+    """
+    global _RELOADER
+    if interval <= 0:
+        return None
+    get_catalog()
+    if _RELOADER is None:
+        _RELOADER = CatalogReloader(interval=interval)
+    _RELOADER.start()
+    return _RELOADER
+
+
+def catalog_stats() -> Dict:
+    """Current catalog version and the outcome of the last hot reload."""
+    catalog = get_catalog()
+    return {
+        "version": catalog.version,
+        "items": len(catalog),
+        "last_reload": _RELOADER.last_reload if _RELOADER else None,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compile the image catalog")
+    parser.add_argument("command", choices=["build"], help="Action to run")
+    parser.add_argument("--source", default=CATALOG_SOURCE, help="Catalog source JSON")
+    parser.add_argument("--output", default=CATALOG_DIR, help="Output directory")
+    args = parser.parse_args()
+
+    version = build_catalog(args.source, args.output)
+    # Read the manifest rather than open the catalog: image builds have no VERCEL_PROJECT_ID
+    with open(os.path.join(args.output, version, "manifest.json")) as f:
+        count = json.load(f)["count"]
+    print(f"Compiled catalog {version}: {count} items -> {args.output}")
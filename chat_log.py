@@ -0,0 +1,101 @@
+import threading
+from typing import Any, Iterable, Iterator, List, Sequence
+
+
+class _Store:
+    """Backing list shared by every ChatLog view of one conversation."""
+    __slots__ = ("items", "lock")
+
+    def __init__(self, items: List[Any]):
+        self.items = items
+        self.lock = threading.Lock()
+
+
+class ChatLog(Sequence):
+    """
+    Append-only message history with structural sharing.
+
+    A ChatLog is a view of the first `len(self)` entries of a shared list.
+    Appending to the newest view pushes onto that list in O(1); every older
+    view still sees exactly the messages it had, so state snapshots stay valid
+    without copying. Appending to an older view (a branch) copies its prefix
+    once into a new store.
+
+    It behaves like a read-only list plus `append`/`extend`/`+`, so LangGraph
+    state, `messages_to_dict` and the LLM clients accept it unchanged.
+    """
+    __slots__ = ("_store", "_length")
+
+    def __init__(self, messages: Iterable[Any] = ()):
+        self._store = _Store(list(messages))
+        self._length = len(self._store.items)
+
+    @classmethod
+    def of(cls, messages: Iterable[Any]) -> "ChatLog":
+        """Wrap a history, reusing it if it already is a ChatLog."""
+        return messages if isinstance(messages, ChatLog) else cls(messages or ())
+
+    @classmethod
+    def _view(cls, store: _Store, length: int) -> "ChatLog":
+        log = cls.__new__(cls)
+        log._store = store
+        log._length = length
+        return log
+
+    def _grow(self, messages: List[Any]) -> _Store:
+        """Push onto the shared store if this view is its tip, otherwise fork."""
+        store = self._store
+        with store.lock:
+            if len(store.items) == self._length:
+                store.items.extend(messages)
+                return store
+            prefix = store.items[:self._length]
+        return _Store(prefix + messages)
+
+    def append(self, message: Any) -> None:
+        """Add a message to this view (earlier snapshots are unaffected)."""
+        self._store = self._grow([message])
+        self._length += 1
+
+    def extend(self, messages: Iterable[Any]) -> None:
+        messages = list(messages)
+        self._store = self._grow(messages)
+        self._length += len(messages)
+
+    def __add__(self, other: Iterable[Any]) -> "ChatLog":
+        other = list(other)
+        return ChatLog._view(self._grow(other), self._length + len(other))
+
+    def __radd__(self, other: Iterable[Any]) -> List[Any]:
+        return list(other) + list(self)
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self._store.items[:self._length][index]
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError("ChatLog index out of range")
+        return self._store.items[index]
+
+    def __iter__(self) -> Iterator[Any]:
+        items = self._store.items
+        for index in range(self._length):
+            yield items[index]
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, (ChatLog, list, tuple)):
+            return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+        return NotImplemented
+
+    __hash__ = None
+
+    def __reduce__(self):
+        # Pickle/deepcopy as a standalone log holding only this view's messages
+        return (ChatLog, (list(self),))
+
+    def __repr__(self) -> str:
+        return f"ChatLog({list(self)!r})"
@@ -0,0 +1,191 @@
+import gzip
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+from flask import Flask, Response, current_app, request
+
+import metrics
+
+# Optional codecs: offered only when their package is installed
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Levels favour latency over ratio; chat payloads are compressed per request
+GZIP_LEVEL = int(os.environ.get("GZIP_LEVEL", 5))
+BROTLI_QUALITY = int(os.environ.get("BROTLI_QUALITY", 4))
+ZSTD_LEVEL = int(os.environ.get("ZSTD_LEVEL", 3))
+
+# Bodies smaller than this are sent as-is; the framing overhead isn't worth it
+COMPRESS_MIN_SIZE = int(os.environ.get("COMPRESS_MIN_SIZE", 512))
+# Compressed bodies of cache_compressed routes kept, keyed by ETag
+COMPRESS_CACHE_SIZE = int(os.environ.get("COMPRESS_CACHE_SIZE", 256))
+
+COMPRESSIBLE_TYPES = ("application/json", "text/")
+
+
+def _codecs() -> Dict[str, Callable[[bytes], bytes]]:
+    codecs = {}
+    if zstandard is not None:
+        compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL)
+        lock = threading.Lock()
+
+        def compress_zstd(data: bytes) -> bytes:
+            # ZstdCompressor instances are not thread-safe
+            with lock:
+                return compressor.compress(data)
+        codecs["zstd"] = compress_zstd
+    if brotli is not None:
+        codecs["br"] = lambda data: brotli.compress(data, quality=BROTLI_QUALITY)
+    codecs["gzip"] = lambda data: gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+    return codecs
+
+# In order of preference when the client accepts several equally
+CODECS = _codecs()
+
+
+def negotiate(accept_encoding: str) -> Optional[str]:
+    """
+    Pick the best available encoding for an Accept-Encoding header.
+
+    Returns:
+        "zstd", "br" or "gzip", or None if none is acceptable
+    """
+    accepted: Dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                continue
+        accepted[name.strip().lower()] = quality
+
+    best, best_quality = None, 0.0
+    for encoding in CODECS:
+        quality = accepted.get(encoding, accepted.get("*", 0.0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def etag_variants(etag: str) -> List[str]:
+    """The ETags a client may send back for `etag` after compression."""
+    return [etag] + [f"{etag}-{encoding}" for encoding in CODECS]
+
+
+def cache_compressed(view: Callable) -> Callable:
+    """
+    Mark a view whose strong ETag identifies its body (e.g. a catalog page
+    per catalog version), so its compressed variants are cached by ETag.
+    """
+    view.cache_compressed = True
+    return view
+
+
+def _cacheable() -> bool:
+    view = current_app.view_functions.get(request.endpoint)
+    return getattr(view, "cache_compressed", False)
+
+
+class CompressionCache:
+    """Small LRU of compressed bodies keyed by (encoding, ETag)."""
+
+    def __init__(self, max_entries: int = COMPRESS_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, str], bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Tuple[str, str]) -> Optional[bytes]:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def put(self, key: Tuple[str, str], value: bytes):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+
+def compress_response(response: Response, cache: Optional[CompressionCache] = None) -> Response:
+    """
+    Compress a response body according to the request's Accept-Encoding.
+
+    Streamed and file responses, non-text types, bodies under
+    COMPRESS_MIN_SIZE and already encoded responses pass through unchanged.
+    GET responses of `cache_compressed` views are looked up in `cache` by
+    their strong ETag, so a catalog page is compressed once per encoding.
+    Other bodies are compressed per request and never hashed.
+    """
+    etag, weak = response.get_etag()
+    if response.status_code == 304 and etag:
+        # Echo the compressed variant's ETag if that is what the client holds
+        for encoding in CODECS:
+            if request.if_none_match.contains(f"{etag}-{encoding}"):
+                response.set_etag(f"{etag}-{encoding}", weak=weak)
+                break
+        return response
+
+    if (response.direct_passthrough or response.is_streamed
+            or response.status_code < 200 or response.status_code in (204, 206, 304)
+            or "Content-Encoding" in response.headers
+            or not (response.mimetype or "").startswith(COMPRESSIBLE_TYPES)):
+        return response
+
+    response.vary.add("Accept-Encoding")
+    body = response.get_data()
+    if len(body) < COMPRESS_MIN_SIZE:
+        return response
+    encoding = negotiate(request.headers.get("Accept-Encoding", ""))
+    if encoding is None:
+        return response
+
+    key = None
+    compressed = None
+    if cache is not None and request.method == "GET" and etag and not weak and _cacheable():
+        key = (encoding, etag)
+        compressed = cache.get(key)
+        if compressed is not None:
+            metrics.increment("compression.cache_hits", encoding=encoding)
+
+    if compressed is None:
+        start = time.thread_time()
+        compressed = CODECS[encoding](body)
+        metrics.observe("compression.cpu_seconds", time.thread_time() - start, encoding=encoding)
+        if key is not None:
+            cache.put(key, compressed)
+
+    metrics.increment("compression.bytes_in", len(body), encoding=encoding)
+    metrics.increment("compression.bytes_out", len(compressed), encoding=encoding)
+    response.set_data(compressed)
+    response.headers["Content-Encoding"] = encoding
+    # A different representation needs a different strong ETag
+    if etag:
+        response.set_etag(f"{etag}-{encoding}", weak=weak)
+    return response
+
+
+def init_compression(app: Flask):
+    """Compress every eligible response of the app."""
+    cache = CompressionCache()
+    app.extensions["compression_cache"] = cache
+    app.after_request(lambda response: compress_response(response, cache))
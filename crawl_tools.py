@@ -1,7 +1,7 @@
 from bs4 import BeautifulSoup
 import os
 import glob
-from urllib.parse import quote
+from catalog import blob_url
 from typing import List, Dict
 import json
 import requests
@@ -54,7 +54,7 @@ def get_local_images(category: str) -> list[dict]:
     folder_map = {
         'venues': 'wedding venues',
         'dresses': 'wedding dresses',
-        'hairstyles': 'hairstyles',
+        'hairstyles': 'wedding hairstyles',
         'cakes': 'wedding cakes'
     }
     
@@ -81,7 +81,7 @@ def get_local_images(category: str) -> list[dict]:
             title = name.title()
             description = f"Beautiful {name} wedding venue"
             result.append({
-                "image": f"https://{os.getenv('VERCEL_PROJECT_ID')}.blob.vercel-storage.com/{quote(folder)}/{quote(filename)}",
+                "image": blob_url(folder, filename),
                 "title": title,
                 "description": description,
                 "location": "Various locations",
@@ -92,7 +92,7 @@ def get_local_images(category: str) -> list[dict]:
             title = f"Designer Dress {i+1}"
             description = f"Elegant {name} wedding dress"
             result.append({
-                "image": f"https://{os.getenv('VERCEL_PROJECT_ID')}.blob.vercel-storage.com/{quote(folder)}/{quote(filename)}",
+                "image": blob_url(folder, filename),
                 "title": title,
                 "description": description,
                 "designer": "Designer Collection",
@@ -103,7 +103,7 @@ def get_local_images(category: str) -> list[dict]:
             title = f"Hairstyle {i+1}"
             description = f"Stunning {name} wedding hairstyle"
             result.append({
-                "image": f"https://{os.getenv('VERCEL_PROJECT_ID')}.blob.vercel-storage.com/{quote(folder)}/{quote(filename)}",
+                "image": blob_url(folder, filename),
                 "title": title,
                 "description": description,
                 "tags": ["Elegant", "Hairstyle", "Wedding"]
@@ -113,7 +113,7 @@ def get_local_images(category: str) -> list[dict]:
             title = f"{category.title()} {i+1}"
             description = f"{name.title()} for weddings"
             result.append({
-                "image": f"https://{os.getenv('VERCEL_PROJECT_ID')}.blob.vercel-storage.com/{quote(folder)}/{quote(filename)}",
+                "image": blob_url(folder, filename),
                 "title": title,
                 "description": description,
                 "tags": ["Wedding", category.title()]
@@ -0,0 +1,210 @@
+import json
+import os
+import re
+import sys
+import time
+import unicodedata
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+DATA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "gazetteer.json")
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+# Trie key holding the place an alias ends at; never a token
+_END = ""
+
+# Words that introduce a place ("in Austin", "near the Amalfi Coast")
+LOCATION_CUES = frozenset({"in", "near", "at", "around", "outside"})
+
+
+class Place(NamedTuple):
+    """
+    One gazetteer entry.
+
+    Attributes:
+        id: Canonical id, e.g. "us-tx-austin"; parents are prefixes by convention only
+        name: Display name, in the catalog's "City, ST" format for US cities
+        kind: "country", "state", "city" or "region"
+        parent: Id of the enclosing place, or None for countries
+    """
+    id: str
+    name: str
+    kind: str
+    parent: Optional[str]
+
+
+class Match(NamedTuple):
+    """A place mentioned in a text, with the character span of the mention."""
+    place: Place
+    start: int
+    end: int
+
+
+def _fold_char(char: str) -> str:
+    # One character in, one out, so match spans index into the original text
+    return unicodedata.normalize("NFKD", char)[0].lower()[:1] or char
+
+
+def _fold(text: str) -> str:
+    """Lowercase and strip accents without changing the length of the text."""
+    if text.isascii():
+        return text.lower()
+    return "".join(_fold_char(char) for char in text)
+
+
+def tokenize(text: str) -> List[Tuple[str, int, int]]:
+    """(token, start, end) for each word of `text`; punctuation separates words and is dropped."""
+    return [(m.group(), m.start(), m.end()) for m in TOKEN_PATTERN.finditer(_fold(text))]
+
+
+class Gazetteer:
+    """
+    Offline lookup of cities, states, countries and wedding regions.
+
+    Every name and alias is split into words and stored in a word-level trie,
+    so a message is scanned once, left to right, looking ahead at most as
+    many words as the longest alias. At each word the longest alias starting
+    there wins ("Napa Valley" over "Napa", "Austin, TX" over "Austin") and
+    scanning resumes after it.
+
+    State abbreviations are only matched after a city ("Austin, TX"): on
+    their own too many of them are English words ("in", "me", "or").
+    """
+
+    def __init__(self, places: Iterable[Dict[str, Any]]):
+        self.places: Dict[str, Place] = {}
+        self._trie: Dict[str, Any] = {}
+        self.max_alias_words = 0
+        owners: Dict[Tuple[str, ...], str] = {}
+        for entry in places:
+            place = Place(entry["id"], entry["name"], entry["kind"], entry.get("parent"))
+            if place.id in self.places:
+                raise ValueError(f"Duplicate gazetteer id {place.id!r}")
+            self.places[place.id] = place
+            for alias in [place.name] + entry.get("aliases", []):
+                words = tuple(token for token, _, _ in tokenize(alias))
+                if not words:
+                    continue
+                owner = owners.setdefault(words, place.id)
+                if owner != place.id:
+                    raise ValueError(f"Alias {alias!r} of {place.id!r} is already used by {owner!r}")
+                node = self._trie
+                for word in words:
+                    node = node.setdefault(word, {})
+                node[_END] = place
+                self.max_alias_words = max(self.max_alias_words, len(words))
+        for place in self.places.values():
+            if place.parent is not None and place.parent not in self.places:
+                raise ValueError(f"Unknown parent {place.parent!r} of {place.id!r}")
+
+    @classmethod
+    def load(cls, path: str = DATA_PATH) -> "Gazetteer":
+        with open(path, encoding="utf-8") as data:
+            return cls(json.load(data)["places"])
+
+    def __len__(self) -> int:
+        return len(self.places)
+
+    def __contains__(self, place_id: object) -> bool:
+        return place_id in self.places
+
+    def get(self, place_id: Optional[str]) -> Optional[Place]:
+        return self.places.get(place_id) if place_id else None
+
+    def _scan(self, tokens: List[Tuple[str, int, int]]) -> Iterable[Tuple[int, Match]]:
+        """(index of the first token, match) for every mention, leftmost-longest and non-overlapping."""
+        i = 0
+        while i < len(tokens):
+            node = self._trie
+            best, best_end = None, i
+            for j in range(i, min(len(tokens), i + self.max_alias_words)):
+                node = node.get(tokens[j][0])
+                if node is None:
+                    break
+                if _END in node:
+                    best, best_end = node[_END], j
+            if best is None:
+                i += 1
+                continue
+            yield i, Match(best, tokens[i][1], tokens[best_end][2])
+            i = best_end + 1
+
+    def find_all(self, text: str) -> List[Match]:
+        """Every place mentioned in `text`, leftmost-longest and non-overlapping, in order."""
+        return [match for _, match in self._scan(tokenize(text))]
+
+    def find(self, text: str, cued: bool = False) -> Optional[Place]:
+        """
+        The place a message is most likely about: the longest mention, the
+        first one on a tie. None when no known place is mentioned.
+
+        With `cued`, only mentions right after a location cue count ("in
+        Austin", "near the Amalfi Coast"), so place names used as other
+        words ("turkey for dinner", "my friend Austin") are skipped.
+        """
+        tokens = tokenize(text)
+        best = None
+        for i, match in self._scan(tokens):
+            if cued:
+                before = i - 1 if i > 0 and tokens[i - 1][0] == "the" else i
+                if before == 0 or tokens[before - 1][0] not in LOCATION_CUES:
+                    continue
+            if best is None or match.end - match.start > best.end - best.start:
+                best = match
+        return best.place if best is not None else None
+
+    def ancestors(self, place_id: str) -> List[str]:
+        """`place_id` followed by the ids of every place enclosing it, innermost first."""
+        chain = []
+        while place_id is not None and place_id not in chain:
+            chain.append(place_id)
+            place = self.places.get(place_id)
+            place_id = place.parent if place is not None else None
+        return chain
+
+    def within(self, text: str) -> frozenset:
+        """Ids of every place mentioned in `text` and of the places enclosing them."""
+        return frozenset(ancestor for match in self.find_all(text) for ancestor in self.ancestors(match.place.id))
+
+    def display_name(self, location: Optional[str]) -> Optional[str]:
+        """The display name for a canonical id; anything else is returned unchanged."""
+        place = self.get(location)
+        return place.name if place is not None else location
+
+
+@lru_cache(maxsize=None)
+def get_gazetteer() -> Gazetteer:
+    """The bundled gazetteer, loaded on first use."""
+    return Gazetteer.load()
+
+
+@lru_cache(maxsize=4096)
+def _places_within(text: str) -> frozenset:
+    return get_gazetteer().within(text)
+
+
+def location_matches(location: str, text: str) -> bool:
+    """
+    Whether a catalog location `text` satisfies the location filter `location`.
+
+    A canonical id matches the place and everything inside it ("us-tx"
+    matches "Austin, TX"); any other filter is a case-insensitive substring.
+    """
+    if location in get_gazetteer():
+        return location in _places_within(text)
+    return location.strip().lower() in text.lower()
+
+
+if __name__ == "__main__":
+    gazetteer = get_gazetteer()
+    message = " ".join(sys.argv[1:]) or "We're thinking a rustic barn in the Texas hill country, maybe near Austin, TX"
+    for match in gazetteer.find_all(message):
+        print(f"{match.place.id:30} {match.place.name!r} <- {message[match.start:match.end]!r}")
+
+    # Latency check on a long message with no place in it
+    long_message = "we would love something intimate with lots of flowers and candles " * 2000
+    start = time.perf_counter()
+    gazetteer.find(long_message)
+    print(f"Scanned {len(long_message)} characters in {(time.perf_counter() - start) * 1000:.2f} ms "
+          f"({len(gazetteer)} places)")
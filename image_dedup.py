@@ -0,0 +1,375 @@
+import argparse
+import hashlib
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple, TYPE_CHECKING
+
+import numpy as np
+
+import metrics
+from image_proxy import ImageProxy
+
+if TYPE_CHECKING:
+    from PIL import Image
+
+# pHash: DCT of a 32x32 grayscale thumbnail, sign of the 8x8 lowest
+# frequencies against their median. Resizing, re-encoding and mild color
+# changes flip only a few of the 64 bits.
+HASH_SIZE = 8
+SAMPLE_SIZE = 32
+# Hashes this many bits apart or fewer are the same photo
+DEFAULT_THRESHOLD = int(os.environ.get("IMAGE_DEDUP_THRESHOLD", 6))
+
+HASHES_FILE = os.path.join(os.environ.get("IMAGE_FEATURES_DIR", "build"), "image_hashes.json")
+FETCH_TIMEOUT = float(os.environ.get("IMAGE_DEDUP_TIMEOUT", 5))
+FETCH_WORKERS = int(os.environ.get("IMAGE_DEDUP_WORKERS", 8))
+# Seconds a request may spend hashing images in total; later images are kept unhashed
+DEDUP_DEADLINE = float(os.environ.get("IMAGE_DEDUP_DEADLINE", 4))
+MAX_IMAGE_BYTES = 10 * 1024 * 1024
+
+_DCT = np.cos(np.pi / (2 * SAMPLE_SIZE) * np.outer(np.arange(SAMPLE_SIZE), 2 * np.arange(SAMPLE_SIZE) + 1))
+
+
+class ImageHash(NamedTuple):
+    """Perceptual hash of one image, with its size so the largest copy can be kept."""
+    hash: int
+    width: int
+    height: int
+
+
+def phash(image: "Image.Image") -> int:
+    """64-bit perceptual hash of a PIL image in any mode."""
+    from PIL import Image
+
+    pixels = np.asarray(image.convert("L").resize((SAMPLE_SIZE, SAMPLE_SIZE), Image.LANCZOS), dtype=np.float64)
+    low = (_DCT @ pixels @ _DCT.T)[:HASH_SIZE, :HASH_SIZE].ravel()
+    # The DC term is the mean brightness, not structure
+    bits = low > np.median(low[1:])
+    return int("".join("1" if bit else "0" for bit in bits), 2)
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def hash_image_bytes(data: bytes) -> ImageHash:
+    """Decode image bytes and hash them. Raises OSError if they are not an image."""
+    from PIL import Image
+
+    image = Image.open(io.BytesIO(data))
+    return ImageHash(phash(image), image.width, image.height)
+
+
+class HashIndex:
+    """
+    Near-duplicate lookup over 64-bit hashes (multi-index hashing).
+
+    The bits are split into `threshold + 1` bands. Two hashes at most
+    `threshold` bits apart agree exactly on at least one band, so only items
+    sharing a band value are compared, instead of every pair.
+    """
+
+    def __init__(self, threshold: int = DEFAULT_THRESHOLD, bits: int = HASH_SIZE * HASH_SIZE):
+        self.threshold = threshold
+        bands = threshold + 1
+        edges = [round(i * bits / bands) for i in range(bands + 1)]
+        self._bands = [(start, (1 << (end - start)) - 1) for start, end in zip(edges, edges[1:])]
+        self._tables: List[Dict[int, List[int]]] = [{} for _ in self._bands]
+        self.keys: List[Any] = []
+        self.hashes: List[int] = []
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def add(self, key: Any, value: int):
+        position = len(self.keys)
+        self.keys.append(key)
+        self.hashes.append(value)
+        for table, (shift, mask) in zip(self._tables, self._bands):
+            table.setdefault((value >> shift) & mask, []).append(position)
+
+    def query(self, value: int) -> List[Tuple[Any, int]]:
+        """(key, distance) of every indexed hash within the threshold, closest first."""
+        candidates = set()
+        for table, (shift, mask) in zip(self._tables, self._bands):
+            candidates.update(table.get((value >> shift) & mask, ()))
+        found = [(position, hamming(value, self.hashes[position])) for position in candidates]
+        found = sorted((distance, position) for position, distance in found if distance <= self.threshold)
+        return [(self.keys[position], distance) for distance, position in found]
+
+
+class HashCache:
+    """
+    Perceptual hashes cached by URL and by content.
+
+    A known URL skips the download. New bytes matching known content (the
+    same file behind another CDN path) skip decoding. Both maps are LRU
+    bounded; `path` persists them between bulk runs.
+    """
+
+    def __init__(self, path: Optional[str] = None, max_entries: int = 20000):
+        self.path = path
+        self.max_entries = max_entries
+        self._urls: "OrderedDict[str, str]" = OrderedDict()
+        self._contents: "OrderedDict[str, ImageHash]" = OrderedDict()
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            with open(path) as f:
+                data = json.load(f)
+            self._urls.update(data.get("urls", {}))
+            self._contents.update((digest, ImageHash(*value)) for digest, value in data.get("contents", {}).items())
+
+    def _touch(self, entries: OrderedDict, key: str, value=None):
+        if value is not None:
+            entries[key] = value
+        entries.move_to_end(key)
+        while len(entries) > self.max_entries:
+            entries.popitem(last=False)
+
+    def get(self, url: str) -> Optional[ImageHash]:
+        with self._lock:
+            digest = self._urls.get(url)
+            value = self._contents.get(digest) if digest is not None else None
+            if value is not None:
+                self._touch(self._urls, url)
+                self._touch(self._contents, digest)
+        return value
+
+    def put(self, url: str, data: bytes) -> ImageHash:
+        """Hash downloaded bytes, reusing the hash of identical content. Raises OSError for non-images."""
+        digest = hashlib.sha1(data).hexdigest()
+        with self._lock:
+            value = self._contents.get(digest)
+        if value is not None:
+            metrics.increment("image_dedup.cache_hits", level="content")
+        else:
+            value = hash_image_bytes(data)
+            metrics.increment("image_dedup.hashed")
+        with self._lock:
+            self._touch(self._contents, digest, value)
+            self._touch(self._urls, url, digest)
+        return value
+
+    def save(self):
+        """Write both maps to `path` atomically."""
+        if not self.path:
+            return
+        with self._lock:
+            data = {"urls": dict(self._urls), "contents": {digest: list(value) for digest, value in self._contents.items()}}
+        directory = os.path.dirname(self.path) or "."
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp, self.path)
+
+
+_fetcher = None
+_fetcher_lock = threading.Lock()
+
+
+def fetch_image(url: str) -> bytes:
+    """
+    Download a scraped image through the image proxy's checks.
+
+    Scraped URLs come from arbitrary pages, so only public http(s) hosts are
+    contacted, on a connection pinned to the checked address, and bodies
+    over MAX_IMAGE_BYTES or that aren't images are refused.
+    """
+    global _fetcher
+    with _fetcher_lock:
+        if _fetcher is None:
+            _fetcher = ImageProxy(max_image_bytes=MAX_IMAGE_BYTES, timeout=FETCH_TIMEOUT, max_redirects=2,
+                                  pool_size=FETCH_WORKERS)
+    return _fetcher.fetch(url)
+
+
+def fetch_catalog_image(location: str) -> bytes:
+    """Read a catalog image: an asset path or a blob URL. For the offline CLI only."""
+    import requests
+
+    if not location.startswith(("http://", "https://")):
+        with open(location, "rb") as f:
+            return f.read(MAX_IMAGE_BYTES + 1)[:MAX_IMAGE_BYTES]
+    with requests.get(location, timeout=FETCH_TIMEOUT, stream=True, headers={"User-Agent": "Mozilla/5.0"}) as response:
+        response.raise_for_status()
+        data = response.raw.read(MAX_IMAGE_BYTES + 1, decode_content=True)
+    if len(data) > MAX_IMAGE_BYTES:
+        raise ValueError(f"Image larger than {MAX_IMAGE_BYTES} bytes")
+    return data
+
+
+class ImageDeduplicator:
+    """
+    Drops near-duplicate images (the same photo at another size or CDN path)
+    from a list, keeping the first position and the largest copy.
+
+    Images are hashed concurrently in batches, stopping once `limit` distinct
+    images are found or `deadline` seconds have passed. Images that can't be
+    fetched or decoded in time are kept, only exact URL repeats of them are
+    dropped.
+    """
+
+    def __init__(self, cache: Optional[HashCache] = None, threshold: int = DEFAULT_THRESHOLD,
+                 workers: int = FETCH_WORKERS, fetch: Callable[[str], bytes] = fetch_image):
+        self.cache = cache if cache is not None else HashCache()
+        self.threshold = threshold
+        self.workers = workers
+        self.fetch = fetch
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def hash_url(self, url: str) -> Optional[ImageHash]:
+        value = self.cache.get(url)
+        if value is not None:
+            metrics.increment("image_dedup.cache_hits", level="url")
+            return value
+        try:
+            return self.cache.put(url, self.fetch(url))
+        except Exception as e:
+            print(f"Could not hash image {url}: {e}")
+            metrics.increment("image_dedup.errors")
+            return None
+
+    def _map(self, urls: Sequence[str], until: Optional[float] = None) -> List[Optional[ImageHash]]:
+        """Hash `urls` concurrently; those not done by `until` (a perf_counter time) give None."""
+        if self.workers <= 1 or len(urls) <= 1:
+            return [self.hash_url(url) if until is None or time.perf_counter() < until else None for url in urls]
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="image-dedup")
+        futures = [self._executor.submit(self.hash_url, url) for url in urls]
+        wait(futures, timeout=None if until is None else max(0.0, until - time.perf_counter()))
+        results = []
+        for future in futures:
+            if future.done():
+                results.append(future.result())
+            else:
+                # The download runs on to its own timeout and still fills the cache
+                metrics.increment("image_dedup.late")
+                results.append(None)
+        return results
+
+    def dedupe(self, items: Iterable[Any], url: Callable[[Any], str] = lambda item: item,
+               limit: Optional[int] = None, deadline: Optional[float] = None) -> List[Any]:
+        """
+        `items` without near-duplicates, in their original order.
+
+        Args:
+            items: Image URLs, or records holding one
+            url: Gets the URL of an item
+            limit: Stop once this many distinct images are kept
+            deadline: Seconds to spend hashing; after that, items are only
+                de-duplicated by URL
+        """
+        pending = list(items)
+        kept: List[Any] = []
+        sizes: List[int] = []
+        index = HashIndex(self.threshold)
+        seen_urls = set()
+        batch_size = max(1, self.workers)
+        until = None if deadline is None else time.perf_counter() + deadline
+        while pending and (limit is None or len(kept) < limit):
+            batch, pending = pending[:batch_size], pending[batch_size:]
+            batch = [item for item in batch if url(item) not in seen_urls and not seen_urls.add(url(item))]
+            expired = until is not None and time.perf_counter() >= until
+            hashes = [None] * len(batch) if expired else self._map([url(item) for item in batch], until)
+            for item, value in zip(batch, hashes):
+                if limit is not None and len(kept) >= limit:
+                    break
+                if value is None:
+                    kept.append(item)
+                    sizes.append(0)
+                    continue
+                matches = index.query(value.hash)
+                if matches:
+                    metrics.increment("image_dedup.duplicates")
+                    position = matches[0][0]
+                    if value.width * value.height > sizes[position]:
+                        kept[position], sizes[position] = item, value.width * value.height
+                    continue
+                index.add(len(kept), value.hash)
+                kept.append(item)
+                sizes.append(value.width * value.height)
+        return kept
+
+    def groups(self, items: Iterable[Tuple[str, str]]) -> List[List[str]]:
+        """
+        Near-duplicate groups among (id, url) pairs, for bulk catalog checks.
+        Each group lists the ids of one photo, in input order; singletons are left out.
+        """
+        items = list(items)
+        index = HashIndex(self.threshold)
+        groups: List[List[str]] = []
+        for start in range(0, len(items), 256):
+            batch = items[start:start + 256]
+            for (item_id, _), value in zip(batch, self._map([item_url for _, item_url in batch])):
+                if value is None:
+                    continue
+                matches = index.query(value.hash)
+                if matches:
+                    groups[matches[0][0]].append(item_id)
+                    continue
+                index.add(len(groups), value.hash)
+                groups.append([item_id])
+        return [group for group in groups if len(group) > 1]
+
+
+_deduplicator: Optional[ImageDeduplicator] = None
+_deduplicator_lock = threading.Lock()
+
+
+def get_deduplicator() -> ImageDeduplicator:
+    """Process-wide deduplicator for per-request scraping, with an in-memory cache."""
+    global _deduplicator
+    with _deduplicator_lock:
+        if _deduplicator is None:
+            _deduplicator = ImageDeduplicator()
+        return _deduplicator
+
+
+def dedupe_images(items: Iterable[Any], url: Callable[[Any], str] = lambda item: item,
+                  limit: Optional[int] = None, deadline: float = DEDUP_DEADLINE) -> List[Any]:
+    """
+    Drop near-duplicate images from scraped results, spending at most
+    `deadline` seconds on downloads; IMAGE_DEDUP=0 only drops repeated URLs.
+    """
+    if os.environ.get("IMAGE_DEDUP", "1") == "0":
+        seen = set()
+        unique = [item for item in items if url(item) not in seen and not seen.add(url(item))]
+        return unique[:limit] if limit is not None else unique
+    return get_deduplicator().dedupe(items, url, limit, deadline)
+
+
+if __name__ == "__main__":
+    from image_features import _blob_sources, _local_sources
+
+    parser = argparse.ArgumentParser(description="Find near-duplicate catalog images")
+    parser.add_argument("--assets", default="assets", help="Directory with local images")
+    parser.add_argument("--local-only", action="store_true", help="Skip downloading blob images")
+    parser.add_argument("--cache", default=HASHES_FILE, help="Hash cache file, reused between runs")
+    parser.add_argument("--threshold", type=int, default=DEFAULT_THRESHOLD, help="Max differing bits of a duplicate")
+    parser.add_argument("--json", action="store_true", help="Print the groups as JSON")
+    args = parser.parse_args()
+
+    sources = _local_sources(args.assets)
+    if not args.local_only:
+        sources += _blob_sources()
+    start = time.perf_counter()
+    cache = HashCache(args.cache)
+    duplicate_groups = ImageDeduplicator(cache, args.threshold, fetch=fetch_catalog_image).groups(
+        (image_id, location) for image_id, _, location in sources)
+    cache.save()
+    if args.json:
+        print(json.dumps(duplicate_groups, indent=1))
+    else:
+        for group in duplicate_groups:
+            print("  ".join(group))
+        print(f"{len(duplicate_groups)} duplicate groups among {len(sources)} images "
+              f"in {time.perf_counter() - start:.2f}s")
@@ -0,0 +1,198 @@
+import argparse
+import io
+import json
+import os
+import time
+from typing import Dict, Iterable, List, Optional, Tuple, TYPE_CHECKING
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from PIL import Image
+
+# Where the offline extractor writes the feature matrix and its id sidecar
+FEATURES_DIR = os.environ.get("IMAGE_FEATURES_DIR", "build")
+FEATURES_FILE = "image_features.npy"
+FEATURES_META_FILE = "image_features.json"
+FEATURES_VERSION = 1
+
+# Cheap CPU features: a 4x4x4 RGB color histogram and an 8x8 grayscale thumbnail
+HISTOGRAM_BINS = 4
+THUMBNAIL_SIZE = 8
+FEATURE_DIM = HISTOGRAM_BINS ** 3 + THUMBNAIL_SIZE ** 2
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".gif", ".webp"}
+
+# Loaded index, memory-mapped on first use
+_INDEX: Optional[Tuple[np.ndarray, List[str], Dict[str, int]]] = None
+
+
+def _unit(vector: np.ndarray) -> np.ndarray:
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm > 0 else vector
+
+
+def extract_features(image: "Image.Image") -> np.ndarray:
+    """
+    Compute the feature vector for one image.
+
+    Args:
+        image: A PIL image in any mode
+
+    Returns:
+        L2-normalized float32 vector of length FEATURE_DIM
+    """
+    from PIL import Image
+
+    # Histograms don't need full resolution, 64x64 keeps this fast for big photos
+    rgb = np.asarray(image.convert("RGB").resize((64, 64), Image.BILINEAR), dtype=np.uint8)
+    quantized = (rgb // (256 // HISTOGRAM_BINS)).reshape(-1, 3).astype(np.int32)
+    bins = (quantized[:, 0] * HISTOGRAM_BINS + quantized[:, 1]) * HISTOGRAM_BINS + quantized[:, 2]
+    histogram = np.bincount(bins, minlength=HISTOGRAM_BINS ** 3).astype(np.float32)
+
+    thumbnail = np.asarray(
+        image.convert("L").resize((THUMBNAIL_SIZE, THUMBNAIL_SIZE), Image.BILINEAR), dtype=np.float32
+    ).ravel()
+    thumbnail -= thumbnail.mean()
+
+    features = np.concatenate([_unit(histogram), _unit(thumbnail)])
+    return _unit(features).astype(np.float32)
+
+
+def _local_sources(assets_dir: str) -> List[Tuple[str, str, str]]:
+    """List (image_id, category, path) for every image under assets/<category>/."""
+    sources = []
+    for root, _, files in os.walk(assets_dir):
+        for file in sorted(files):
+            if os.path.splitext(file)[1].lower() in IMAGE_EXTENSIONS:
+                path = os.path.join(root, file)
+                category = os.path.basename(root)
+                sources.append((path.replace(os.sep, "/"), category, path))
+    return sources
+
+
+def _blob_sources() -> List[Tuple[str, str, str]]:
+    """List (image_id, category, url) for every catalog image in blob storage."""
+    from image_utils import CATEGORY_LISTS
+
+    sources = []
+    for category, list_function in CATEGORY_LISTS.items():
+        for item in list_function():
+            sources.append((item["image"], category, item["image"]))
+    return sources
+
+
+def build_feature_index(assets_dir: str = "assets", include_blob: bool = True,
+                        output_dir: str = FEATURES_DIR) -> int:
+    """
+    Extract features for local assets and blob images and write the index.
+
+    Args:
+        assets_dir: Directory with local images, one sub-folder per category
+        include_blob: Whether to download and index the blob catalog images
+        output_dir: Directory for the feature matrix and id sidecar
+
+    Returns:
+        Number of images indexed
+    """
+    # Extraction dependencies are only needed offline, not by similar_items()
+    import requests
+    from PIL import Image
+
+    sources = _local_sources(assets_dir)
+    if include_blob:
+        sources += _blob_sources()
+
+    ids, categories, rows = [], [], []
+    session = requests.Session()
+    for image_id, category, location in sources:
+        try:
+            if location.startswith(("http://", "https://")):
+                response = session.get(location, timeout=10)
+                response.raise_for_status()
+                image = Image.open(io.BytesIO(response.content))
+            else:
+                image = Image.open(location)
+            rows.append(extract_features(image))
+            ids.append(image_id)
+            categories.append(category)
+        except Exception as e:
+            print(f"Skipping {image_id}: {e}")
+
+    matrix = np.vstack(rows) if rows else np.zeros((0, FEATURE_DIM), dtype=np.float32)
+
+    os.makedirs(output_dir, exist_ok=True)
+    np.save(os.path.join(output_dir, FEATURES_FILE), matrix)
+    with open(os.path.join(output_dir, FEATURES_META_FILE), "w") as f:
+        json.dump({
+            "version": FEATURES_VERSION,
+            "dim": FEATURE_DIM,
+            "ids": ids,
+            "categories": categories,
+        }, f)
+
+    return len(ids)
+
+
+def load_feature_index(output_dir: str = FEATURES_DIR) -> Tuple[np.ndarray, List[str], Dict[str, int]]:
+    """Memory-map the feature matrix and load its ids, caching the result."""
+    global _INDEX
+    if _INDEX is None:
+        with open(os.path.join(output_dir, FEATURES_META_FILE)) as f:
+            meta = json.load(f)
+        matrix = np.load(os.path.join(output_dir, FEATURES_FILE), mmap_mode="r")
+        ids = meta["ids"]
+        _INDEX = (matrix, ids, {image_id: row for row, image_id in enumerate(ids)})
+    return _INDEX
+
+
+def similar_items(image_id: str, k: int = 5, candidates: Optional[Iterable[str]] = None) -> List[Dict[str, object]]:
+    """
+    Find the images that look most like the given one.
+
+    Args:
+        image_id: Blob URL or asset path of the reference image
+        k: Number of similar images to return
+        candidates: Optional ids to choose from, e.g. the items of one category.
+            Ids missing from the index are ignored.
+
+    Returns:
+        List of {"id", "score"} dictionaries, most similar first. Empty if the
+        index has not been built or the image is not in it.
+    """
+    try:
+        matrix, ids, rows = load_feature_index()
+    except FileNotFoundError:
+        print("Image feature index not found, run `python image_features.py` to build it")
+        return []
+
+    row = rows.get(image_id)
+    if row is None or k <= 0:
+        return []
+
+    if candidates is None:
+        candidate_rows = np.arange(len(ids))
+    else:
+        candidate_rows = np.array(sorted({rows[c] for c in candidates if c in rows}), dtype=np.int64)
+    candidate_rows = candidate_rows[candidate_rows != row]
+    k = min(k, len(candidate_rows))
+    if k <= 0:
+        return []
+
+    # Rows are unit vectors, so the dot product is the cosine similarity
+    scores = np.asarray(matrix[candidate_rows] @ matrix[row])
+    top = np.argpartition(-scores, k - 1)[:k]
+    top = top[np.argsort(-scores[top], kind="stable")]
+    return [{"id": ids[candidate_rows[i]], "score": float(scores[i])} for i in top]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the image similarity index")
+    parser.add_argument("--assets", default="assets", help="Directory with local images")
+    parser.add_argument("--local-only", action="store_true", help="Skip downloading blob images")
+    parser.add_argument("--output", default=FEATURES_DIR, help="Output directory")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    count = build_feature_index(args.assets, include_blob=not args.local_only, output_dir=args.output)
+    print(f"Indexed {count} images in {time.perf_counter() - start:.2f}s -> {args.output}")
@@ -0,0 +1,409 @@
+import fcntl
+import hashlib
+import hmac
+import ipaddress
+import os
+import socket
+import tempfile
+import threading
+import time
+from typing import BinaryIO, Callable, Dict, List, NamedTuple, Optional, Tuple
+from urllib.parse import quote, urljoin, urlsplit
+
+import metrics
+
+# Formats served, by file extension; anything else (SVG, HTML) is refused
+IMAGE_TYPES = {"jpg": "image/jpeg", "png": "image/png", "gif": "image/gif", "webp": "image/webp", "avif": "image/avif"}
+CHUNK_SIZE = 64 * 1024
+
+# Base URL of this API as seen by browsers, e.g. https://api.sayyes.ai. When
+# set together with IMAGE_PROXY_SECRET, scraped image URLs are rewritten to
+# go through /api/img.
+IMAGE_PROXY_BASE = os.environ.get("IMAGE_PROXY_BASE", "").rstrip("/")
+
+# Key for signing proxied URLs, so /api/img only fetches URLs this server
+# issued; unset disables the endpoint
+IMAGE_PROXY_SECRET = os.environ.get("IMAGE_PROXY_SECRET", "")
+
+
+class ProxyError(Exception):
+    """An image that can't be proxied, with the HTTP status to answer."""
+
+    def __init__(self, status: int, reason: str, message: str):
+        super().__init__(message)
+        self.status = status
+        self.reason = reason
+
+
+class CachedImage(NamedTuple):
+    key: str
+    path: str
+    mimetype: str
+    size: int
+    file: BinaryIO  # Open for reading; stays readable if the entry is evicted. The caller closes it.
+
+
+def sniff_image_type(head: bytes) -> Optional[str]:
+    """The IMAGE_TYPES extension matching the first bytes of a file, or None."""
+    if head.startswith(b"\xff\xd8\xff"):
+        return "jpg"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "png"
+    if head[:6] in (b"GIF87a", b"GIF89a"):
+        return "gif"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "webp"
+    if head[4:12] in (b"ftypavif", b"ftypavis"):
+        return "avif"
+    return None
+
+
+def url_signature(url: str, secret: str) -> str:
+    """The `sig` parameter /api/img expects for `url`."""
+    return hmac.new(secret.encode(), url.encode(), hashlib.sha256).hexdigest()[:32]
+
+
+def proxied_url(url: str, base: Optional[str] = None, secret: Optional[str] = None) -> str:
+    """
+    `url` routed through /api/img on `base` and signed with `secret`
+    (defaults IMAGE_PROXY_BASE and IMAGE_PROXY_SECRET); unchanged unless both are set.
+    """
+    base = IMAGE_PROXY_BASE if base is None else base
+    secret = IMAGE_PROXY_SECRET if secret is None else secret
+    if not base or not secret or not url.startswith(("http://", "https://")):
+        return url
+    return f"{base}/api/img?url={quote(url, safe='')}&sig={url_signature(url, secret)}"
+
+
+def _pinned_pool_classes(resolve_address: Callable[[str, int], str]) -> Dict[str, type]:
+    """
+    urllib3 pool classes whose connections go to `resolve_address(host, port)`.
+
+    The host is resolved and checked once per connection, and the socket is
+    opened to exactly that address, so a DNS answer that changes between the
+    check and the connect (DNS rebinding) can't reach another host. TLS still
+    verifies the certificate against the hostname.
+    """
+    from urllib3.connection import HTTPConnection, HTTPSConnection
+    from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+    class PinnedHTTPConnection(HTTPConnection):
+        def _new_conn(self):
+            self._dns_host = resolve_address(self.host, self.port)
+            return super()._new_conn()
+
+    class PinnedHTTPSConnection(HTTPSConnection):
+        def _new_conn(self):
+            self._dns_host = resolve_address(self.host, self.port)
+            return super()._new_conn()
+
+    class PinnedHTTPConnectionPool(HTTPConnectionPool):
+        ConnectionCls = PinnedHTTPConnection
+
+    class PinnedHTTPSConnectionPool(HTTPSConnectionPool):
+        ConnectionCls = PinnedHTTPSConnection
+
+    return {"http": PinnedHTTPConnectionPool, "https": PinnedHTTPSConnectionPool}
+
+
+class ImageProxy:
+    """
+    Fetches third-party images once and serves them from a disk cache.
+
+    Upstream requests share one pooled HTTP session. Bodies are written to
+    `directory` (one file per URL, named by its SHA-256) and evicted least
+    recently used once they exceed `max_cache_bytes`. The directory itself
+    is the index: recency is the file mtime and eviction scans it under a
+    file lock, so every worker sharing it keeps to one budget. Concurrent
+    misses for one URL in a worker share a single download.
+
+    Only public http(s) hosts are fetched, on every redirect hop, and each
+    connection goes to the address that was checked, so the proxy can't be
+    pointed at the internal network. Bodies over `max_image_bytes` and
+    anything that isn't a JPEG, PNG, GIF, WebP or AVIF are refused. URLs
+    must carry a signature made with `secret` (see `proxied_url`), so the
+    endpoint only fetches URLs this server handed out.
+    """
+
+    def __init__(self, directory: str = "image_cache", max_cache_bytes: int = 512 * 1024 * 1024,
+                 max_image_bytes: int = 10 * 1024 * 1024, timeout: float = 10.0, max_redirects: int = 3,
+                 pool_size: int = 16, allow_private: bool = False, secret: str = "",
+                 resolve: Callable[..., list] = socket.getaddrinfo):
+        self.directory = directory
+        self.max_cache_bytes = max_cache_bytes
+        self.max_image_bytes = max_image_bytes
+        self.timeout = timeout
+        self.max_redirects = max_redirects
+        self.pool_size = pool_size
+        self.allow_private = allow_private
+        self.secret = secret
+        self.resolve = resolve
+        self._inflight: Dict[str, threading.Event] = {}
+        self._lock = threading.Lock()
+        self._session = None
+
+    @classmethod
+    def from_env(cls) -> "ImageProxy":
+        """Build from IMAGE_PROXY_* environment variables."""
+        return cls(
+            directory=os.environ.get("IMAGE_PROXY_DIR", "image_cache"),
+            max_cache_bytes=int(float(os.environ.get("IMAGE_PROXY_CACHE_MB", 512)) * 1024 * 1024),
+            max_image_bytes=int(float(os.environ.get("IMAGE_PROXY_MAX_IMAGE_MB", 10)) * 1024 * 1024),
+            timeout=float(os.environ.get("IMAGE_PROXY_TIMEOUT", 10)),
+            pool_size=int(os.environ.get("IMAGE_PROXY_POOL_SIZE", 16)),
+            secret=IMAGE_PROXY_SECRET,
+        )
+
+    # === Disk cache ===
+    def _path(self, key: str, extension: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.{extension}")
+
+    def _scan(self) -> List[Tuple[int, str, int]]:
+        """(mtime_ns, path, size) of every cached image in the directory."""
+        found = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                key, _, extension = name.partition(".")
+                if extension not in IMAGE_TYPES or len(key) != 64:
+                    continue  # the lock file and temp files of running downloads
+                try:
+                    stat = os.stat(os.path.join(root, name))
+                except FileNotFoundError:
+                    continue  # evicted by another worker meanwhile
+                found.append((stat.st_mtime_ns, os.path.join(root, name), stat.st_size))
+        return found
+
+    def _evict(self, keep: str):
+        """
+        Delete the least recently used files until the directory fits the budget.
+
+        Runs under an exclusive lock on `directory`/.lock, so workers evicting
+        at the same time don't both count files the other already deleted.
+        `keep` (the file just written) stays even if it alone is over budget.
+        """
+        with open(os.path.join(self.directory, ".lock"), "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            files = self._scan()
+            total = sum(size for _, _, size in files)
+            for _, path, size in sorted(files):
+                if total <= self.max_cache_bytes:
+                    break
+                if path == keep:
+                    continue
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+                metrics.increment("image_proxy.evictions")
+        metrics.set_gauge("image_proxy.cache_bytes", total)
+
+    def _lookup(self, key: str) -> Optional[CachedImage]:
+        """The cached file for `key`, opened, or None if no worker has it."""
+        for extension, mimetype in IMAGE_TYPES.items():
+            path = self._path(key, extension)
+            try:
+                file = open(path, "rb")
+            except FileNotFoundError:
+                continue
+            try:
+                # Mark it recently used for every worker's eviction
+                os.utime(file.fileno())
+            except OSError:
+                pass
+            return CachedImage(key, path, mimetype, os.fstat(file.fileno()).st_size, file)
+        return None
+
+    def stats(self) -> Dict[str, int]:
+        files = self._scan()
+        return {"entries": len(files), "bytes": sum(size for _, _, size in files), "max_bytes": self.max_cache_bytes}
+
+    # === Fetching ===
+    def verify(self, url: str, signature: Optional[str]) -> bool:
+        """Whether `signature` is the one `proxied_url` gave `url`; always False without a secret."""
+        return bool(self.secret and signature) and hmac.compare_digest(signature, url_signature(url, self.secret))
+
+    def _address_allowed(self, address: str) -> bool:
+        ip = ipaddress.ip_address(address.split("%")[0])
+        return self.allow_private or (ip.is_global and not ip.is_multicast)
+
+    def resolve_address(self, host: str, port: int) -> str:
+        """
+        Resolve `host` and return the address to connect to.
+
+        Raises:
+            ProxyError: The host doesn't resolve, or any of its addresses isn't public
+        """
+        try:
+            addresses = [info[4][0] for info in self.resolve(host, port, proto=socket.IPPROTO_TCP)]
+        except (OSError, ValueError):
+            raise ProxyError(502, "dns", f"Could not resolve {host}")
+        if not addresses:
+            raise ProxyError(502, "dns", f"Could not resolve {host}")
+        for address in addresses:
+            if not self._address_allowed(address):
+                raise ProxyError(403, "forbidden_host", f"{host} is not a public address")
+        return addresses[0]
+
+    def check_url(self, url: str):
+        """
+        Raise ProxyError unless `url` is http(s) on a public address.
+
+        This rejects bad URLs early; the address actually connected to is
+        checked again by the session, when the connection is made.
+        """
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https") or not parts.hostname:
+            raise ProxyError(400, "bad_url", "Only absolute http(s) image URLs can be proxied")
+        try:
+            port = parts.port or (443 if parts.scheme == "https" else 80)
+        except ValueError:
+            raise ProxyError(400, "bad_url", "Invalid port")
+        self.resolve_address(parts.hostname, port)
+
+    def _get_session(self):
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        pool_classes = _pinned_pool_classes(self.resolve_address)
+
+        class PinnedAdapter(HTTPAdapter):
+            def init_poolmanager(self, *args, **kwargs):
+                super().init_poolmanager(*args, **kwargs)
+                self.poolmanager.pool_classes_by_scheme = pool_classes
+
+        with self._lock:
+            if self._session is None:
+                session = requests.Session()
+                # Environment proxies would make us connect to (and check) the proxy instead
+                session.trust_env = False
+                adapter = PinnedAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                session.headers["User-Agent"] = "Mozilla/5.0 (compatible; SayYesImageProxy/1.0)"
+                self._session = session
+            return self._session
+
+    def _open(self, url: str):
+        """The upstream response for `url`, following redirects through check_url."""
+        import requests
+
+        session = self._get_session()
+        for _ in range(self.max_redirects + 1):
+            self.check_url(url)
+            try:
+                response = session.get(url, stream=True, timeout=self.timeout, allow_redirects=False)
+            except requests.Timeout:
+                raise ProxyError(504, "timeout", "The image host timed out")
+            except requests.RequestException as e:
+                raise ProxyError(502, "upstream", f"Could not fetch image: {e}")
+            if response.is_redirect and "Location" in response.headers:
+                url = urljoin(url, response.headers["Location"])
+                response.close()
+                continue
+            if response.status_code != 200:
+                response.close()
+                raise ProxyError(502, "upstream_status", f"Image host answered {response.status_code}")
+            return response
+        raise ProxyError(502, "redirects", "Too many redirects")
+
+    def _chunks(self, response):
+        """The body of an upstream image response, refusing non-images and bodies over the limit."""
+        declared = response.headers.get("Content-Type", "").split(";")[0].strip().lower()
+        if declared and not declared.startswith("image/"):
+            raise ProxyError(415, "not_image", f"Not an image ({declared})")
+        length = response.headers.get("Content-Length")
+        if length and length.isdigit() and int(length) > self.max_image_bytes:
+            raise ProxyError(413, "too_large", "Image is too large")
+        size = 0
+        for chunk in response.iter_content(CHUNK_SIZE):
+            size += len(chunk)
+            if size > self.max_image_bytes:
+                raise ProxyError(413, "too_large", "Image is too large")
+            yield chunk
+
+    def fetch(self, url: str) -> bytes:
+        """
+        Download `url` under the same checks as `get`, without caching it.
+
+        Raises:
+            ProxyError: The URL is refused or the download failed
+        """
+        with self._open(url) as response:
+            data = b"".join(self._chunks(response))
+        if sniff_image_type(data[:16]) is None:
+            raise ProxyError(415, "not_image", "Not a supported image format")
+        return data
+
+    def _download(self, url: str, key: str) -> CachedImage:
+        start = time.perf_counter()
+        response = self._open(url)
+        with response:
+            subdirectory = os.path.join(self.directory, key[:2])
+            os.makedirs(subdirectory, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=subdirectory, suffix=".part")
+            size, head = 0, b""
+            try:
+                with os.fdopen(fd, "wb") as out:
+                    for chunk in self._chunks(response):
+                        size += len(chunk)
+                        if len(head) < 16:
+                            head += chunk[:16]
+                        out.write(chunk)
+                extension = sniff_image_type(head)
+                if extension is None:
+                    raise ProxyError(415, "not_image", "Not a supported image format")
+                path = self._path(key, extension)
+                # Opened before it is published, so eviction can't take it from under us
+                file = open(tmp, "rb")
+                os.replace(tmp, path)
+            except BaseException:
+                if os.path.exists(tmp):
+                    os.remove(tmp)
+                raise
+        metrics.increment("image_proxy.bytes_fetched", size)
+        metrics.observe("image_proxy.fetch_seconds", time.perf_counter() - start)
+        return CachedImage(key, path, IMAGE_TYPES[extension], size, file)
+
+    def get(self, url: str) -> CachedImage:
+        """
+        The cached copy of `url`, downloading it on a miss.
+
+        The returned image holds its file open, so serving it can't race
+        with eviction; the caller closes `file`.
+
+        Raises:
+            ProxyError: The URL is refused or the download failed
+        """
+        key = hashlib.sha256(url.encode()).hexdigest()
+        while True:
+            entry = self._lookup(key)
+            if entry is not None:
+                metrics.increment("image_proxy.hits")
+                return entry
+            with self._lock:
+                event = self._inflight.get(key)
+                leader = event is None
+                if leader:
+                    event = self._inflight[key] = threading.Event()
+            if leader:
+                break
+            # Another request is downloading this URL: use its result, or retry if it failed
+            event.wait(self.timeout * (self.max_redirects + 1))
+
+        metrics.increment("image_proxy.misses")
+        try:
+            entry = self._download(url, key)
+        except ProxyError as e:
+            metrics.increment("image_proxy.rejected", reason=e.reason)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            event.set()
+        try:
+            self._evict(keep=entry.path)
+        except OSError as e:
+            # The image is already open; a failed eviction only delays the cleanup
+            print(f"Error evicting image cache: {e}")
+        return entry
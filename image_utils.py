@@ -1,16 +1,46 @@
 import os
-import requests
 from dotenv import load_dotenv
-from urllib.parse import quote
 from typing import List, Dict, Optional
 import json
-from bs4 import BeautifulSoup
-import html2text
+import threading
+import time
 from urllib.parse import urljoin
+from ranking import CatalogRanker
+from gazetteer import get_gazetteer, location_matches
+from catalog import get_catalog
+from image_dedup import dedupe_images
+from image_proxy import proxied_url
 
 # Load environment variables
 load_dotenv()
 
+# Rankers are built once per category and catalog version and reused across requests
+_RANKERS: Dict[tuple, CatalogRanker] = {}
+_RANKERS_LOCK = threading.Lock()
+
+# Seconds to wait on a page fetched by a tool, well inside TOOL_TIMEOUT (default 15)
+SCRAPE_TIMEOUT = float(os.environ.get("SCRAPE_TIMEOUT", 5))
+
+def fetch_page(url: str, headers: Optional[Dict[str, str]] = None) -> str:
+    """
+    Fetch a page for a tool and return its decoded body.
+
+    requests' timeout applies to each socket read, so a slow server could
+    drip a page for much longer; the body is streamed and the fetch gives up
+    once SCRAPE_TIMEOUT has passed in total.
+    """
+    import requests
+
+    deadline = time.monotonic() + SCRAPE_TIMEOUT
+    with requests.get(url, headers=headers, timeout=SCRAPE_TIMEOUT, stream=True) as response:
+        response.raise_for_status()
+        body = bytearray()
+        for chunk in response.iter_content(64 * 1024):
+            body += chunk
+            if time.monotonic() > deadline:
+                raise requests.Timeout(f"{url} took longer than {SCRAPE_TIMEOUT}s")
+        return body.decode(response.encoding or "utf-8", errors="replace")
+
 def clean_title(name: str) -> str:
     """Clean and format a title from a filename."""
     return name.split("/")[-1].replace("_", " ").split(".")[0].title()
@@ -38,91 +68,55 @@ def clean_description(description: str) -> str:
 
 def list_venue_images() -> List[Dict]:
     """Get a list of venue images with their metadata."""
-    filenames = [
-        "eventsbomb_09464_A_very_elegant_and_luxurious.png",
-        "amadeowang99_French_modern_wedding.png",
-        "amadeowang99_Luxury_wedding_venue.png",
-        "amadeowang99_Rustic_wedding_venue.png",
-        "amadeowang99_Modern_wedding_venue.png"
-    ]
-    folder = "wedding venues"
-    images = [
-        {
-            "image": f"https://{os.getenv('VERCEL_PROJECT_ID')}.public.blob.vercel-storage.com/{quote(folder)}/{quote(filename)}",
-            "title": clean_title(filename),
-            "description": "Elegant wedding venue in Austin",
-            "location": "Austin, TX",
-            "price": "$$",
-            "tags": ["Garden", "Outdoor"],
-        }
-        for filename in filenames
-    ]
-    return images
+    return get_catalog().category_items("venues")
 
 def list_dress_images() -> List[Dict]:
     """Get a list of dress images with their metadata."""
-    filenames = [
-        "alexb_79_Classic_Wedding_Dress.png",
-        "amadeowang99_Modern_Wedding_Dress.png",
-        "amadeowang99_Luxury_Wedding_Dress.png",
-        "amadeowang99_Rustic_Wedding_Dress.png",
-        "amadeowang99_Bohemian_Wedding_Dress.png"
-    ]
-    folder = "wedding dresses"
-    return [
-        {
-            "image": f"https://{os.getenv('VERCEL_PROJECT_ID')}.public.blob.vercel-storage.com/{quote(folder)}/{quote(filename)}",
-            "title": clean_title(filename),
-            "description": "Beautiful wedding dress",
-            "designer": "Designer Collection",
-            "price": "$$$",
-            "tags": ["Dress", "Wedding"],
-        }
-        for filename in filenames
-    ]
+    return get_catalog().category_items("dresses")
 
 def list_hairstyle_images() -> List[Dict]:
     """Get a list of hairstyle images with their metadata."""
-    filenames = [
-        "alexb_79_Classic_Wedding_Hairstyle.png",
-        "amadeowang99_Modern_Wedding_Hairstyle.png",
-        "amadeowang99_Luxury_Wedding_Hairstyle.png",
-        "amadeowang99_Rustic_Wedding_Hairstyle.png",
-        "amadeowang99_Bohemian_Wedding_Hairstyle.png"
-    ]
-    folder = "wedding hairstyles"
-    return [
-        {
-            "image": f"https://{os.getenv('VERCEL_PROJECT_ID')}.public.blob.vercel-storage.com/{quote(folder)}/{quote(filename)}",
-            "title": clean_title(filename),
-            "description": "Stunning wedding hairstyle",
-            "tags": ["Hairstyle", "Wedding"],
-        }
-        for filename in filenames
-    ]
+    return get_catalog().category_items("hairstyles")
 
 def list_cake_images() -> List[Dict]:
     """Get a list of cake images with their metadata."""
-    filenames = [
-        "alexb_79_Classic_Wedding_Cake.png",
-        "amadeowang99_Modern_Wedding_Cake.png",
-        "amadeowang99_Luxury_Wedding_Cake.png",
-        "amadeowang99_Rustic_Wedding_Cake.png",
-        "amadeowang99_Bohemian_Wedding_Cake.png"
-    ]
-    folder = "wedding cakes"
-    return [
-        {
-            "image": f"https://{os.getenv('VERCEL_PROJECT_ID')}.public.blob.vercel-storage.com/{quote(folder)}/{quote(filename)}",
-            "title": clean_title(filename),
-            "description": "Delicious wedding cake",
-            "price": "$$$",
-            "tags": ["Cake", "Wedding"],
-        }
-        for filename in filenames
-    ]
+    return get_catalog().category_items("cakes")
+
+# Map category to the appropriate list function
+CATEGORY_LISTS = {
+    "venues": list_venue_images,
+    "dresses": list_dress_images,
+    "hairstyles": list_hairstyle_images,
+    "cakes": list_cake_images
+}
+
+def get_category_ranker(category: str) -> Optional[CatalogRanker]:
+    """
+    Get the cached ranker for a category, building it on first use.
+    
+    Args:
+        category: Type of images (venues, dresses, hairstyles, cakes)
+        
+    Returns:
+        CatalogRanker over the category's items, or None for unknown categories
+    """
+    category = category.lower()
+    key = (get_catalog().version, category)
+    ranker = _RANKERS.get(key)
+    if ranker is None:
+        list_function = CATEGORY_LISTS.get(category)
+        if not list_function:
+            return None
+        ranker = CatalogRanker(list_function())
+        with _RANKERS_LOCK:
+            # Drop rankers built for older catalog versions
+            for stale in [cached for cached in _RANKERS if cached[0] != key[0]]:
+                _RANKERS.pop(stale, None)
+            ranker = _RANKERS.setdefault(key, ranker)
+    return ranker
 
-def get_images_by_category(category: str, style: Optional[str] = None, location: Optional[str] = None) -> Dict:
+def get_images_by_category(category: str, style: Optional[str] = None, location: Optional[str] = None,
+                           preferences: Optional[Dict] = None, limit: Optional[int] = None) -> Dict:
     """
     Get wedding images for a specific category with optional style and location filters.
     
@@ -130,20 +124,14 @@ def get_images_by_category(category: str, style: Optional[str] = None, location:
         category: Type of images (venues, dresses, hairstyles, cakes, etc.)
         style: Optional style descriptor (rustic, modern, bohemian, etc.)
         location: Optional location specification
+        preferences: Optional session preferences (AgentState) used to rank the items
+        limit: Optional maximum number of items to return
         
     Returns:
         Dictionary containing image data and carousel information
     """
-    # Map category to the appropriate list function
-    category_map = {
-        "venues": list_venue_images,
-        "dresses": list_dress_images,
-        "hairstyles": list_hairstyle_images,
-        "cakes": list_cake_images
-    }
-    
     # Get the appropriate list function
-    list_function = category_map.get(category.lower())
+    list_function = CATEGORY_LISTS.get(category.lower())
     if not list_function:
         return {
             "text": f"I couldn't find any images for the category: {category}",
@@ -153,40 +141,51 @@ def get_images_by_category(category: str, style: Optional[str] = None, location:
             }
         }
     
-    # Get the images
-    items = list_function()
-    
-    # Filter by style if provided
-    if style:
-        items = [item for item in items if style.lower() in [tag.lower() for tag in item.get("tags", [])]]
-    
-    # Filter by location if provided
-    if location:
-        items = [item for item in items if location.lower() in item.get("location", "").lower()]
+    if preferences:
+        # Rank the whole category in one vectorized pass, filters become masks
+        ranker = get_category_ranker(category)
+        mask = ranker.filter_mask(style=style, location=location)
+        items = ranker.top_k(preferences, limit or len(ranker), mask)
+    else:
+        # Get the images
+        items = list_function()
+        
+        # Filter by style if provided
+        if style:
+            items = [item for item in items if style.lower() in [tag.lower() for tag in item.get("tags", [])]]
+        
+        # Filter by location if provided
+        if location:
+            items = [item for item in items if location_matches(location, item.get("location", ""))]
+        
+        if limit:
+            items = items[:limit]
     
     # Format the response
     return {
-        "text": f"Here are some {style if style else ''} {category} {f'in {location}' if location else ''}!",
+        "text": f"Here are some {style if style else ''} {category} {f'in {get_gazetteer().display_name(location)}' if location else ''}!",
         "carousel": {
             "title": f"{category.title()} Collection",
             "items": items
         }
     }
 
-def get_images_from_url(url: str) -> List[str]:
+def get_images_from_url(url: str, limit: int = 12) -> List[str]:
     """
     Extract image URLs from a webpage.
     
     Args:
         url: The URL of the webpage to scrape
+        limit: Maximum number of distinct images to return
         
     Returns:
         List of image URLs found on the page
     """
+    # Scraping dependencies are only needed here, so they load on first use
+    from bs4 import BeautifulSoup
+
     try:
-        response = requests.get(url)
-        response.raise_for_status()
-        soup = BeautifulSoup(response.text, 'html.parser')
+        soup = BeautifulSoup(fetch_page(url), 'html.parser')
         
         # Find all image tags
         images = []
@@ -197,7 +196,10 @@ def get_images_from_url(url: str) -> List[str]:
                 absolute_url = urljoin(url, src)
                 images.append(absolute_url)
         
-        return images
+        # The same photo often appears at several sizes or CDN paths. Hashing
+        # stops at `limit` photos or IMAGE_DEDUP_DEADLINE, whichever comes
+        # first. Browsers load the rest through /api/img when IMAGE_PROXY_BASE is set.
+        return [proxied_url(image) for image in dedupe_images(images, limit=limit)]
     except Exception as e:
         print(f"Error fetching images from URL: {e}")
         return []
@@ -236,14 +238,15 @@ def scrape_and_return(url: str) -> str:
     Returns:
         Formatted text content from the webpage
     """
+    import html2text
+
     try:
-        response = requests.get(url)
-        response.raise_for_status()
+        page = fetch_page(url)
         
         # Convert HTML to markdown
         h = html2text.HTML2Text()
         h.ignore_links = False
-        markdown = h.handle(response.text)
+        markdown = h.handle(page)
         
         return markdown
     except Exception as e:
@@ -0,0 +1,136 @@
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Optional
+
+import metrics
+
+
+class LLMTimeoutError(TimeoutError):
+    """The LLM did not answer within the per-call timeout."""
+
+
+class LLMInvoker:
+    """
+    Wraps chat model calls with a concurrency cap, timeouts and optional hedging.
+
+    - A process-wide semaphore bounds outstanding LLM requests (hedges included).
+    - Each call gives up after `timeout` seconds with LLMTimeoutError.
+    - With hedging on, a second identical request is sent once the first has
+      been running longer than the observed p95 latency; whichever answers
+      first is used.
+
+    Works with any object that has an `invoke(messages, **kwargs)` method, so it
+    can be tested against a fake model with injected latency.
+    """
+
+    def __init__(self, max_concurrency: int = 8, timeout: float = 30.0, hedge: bool = False,
+                 hedge_quantile: float = 0.95, hedge_min_samples: int = 20, hedge_min_delay: float = 0.2,
+                 window: int = 200):
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.hedge = hedge
+        self.hedge_quantile = hedge_quantile
+        self.hedge_min_samples = hedge_min_samples
+        self.hedge_min_delay = hedge_min_delay
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._latencies = deque(maxlen=window)
+        self._latency_lock = threading.Lock()
+        # Twice the cap, so a timed-out call still holding its thread can't starve new ones
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency * 2, thread_name_prefix="llm")
+
+    @classmethod
+    def from_env(cls) -> "LLMInvoker":
+        """Build an invoker from LLM_* environment variables."""
+        return cls(
+            max_concurrency=int(os.environ.get("LLM_MAX_CONCURRENCY", 8)),
+            timeout=float(os.environ.get("LLM_TIMEOUT", 30)),
+            hedge=os.environ.get("LLM_HEDGE", "0").lower() in ("1", "true", "yes"),
+            hedge_min_samples=int(os.environ.get("LLM_HEDGE_MIN_SAMPLES", 20)),
+        )
+
+    def hedge_delay(self) -> Optional[float]:
+        """Current hedging delay (the latency quantile), or None until enough samples exist."""
+        with self._latency_lock:
+            if len(self._latencies) < self.hedge_min_samples:
+                return None
+            ordered = sorted(self._latencies)
+        index = min(len(ordered) - 1, int(self.hedge_quantile * len(ordered)))
+        return max(self.hedge_min_delay, ordered[index])
+
+    def _record(self, latency: float, route: str):
+        with self._latency_lock:
+            self._latencies.append(latency)
+        metrics.observe("llm.latency", latency, route=route)
+
+    def _submit(self, llm: Any, messages: Any, kwargs: dict, route: str) -> Future:
+        """Run one request on the executor; the slot is released when it finishes."""
+        def call():
+            start = time.perf_counter()
+            try:
+                result = llm.invoke(messages, **kwargs)
+            finally:
+                self._slots.release()
+            self._record(time.perf_counter() - start, route)
+            return result
+        return self._executor.submit(call)
+
+    def invoke(self, llm: Any, messages: Any, timeout: Optional[float] = None, route: str = "default",
+               **kwargs) -> Any:
+        """
+        Call `llm.invoke(messages, **kwargs)` under the invoker's limits.
+
+        Args:
+            llm: Chat model (or anything with an invoke method)
+            messages: Messages to send
+            timeout: Per-call timeout in seconds, defaults to the invoker's
+            route: Label for latency metrics
+
+        Returns:
+            The model's response
+
+        Raises:
+            LLMTimeoutError: if no request answered in time
+            Exception: whatever the model raised, if every attempt failed
+        """
+        timeout = self.timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        metrics.increment("llm.calls", route=route)
+
+        if not self._slots.acquire(timeout=timeout):
+            metrics.increment("llm.timeouts", route=route, stage="queue")
+            raise LLMTimeoutError(f"No LLM slot free within {timeout}s")
+
+        primary = self._submit(llm, messages, kwargs, route)
+        pending = {primary}
+        hedge: Optional[Future] = None
+
+        delay = self.hedge_delay() if self.hedge else None
+        if delay is not None and delay < timeout:
+            done, _ = wait(pending, timeout=delay)
+            # Only hedge if there is spare capacity; hedges must not add to overload
+            if not done and self._slots.acquire(blocking=False):
+                hedge = self._submit(llm, messages, kwargs, route)
+                pending.add(hedge)
+                metrics.increment("llm.hedges", route=route)
+
+        error: Optional[BaseException] = None
+        while pending:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is hedge:
+                        metrics.increment("llm.hedge_wins", route=route)
+                    return future.result()
+                error = future.exception()
+
+        if error is not None and not pending:
+            metrics.increment("llm.errors", route=route)
+            raise error
+        metrics.increment("llm.timeouts", route=route, stage="call")
+        raise LLMTimeoutError(f"LLM did not answer within {timeout}s")
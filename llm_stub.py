@@ -0,0 +1,274 @@
+"""
+Local OpenAI-compatible chat-completions server for offline benchmarks.
+
+Speaks the subset of the API that ChatOpenAI uses (POST /v1/chat/completions,
+streamed or not, with tool calls) and answers with canned replies for the
+planning stage named in the system prompt. Latency, token rate, errors and
+rate limits are configurable, so the whole stack can be load tested
+without calling OpenAI.
+
+Usage:
+    python llm_stub.py --port 8090 --latency lognormal:0.8:0.5 --tokens-per-second 40
+    OPENAI_BASE_URL=http://localhost:8090/v1 python app.py
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+import re
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+from aiohttp import web
+
+STAGE_PATTERN = re.compile(r"Current Planning Stage:\s*(\w+)")
+
+# Canned replies per planning stage, picked at random
+STAGE_REPLIES = {
+    "initial": [
+        "Congratulations on your engagement! 💍 What style are you dreaming of: modern, rustic, boho or something classic?",
+        "How exciting! Tell me about the vibe you want. Elegant and traditional, or relaxed and boho?",
+    ],
+    "collecting_info": [
+        "Love it! Roughly how many guests are you expecting?",
+        "Beautiful choice. Do you have a location in mind?",
+        "Great! What kind of budget are you working with?",
+    ],
+    "sneak_peek": [
+        "Here's a sneak peek of what I can do for your dream day!",
+    ],
+    "exploring": [
+        "There's so much more to see. Want me to pull up some outdoor venues or lace dresses?",
+        "Those are gorgeous picks! Shall I show you a few more ideas?",
+    ],
+    "final_cta": [
+        "I'd love to keep helping. Just say the word and I'll get you on the list!",
+    ],
+}
+DEFAULT_REPLIES = ["Happy to help with your wedding plans! What would you like to see next?"]
+TOOL_RESULT_REPLY = "Here are some beautiful options I found for you!"
+TOOL_CATEGORIES = ["venues", "dresses", "hairstyles"]
+
+
+def parse_latency(spec: str) -> Callable[[random.Random], float]:
+    """
+    Sampler for a latency distribution spec, in seconds.
+
+    Specs: "fixed:S", "uniform:LOW:HIGH", "lognormal:MEDIAN:SIGMA" or
+    "exponential:MEAN".
+    """
+    kind, _, args = spec.partition(":")
+    try:
+        values = [float(value) for value in args.split(":")] if args else []
+        if kind == "fixed" and len(values) == 1:
+            return lambda rng: values[0]
+        if kind == "uniform" and len(values) == 2:
+            return lambda rng: rng.uniform(values[0], values[1])
+        if kind == "lognormal" and len(values) == 2:
+            return lambda rng: rng.lognormvariate(math.log(values[0]), values[1])
+        if kind == "exponential" and len(values) == 1:
+            return lambda rng: rng.expovariate(1 / values[0]) if values[0] else 0.0
+    except ValueError:
+        pass
+    raise ValueError(f"Invalid latency spec {spec!r}: use fixed:S, uniform:LOW:HIGH, lognormal:MEDIAN:SIGMA or exponential:MEAN")
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, (len(text) + 3) // 4)
+
+
+def _content(message: Dict[str, Any]) -> str:
+    content = message.get("content") or ""
+    if isinstance(content, list):
+        return " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+    return str(content)
+
+
+@dataclass
+class StubConfig:
+    """How the stub behaves; see the CLI flags for each field."""
+    latency: str = "lognormal:0.5:0.4"  # time to first token
+    tokens_per_second: float = 50.0  # 0 sends the whole reply at once
+    error_rate: float = 0.0  # share of requests answered 500
+    rate_limit_rate: float = 0.0  # share of requests answered 429
+    requests_per_minute: int = 0  # enforced limit, 0 for none
+    tool_call_rate: float = 0.0  # share of tool-enabled requests answered with a tool call
+    seed: Optional[int] = None
+
+
+class StubServer:
+    """State shared by the stub's request handlers."""
+
+    def __init__(self, config: StubConfig):
+        self.config = config
+        self.sample_latency = parse_latency(config.latency)
+        self.rng = random.Random(config.seed)
+        self._window_start = time.monotonic()
+        self._window_count = 0
+        self.stats = {"requests": 0, "streamed": 0, "errors": 0, "rate_limited": 0, "tool_calls": 0}
+
+    # === Behaviour ===
+    def _rate_limited(self) -> Optional[float]:
+        """Seconds until the next request is allowed, if this one is over the limit."""
+        if self.config.rate_limit_rate and self.rng.random() < self.config.rate_limit_rate:
+            return 1.0
+        limit = self.config.requests_per_minute
+        if not limit:
+            return None
+        now = time.monotonic()
+        if now - self._window_start >= 60:
+            self._window_start, self._window_count = now, 0
+        if self._window_count >= limit:
+            return 60 - (now - self._window_start)
+        self._window_count += 1
+        return None
+
+    def reply_for(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        """The assistant message for a request: a canned reply or a tool call."""
+        messages = body.get("messages") or []
+        if messages and messages[-1].get("role") == "tool":
+            return {"role": "assistant", "content": TOOL_RESULT_REPLY}
+        if body.get("tools") and self.config.tool_call_rate and self.rng.random() < self.config.tool_call_rate:
+            self.stats["tool_calls"] += 1
+            return {
+                "role": "assistant",
+                "content": None,
+                "tool_calls": [{
+                    "id": f"call_{uuid.uuid4().hex[:24]}",
+                    "type": "function",
+                    "function": {"name": "get_wedding_images",
+                                 "arguments": json.dumps({"category": self.rng.choice(TOOL_CATEGORIES)})},
+                }],
+            }
+        system = next((_content(m) for m in messages if m.get("role") == "system"), "")
+        match = STAGE_PATTERN.search(system)
+        replies = STAGE_REPLIES.get(match.group(1) if match else "", DEFAULT_REPLIES)
+        return {"role": "assistant", "content": self.rng.choice(replies)}
+
+    # === Handlers ===
+    @staticmethod
+    def _error(status: int, message: str, kind: str, headers: Optional[Dict[str, str]] = None) -> web.Response:
+        body = {"error": {"message": message, "type": kind, "param": None, "code": None}}
+        return web.json_response(body, status=status, headers=headers)
+
+    async def chat_completions(self, request: web.Request) -> web.StreamResponse:
+        self.stats["requests"] += 1
+        try:
+            body = await request.json()
+        except ValueError:
+            return self._error(400, "Request body is not valid JSON", "invalid_request_error")
+
+        retry_after = self._rate_limited()
+        if retry_after is not None:
+            self.stats["rate_limited"] += 1
+            return self._error(429, "Rate limit reached for requests", "rate_limit_exceeded",
+                               {"Retry-After": str(max(1, math.ceil(retry_after)))})
+        await asyncio.sleep(max(0.0, self.sample_latency(self.rng)))
+        if self.config.error_rate and self.rng.random() < self.config.error_rate:
+            self.stats["errors"] += 1
+            return self._error(500, "The server had an error while processing your request", "server_error")
+
+        message = self.reply_for(body)
+        prompt_tokens = sum(estimate_tokens(_content(m)) for m in body.get("messages") or [])
+        words = re.findall(r"\S+\s*", message["content"] or "")
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": len(words) or 1,
+                 "total_tokens": prompt_tokens + (len(words) or 1)}
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+        model = body.get("model", "gpt-4")
+        finish_reason = "tool_calls" if message.get("tool_calls") else "stop"
+
+        if body.get("stream"):
+            self.stats["streamed"] += 1
+            include_usage = (body.get("stream_options") or {}).get("include_usage")
+            return await self._stream(request, completion_id, model, message, words, finish_reason,
+                                      usage if include_usage else None)
+
+        if self.config.tokens_per_second:
+            await asyncio.sleep(len(words) / self.config.tokens_per_second)
+        return web.json_response({
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "message": message, "logprobs": None, "finish_reason": finish_reason}],
+            "usage": usage,
+        })
+
+    async def _stream(self, request: web.Request, completion_id: str, model: str, message: Dict[str, Any],
+                      words: List[str], finish_reason: str, usage: Optional[Dict[str, int]]) -> web.StreamResponse:
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache"})
+        await response.prepare(request)
+        created = int(time.time())
+
+        async def send(delta: Dict[str, Any], finish: Optional[str] = None, chunk_usage=None):
+            chunk = {"id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                     "choices": [{"index": 0, "delta": delta, "logprobs": None, "finish_reason": finish}]}
+            if chunk_usage is not None:
+                chunk["choices"], chunk["usage"] = [], chunk_usage
+            await response.write(f"data: {json.dumps(chunk)}\n\n".encode())
+
+        await send({"role": "assistant", "content": ""})
+        if message.get("tool_calls"):
+            call = message["tool_calls"][0]
+            await send({"tool_calls": [dict(call, index=0)]})
+        for word in words:
+            if self.config.tokens_per_second:
+                await asyncio.sleep(1 / self.config.tokens_per_second)
+            await send({"content": word})
+        await send({}, finish_reason)
+        if usage is not None:
+            await send({}, chunk_usage=usage)
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        return response
+
+    async def models(self, request: web.Request) -> web.Response:
+        return web.json_response({"object": "list", "data": [
+            {"id": "gpt-4", "object": "model", "created": 0, "owned_by": "stub"},
+        ]})
+
+    async def stats_handler(self, request: web.Request) -> web.Response:
+        return web.json_response(self.stats)
+
+
+def create_stub_app(config: Optional[StubConfig] = None) -> web.Application:
+    """aiohttp application serving the stub under /v1."""
+    server = StubServer(config or StubConfig())
+    app = web.Application()
+    app.router.add_post("/v1/chat/completions", server.chat_completions)
+    app.router.add_get("/v1/models", server.models)
+    app.router.add_get("/stats", server.stats_handler)
+    return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="OpenAI-compatible chat completions stub")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--latency", default=StubConfig.latency,
+                        help="Time to first token: fixed:S, uniform:LOW:HIGH, lognormal:MEDIAN:SIGMA or exponential:MEAN")
+    parser.add_argument("--tokens-per-second", type=float, default=StubConfig.tokens_per_second,
+                        help="Generation speed after the first token (0 for instant)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests answered 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Share of requests answered 429")
+    parser.add_argument("--rpm", type=int, default=0, help="Requests per minute before answering 429 (0 for no limit)")
+    parser.add_argument("--tool-call-rate", type=float, default=0.0,
+                        help="Share of tool-enabled requests answered with a get_wedding_images call")
+    parser.add_argument("--seed", type=int, help="Random seed for latencies, errors and replies")
+    args = parser.parse_args()
+
+    parse_latency(args.latency)  # fail fast on a bad spec
+    stub = create_stub_app(StubConfig(
+        latency=args.latency,
+        tokens_per_second=args.tokens_per_second,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        requests_per_minute=args.rpm,
+        tool_call_rate=args.tool_call_rate,
+        seed=args.seed,
+    ))
+    print(f"OpenAI stub on http://{args.host}:{args.port}/v1 (set OPENAI_BASE_URL to this)")
+    web.run_app(stub, host=args.host, port=args.port, print=None)
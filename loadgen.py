@@ -0,0 +1,295 @@
+"""
+Load generator: synthetic couples walking the planning funnel against /api/chat.
+
+Each virtual user picks its next message from the planning_stage in the last
+response, so the style, guest count, budget, sneak-peek, "show me more" and
+waitlist branches of agent_node and should_continue all get traffic. Requests
+are paced to a target rate; a user waits a think time after each reply
+before it is ready for its next turn. The report gives throughput, latency
+percentiles and errors per stage.
+
+Usage:
+    python loadgen.py --url http://localhost:8080 --rps 20 --duration 60
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+import sys
+import time
+import uuid
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+import aiohttp
+
+# === Phrasing ===
+GREETINGS = ["Hi!", "Hello there", "Hey, we just got engaged!", "hi, can you help us plan our wedding?"]
+STYLES = ["modern", "rustic", "boho", "classic", "elegant", "traditional", "vintage"]
+STYLE_PHRASES = [
+    "We're thinking of a {style} wedding",
+    "Something {style}, definitely",
+    "I love {style} vibes",
+    "Our style is pretty {style}",
+]
+INFO_PHRASES = {
+    "guests": ["We'll have about {n} guests", "Around {n} people will attend", "Roughly {n} guests I think"],
+    "budget": ["Our budget is {budget}", "We want to spend something {budget}", "Cost-wise we're {budget}"],
+    "location": ["We'd like a place in {place}", "Location-wise, somewhere in {place}", "Where? Ideally in {place}"],
+    "food": ["We want a family-style dinner", "Catering should be vegetarian friendly", "A taco menu would be fun"],
+    "special": ["One special request: a sparkler exit", "We have a family tradition of a tea ceremony"],
+}
+BUDGETS = ["small", "moderate", "large", "luxury", "affordable"]
+PLACES = ["tuscany", "napa valley", "the lake district", "austin", "santorini", "the mountains"]
+SNEAK_PEEK_PHRASES = ["show me", "yes please!", "next", "ooh, what else?", "more"]
+BROWSE_PHRASES = ["show me more", "what about outdoor venues?", "any lace dresses?", "hmm, something different"]
+PLANNING_PHRASES = ["continue planning", "let's dive into planning"]
+JOIN_PHRASES = ["join the waitlist", "I'd like to join!", "sign me up for the waitlist"]
+EXPLORE_PHRASES = ["continue exploring", "show me more first"]
+
+STAGE_ORDER = {stage: i for i, stage in enumerate(["initial", "collecting_info", "sneak_peek", "exploring", "final_cta"])}
+
+# Think times are log-normal: mostly short, with a long tail of slow readers
+THINK_SIGMA = 0.6
+MAX_TURNS = 25
+
+
+@dataclass
+class VirtualUser:
+    """One couple's session: its state round-trips through every request."""
+    rng: random.Random
+    browse_turns: int
+    joins: bool
+    session_id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    state: Optional[Dict] = None
+    turns: int = 0
+    topics: List[str] = field(default_factory=list)
+    asked_email: bool = False
+    done: bool = False
+
+    @classmethod
+    def create(cls, rng: random.Random, join_rate: float) -> "VirtualUser":
+        return cls(rng=rng, browse_turns=rng.randint(0, 3), joins=rng.random() < join_rate,
+                   topics=rng.sample(list(INFO_PHRASES), len(INFO_PHRASES)))
+
+    @property
+    def stage(self) -> str:
+        return (self.state or {}).get("planning_stage", "initial")
+
+    def next_message(self) -> str:
+        """The next thing this user types, given where the funnel left them."""
+        rng = self.rng
+        stage = self.stage
+        if stage == "initial":
+            if self.turns == 0 and rng.random() < 0.6:
+                return rng.choice(GREETINGS)
+            return rng.choice(STYLE_PHRASES).format(style=rng.choice(STYLES))
+        if stage == "collecting_info":
+            topic = self.topics.pop(0) if self.topics else "guests"
+            return rng.choice(INFO_PHRASES[topic]).format(
+                n=rng.choice([40, 80, 120, 150, 200, 250]), budget=rng.choice(BUDGETS), place=rng.choice(PLACES))
+        if stage == "sneak_peek":
+            return rng.choice(SNEAK_PEEK_PHRASES)
+        if stage == "exploring":
+            if self.browse_turns > 0:
+                self.browse_turns -= 1
+                return rng.choice(BROWSE_PHRASES)
+            return rng.choice(PLANNING_PHRASES)
+        # final_cta: join (then give an email) or go back to exploring
+        if not self.joins:
+            self.joins = True  # explore once, then join on the way back
+            return rng.choice(EXPLORE_PHRASES)
+        if self.asked_email:
+            return f"sure, it's loadtest+{self.session_id[:12]}@example.com"
+        self.asked_email = True
+        return rng.choice(JOIN_PHRASES)
+
+    def body(self, message: str) -> Dict:
+        return {"messages": [{"role": "user", "content": message}], "state": self.state, "session_id": self.session_id}
+
+    def update(self, response: Dict):
+        """Carry the returned state into the next turn."""
+        self.state = response.get("state") or self.state
+        self.turns += 1
+        self.done = bool((self.state or {}).get("email_collected")) or self.turns >= MAX_TURNS
+
+
+def percentile(samples: List[float], q: float) -> float:
+    """Nearest-rank percentile (q in 0-100) of unsorted samples."""
+    if not samples:
+        return float("nan")
+    ordered = sorted(samples)
+    return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)]
+
+
+class Report:
+    """Latencies and outcomes, per stage the request was sent from."""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, Counter] = defaultdict(Counter)
+        self.started = time.perf_counter()
+        self.finished: Optional[float] = None
+        self.users = 0
+        self.completed_users = 0
+        self.late = 0  # ticks skipped because `connections` requests were in flight
+
+    def record(self, stage: str, seconds: float, error: Optional[str] = None):
+        self.latencies[stage].append(seconds)
+        if error:
+            self.errors[stage][error] += 1
+
+    def summary(self) -> Dict:
+        elapsed = (self.finished or time.perf_counter()) - self.started
+        stages = {}
+        for stage in sorted(self.latencies, key=lambda s: STAGE_ORDER.get(s, len(STAGE_ORDER))):
+            samples = self.latencies[stage]
+            errors = sum(self.errors[stage].values())
+            stages[stage] = {
+                "requests": len(samples),
+                "errors": errors,
+                "error_rate": errors / len(samples),
+                "error_kinds": dict(self.errors[stage]),
+                **{f"p{q}_ms": percentile(samples, q) * 1000 for q in (50, 90, 99)},
+                "max_ms": max(samples) * 1000,
+            }
+        every = [s for samples in self.latencies.values() for s in samples]
+        errors = sum(stage["errors"] for stage in stages.values())
+        return {
+            "elapsed_s": elapsed,
+            "requests": len(every),
+            "throughput_rps": len(every) / elapsed if elapsed else 0.0,
+            "errors": errors,
+            "error_rate": errors / len(every) if every else 0.0,
+            **{f"p{q}_ms": percentile(every, q) * 1000 for q in (50, 90, 99)},
+            "users": self.users,
+            "completed_users": self.completed_users,
+            "late_ticks": self.late,
+            "stages": stages,
+        }
+
+
+async def _turn(session: aiohttp.ClientSession, url: str, user: VirtualUser, report: Report,
+                ready: asyncio.Queue, think: float, timeout: float):
+    stage = user.stage
+    message = user.next_message()
+    start = time.perf_counter()
+    error = None
+    try:
+        async with session.post(url, json=user.body(message), timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+            payload = await response.read()
+            if response.status != 200:
+                error = f"http_{response.status}"
+            else:
+                user.update(json.loads(payload))
+    except asyncio.TimeoutError:
+        error = "timeout"
+    except (aiohttp.ClientError, ValueError) as e:
+        error = type(e).__name__
+    report.record(stage, time.perf_counter() - start, error)
+
+    if error:
+        # A failed turn is retried after the think time, like a user pressing send again
+        user.turns += 1
+        user.done = user.turns >= MAX_TURNS
+    if user.done:
+        if (user.state or {}).get("email_collected"):
+            report.completed_users += 1
+        return
+    if think:
+        # The user thinks outside the request task, so it doesn't hold a connection slot
+        delay = user.rng.lognormvariate(math.log(think), THINK_SIGMA)
+        asyncio.get_running_loop().call_later(delay, ready.put_nowait, user)
+    else:
+        ready.put_nowait(user)
+
+
+async def run(url: str, rps: float, duration: float, connections: int = 100, think: float = 2.0,
+              join_rate: float = 0.5, timeout: float = 60.0, seed: Optional[int] = None) -> Dict:
+    """
+    Drive `url` (a server root or the /api/chat URL) at `rps` requests/second for `duration` seconds.
+
+    A pacer issues one request per tick to the next user whose think time
+    has passed, creating a new user when none is ready. In-flight requests
+    are capped at `connections`; users who are thinking don't count. The
+    elapsed time ends when the last request finishes, not after the think
+    times still pending then.
+
+    Returns:
+        The summary dict printed by the CLI
+    """
+    if not url.rstrip("/").endswith("/api/chat"):
+        url = url.rstrip("/") + "/api/chat"
+    rng = random.Random(seed)
+    report = Report()
+    ready: asyncio.Queue = asyncio.Queue()
+    tasks = set()
+    connector = aiohttp.TCPConnector(limit=connections)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        interval = 1.0 / rps
+        next_tick = time.perf_counter()
+        deadline = next_tick + duration
+        while next_tick < deadline:
+            if len(tasks) >= connections:
+                report.late += 1
+            else:
+                try:
+                    user = ready.get_nowait()
+                except asyncio.QueueEmpty:
+                    user = VirtualUser.create(random.Random(rng.random()), join_rate)
+                    report.users += 1
+                task = asyncio.create_task(_turn(session, url, user, report, ready, think, timeout))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            next_tick += interval
+            delay = next_tick - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            else:
+                await asyncio.sleep(0)
+        # Let in-flight requests finish; users still thinking are not resumed
+        in_flight = list(tasks)
+        if in_flight:
+            await asyncio.wait(in_flight, timeout=timeout)
+        report.finished = time.perf_counter()
+        for task in list(tasks):
+            task.cancel()
+    return report.summary()
+
+
+def print_report(summary: Dict):
+    print(f"{summary['requests']} requests in {summary['elapsed_s']:.1f}s: "
+          f"{summary['throughput_rps']:.1f} req/s, {summary['error_rate']:.1%} errors, "
+          f"p50 {summary['p50_ms']:.0f} ms, p90 {summary['p90_ms']:.0f} ms, p99 {summary['p99_ms']:.0f} ms")
+    print(f"{summary['users']} users started, {summary['completed_users']} joined the waitlist, "
+          f"{summary['late_ticks']} ticks skipped at the connection limit\n")
+    print(f"  {'stage':<16} {'requests':>8} {'errors':>7} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    for stage, row in summary["stages"].items():
+        print(f"  {stage:<16} {row['requests']:>8} {row['error_rate']:>7.1%} {row['p50_ms']:>8.0f} "
+              f"{row['p90_ms']:>8.0f} {row['p99_ms']:>8.0f} {row['max_ms']:>8.0f}")
+        if row["error_kinds"]:
+            print(f"  {'':<16} {', '.join(f'{kind}: {count}' for kind, count in row['error_kinds'].items())}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simulate wedding-planning funnels against /api/chat")
+    parser.add_argument("--url", default="http://localhost:8080", help="Server root or /api/chat URL")
+    parser.add_argument("--rps", type=float, default=10, help="Target requests per second")
+    parser.add_argument("--duration", type=float, default=60, help="Seconds to generate load")
+    parser.add_argument("--connections", type=int, default=100, help="Maximum requests in flight")
+    parser.add_argument("--think", type=float, default=2.0, help="Median think time between turns (0 disables)")
+    parser.add_argument("--join-rate", type=float, default=0.5, help="Share of users who join the waitlist first time")
+    parser.add_argument("--timeout", type=float, default=60, help="Per-request timeout in seconds")
+    parser.add_argument("--seed", type=int, help="Random seed for reproducible conversations")
+    parser.add_argument("--json", action="store_true", help="Print the summary as JSON")
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args.url, args.rps, args.duration, args.connections, args.think,
+                             args.join_rate, args.timeout, args.seed))
+    if args.json:
+        json.dump(result, sys.stdout, indent=2)
+        print()
+    else:
+        print_report(result)
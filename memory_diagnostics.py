@@ -0,0 +1,238 @@
+import gc
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter, OrderedDict
+from typing import Any, Dict, List, Mapping, Optional
+
+import metrics
+
+# Frames of tracemalloc itself and the import machinery are noise in a diff
+SNAPSHOT_FILTERS = [
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+]
+KEY_TYPES = ("lineno", "filename", "traceback")
+
+
+def rss_bytes() -> Optional[int]:
+    """Resident set size of this process, or None where /proc is unavailable."""
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def deep_size(obj: Any, seen: Optional[set] = None) -> int:
+    """
+    Bytes reachable from `obj` through containers, attributes and slots.
+
+    Modules, classes and functions are not followed. Objects shared with
+    other sessions (catalog items, interned strings) are counted here too,
+    so this is an upper bound on what the session alone retains.
+    """
+    seen = set() if seen is None else seen
+    stack = [obj]
+    total = 0
+    while stack:
+        item = stack.pop()
+        if id(item) in seen or isinstance(item, (type, type(sys), type(deep_size))):
+            continue
+        seen.add(id(item))
+        total += sys.getsizeof(item, 0)
+        if isinstance(item, (str, bytes, bytearray, int, float, bool)) or item is None:
+            continue
+        if isinstance(item, Mapping):
+            stack.extend(item.keys())
+            stack.extend(item.values())
+        elif isinstance(item, (list, tuple, set, frozenset)):
+            stack.extend(item)
+        if hasattr(item, "__dict__"):
+            stack.append(item.__dict__)
+        for cls in type(item).__mro__:
+            for name in getattr(cls, "__slots__", ()):
+                if name not in ("__dict__", "__weakref__") and hasattr(item, name):
+                    stack.append(getattr(item, name))
+    return total
+
+
+def object_counts() -> Dict[str, Any]:
+    """
+    Live objects of the types suspected of leaking: LangChain messages,
+    compiled graphs, chat logs and HTTP clients.
+
+    Only types from modules that are already imported are counted.
+    """
+    message_type = getattr(sys.modules.get("langchain_core.messages"), "BaseMessage", None)
+    graph_type = getattr(sys.modules.get("langgraph.graph.state"), "CompiledStateGraph", None)
+    chat_log_module = sys.modules.get("chat_log")
+    chat_log_types = (chat_log_module.ChatLog, chat_log_module._Store) if chat_log_module else ()
+    tavily_type = getattr(sys.modules.get("tavily"), "TavilyClient", None)
+
+    messages, graphs, logs, clients = Counter(), 0, Counter(), 0
+    for obj in gc.get_objects():
+        cls = type(obj)
+        if message_type is not None and isinstance(obj, message_type):
+            messages[cls.__name__] += 1
+        elif graph_type is not None and isinstance(obj, graph_type):
+            graphs += 1
+        elif chat_log_types and isinstance(obj, chat_log_types):
+            logs[cls.__name__] += 1
+        elif tavily_type is not None and isinstance(obj, tavily_type):
+            clients += 1
+    return {
+        "messages": dict(messages),
+        "messages_total": sum(messages.values()),
+        "compiled_graphs": graphs,
+        "chat_logs": logs.get("ChatLog", 0),
+        "chat_log_stores": logs.get("_Store", 0),
+        "tavily_clients": clients,
+        "gc_objects": len(gc.get_objects()),
+    }
+
+
+def session_memory(stores: Dict[str, Mapping[str, Any]], sample: int = 100) -> Dict[str, Any]:
+    """
+    Average bytes retained per session across the per-session stores.
+
+    Args:
+        stores: Store name -> {session_id: retained value}
+        sample: Sessions measured per store; the average is extrapolated
+
+    Returns:
+        {"sessions", "avg_bytes_per_session", "stores": {name: {"sessions", "avg_bytes", "total_bytes"}}}
+    """
+    sessions = set()
+    report = {}
+    total = 0
+    for name, entries in stores.items():
+        sessions.update(entries)
+        measured = [deep_size(value) for _, value in zip(range(sample), entries.values())]
+        average = sum(measured) / len(measured) if measured else 0
+        report[name] = {"sessions": len(entries), "avg_bytes": round(average), "total_bytes": round(average * len(entries))}
+        total += average * len(entries)
+    return {
+        "sessions": len(sessions),
+        "avg_bytes_per_session": round(total / len(sessions)) if sessions else 0,
+        "stores": report,
+    }
+
+
+def _site(stat: tracemalloc.StatisticDiff, key_type: str):
+    if key_type == "traceback":
+        return [str(frame) for frame in stat.traceback]
+    if key_type == "filename":
+        return stat.traceback[0].filename
+    return str(stat.traceback[0])
+
+
+class MemoryDiagnostics:
+    """
+    tracemalloc snapshots kept in the worker for diffing.
+
+    Tracing starts with the first snapshot and costs CPU and memory on every
+    allocation until `stop` is called, so it stays off by default. The most
+    recent `max_snapshots` snapshots are kept. Snapshots live in one worker
+    process, so results carry its pid; `measure` takes both snapshots of a
+    diff in a single call.
+    """
+
+    def __init__(self, max_snapshots: int = 4, frames: int = 10):
+        self.max_snapshots = max_snapshots
+        self.frames = frames
+        self._snapshots: "OrderedDict[int, tracemalloc.Snapshot]" = OrderedDict()
+        self._next_id = 1
+        self._lock = threading.Lock()
+
+    def take_snapshot(self) -> Dict[str, Any]:
+        """Start tracing if needed and keep a snapshot. Returns its id and size."""
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+        snapshot = tracemalloc.take_snapshot().filter_traces(SNAPSHOT_FILTERS)
+        with self._lock:
+            snapshot_id = self._next_id
+            self._next_id += 1
+            self._snapshots[snapshot_id] = snapshot
+            while len(self._snapshots) > self.max_snapshots:
+                self._snapshots.popitem(last=False)
+        traced, peak = tracemalloc.get_traced_memory()
+        metrics.increment("memory.snapshots")
+        return {"id": snapshot_id, "pid": os.getpid(), "traced_bytes": traced, "peak_bytes": peak,
+                "traces": len(snapshot.traces)}
+
+    def diff(self, first: int, second: int, key_type: str = "lineno", limit: int = 25) -> Dict[str, Any]:
+        """
+        Allocation sites that grew most from snapshot `first` to `second`.
+
+        Raises:
+            KeyError: An id is not (or no longer) kept
+            ValueError: Unknown key_type
+        """
+        if key_type not in KEY_TYPES:
+            raise ValueError(f"key_type must be one of {', '.join(KEY_TYPES)}")
+        with self._lock:
+            before, after = self._snapshots[first], self._snapshots[second]
+        stats = after.compare_to(before, key_type)
+        return {
+            "pid": os.getpid(),
+            "from": first,
+            "to": second,
+            "size_diff": sum(stat.size_diff for stat in stats),
+            "count_diff": sum(stat.count_diff for stat in stats),
+            "top": [
+                {
+                    "site": _site(stat, key_type),
+                    "size_diff": stat.size_diff,
+                    "size": stat.size,
+                    "count_diff": stat.count_diff,
+                    "count": stat.count,
+                }
+                for stat in stats[:limit]
+            ],
+        }
+
+    def measure(self, interval: float, key_type: str = "lineno", limit: int = 25) -> Dict[str, Any]:
+        """
+        Snapshot, wait `interval` seconds and diff against a second snapshot.
+
+        Both snapshots come from this worker, whichever one serves the next
+        request. Tracing started for the measurement is stopped afterwards.
+
+        Raises:
+            ValueError: Unknown key_type
+        """
+        if key_type not in KEY_TYPES:
+            raise ValueError(f"key_type must be one of {', '.join(KEY_TYPES)}")
+        started = not tracemalloc.is_tracing()
+        try:
+            first = self.take_snapshot()["id"]
+            time.sleep(interval)
+            second = self.take_snapshot()["id"]
+            return dict(self.diff(first, second, key_type, limit), interval=interval)
+        finally:
+            if started:
+                self.stop()
+
+    def snapshots(self) -> List[int]:
+        with self._lock:
+            return list(self._snapshots)
+
+    def stop(self):
+        """Stop tracing and drop every snapshot."""
+        with self._lock:
+            self._snapshots.clear()
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    def status(self) -> Dict[str, Any]:
+        traced, peak = tracemalloc.get_traced_memory() if tracemalloc.is_tracing() else (0, 0)
+        return {"tracing": tracemalloc.is_tracing(), "snapshots": self.snapshots(),
+                "traced_bytes": traced, "peak_bytes": peak}
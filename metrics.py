@@ -0,0 +1,65 @@
+import threading
+from typing import Dict, Tuple
+
+# In-process metrics registry. Each worker process keeps its own numbers;
+# GET /api/metrics reports the worker that served the request.
+_lock = threading.Lock()
+_counters: Dict[str, float] = {}
+_gauges: Dict[str, float] = {}
+_summaries: Dict[str, Tuple[int, float, float]] = {}  # count, sum, max
+
+
+def _key(name: str, labels: Dict[str, object]) -> str:
+    """Format a metric name with its labels, e.g. chat.shed{reason=queue_full}."""
+    if not labels:
+        return name
+    formatted = ",".join(f"{label}={labels[label]}" for label in sorted(labels))
+    return f"{name}{{{formatted}}}"
+
+
+def increment(name: str, value: float = 1, **labels) -> None:
+    """Add to a counter."""
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def set_gauge(name: str, value: float, **labels) -> None:
+    """Set a gauge to its current value."""
+    key = _key(name, labels)
+    with _lock:
+        _gauges[key] = value
+
+
+def observe(name: str, value: float, **labels) -> None:
+    """Record one observation (e.g. a latency) in a count/sum/max summary."""
+    key = _key(name, labels)
+    with _lock:
+        count, total, maximum = _summaries.get(key, (0, 0.0, float("-inf")))
+        _summaries[key] = (count + 1, total + value, max(maximum, value))
+
+
+def get_counter(name: str, **labels) -> float:
+    with _lock:
+        return _counters.get(_key(name, labels), 0)
+
+
+def snapshot() -> Dict[str, Dict]:
+    """Copy of every metric, for the metrics endpoint."""
+    with _lock:
+        return {
+            "counters": dict(_counters),
+            "gauges": dict(_gauges),
+            "summaries": {
+                key: {"count": count, "sum": round(total, 6), "avg": round(total / count, 6), "max": round(maximum, 6)}
+                for key, (count, total, maximum) in _summaries.items()
+            },
+        }
+
+
+def reset() -> None:
+    """Clear every metric (used by tests)."""
+    with _lock:
+        _counters.clear()
+        _gauges.clear()
+        _summaries.clear()
@@ -0,0 +1,157 @@
+import json
+import os
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+
+import metrics
+
+# Turn types passed by call_model
+REPLY = "reply"  # answering the user (tools available)
+TOOL_FOLLOWUP = "tool_followup"  # answering from tool results
+ANY = "*"
+
+
+@dataclass(frozen=True)
+class Route:
+    """
+    Model settings for one kind of turn.
+
+    Attributes:
+        name: Label used in metrics
+        model: OpenAI model name
+        temperature: Sampling temperature
+        max_tokens: Completion cap, or None for the model's default
+    """
+    name: str
+    model: str
+    temperature: float = 0.7
+    max_tokens: Optional[int] = None
+
+
+# What get_llm() builds; every route falls back to it
+DEFAULT_ROUTE = Route("default", "gpt-4", 0.7)
+
+# (planning_stage, turn type) -> route. Short one-slot questions and
+# summaries of tool output don't need the large model.
+DEFAULT_ROUTES: Dict[Tuple[str, str], Route] = {
+    ("initial", ANY): Route("greeting", "gpt-4o-mini", 0.7, 250),
+    ("collecting_info", ANY): Route("slot_question", "gpt-4o-mini", 0.5, 150),
+    (ANY, TOOL_FOLLOWUP): Route("tool_summary", "gpt-4o-mini", 0.5, 400),
+}
+
+# USD per million tokens (prompt, completion), for the per-route cost metrics
+PRICES: Dict[str, Tuple[float, float]] = {
+    "gpt-4": (30.0, 60.0),
+    "gpt-4-turbo": (10.0, 30.0),
+    "gpt-4o": (2.5, 10.0),
+    "gpt-4o-mini": (0.15, 0.6),
+    "gpt-4.1": (2.0, 8.0),
+    "gpt-4.1-mini": (0.4, 1.6),
+    "gpt-4.1-nano": (0.1, 0.4),
+    "gpt-3.5-turbo": (0.5, 1.5),
+}
+
+
+def parse_routes(spec: str) -> Dict[Tuple[str, str], Optional[Route]]:
+    """
+    Routes from a MODEL_ROUTES JSON object.
+
+    Keys are "stage" or "stage/turn" ("*" matches any); values are
+    {"model", "temperature", "max_tokens", "name"} or null to drop a
+    default route, e.g.
+    {"collecting_info": {"model": "gpt-4.1-nano"}, "*/tool_followup": null}
+    """
+    routes: Dict[Tuple[str, str], Optional[Route]] = {}
+    for key, settings in json.loads(spec).items():
+        stage, _, turn = key.partition("/")
+        if settings is None:
+            routes[(stage, turn or ANY)] = None
+            continue
+        routes[(stage, turn or ANY)] = Route(
+            name=settings.get("name") or key.replace("/", "_").replace("*", "any"),
+            model=settings["model"],
+            temperature=float(settings.get("temperature", DEFAULT_ROUTE.temperature)),
+            max_tokens=settings.get("max_tokens"),
+        )
+    return routes
+
+
+class ModelRouter:
+    """
+    Picks the model, temperature and max_tokens per planning stage and turn type.
+
+    Each route gets its own client, derived from the default one, so
+    connection settings (API key, base URL, timeouts) are shared. Models
+    that can't be re-parameterized (test doubles) are used as they are.
+    """
+
+    def __init__(self, routes: Optional[Dict[Tuple[str, str], Route]] = None, default: Route = DEFAULT_ROUTE,
+                 enabled: bool = True):
+        self.routes = dict(DEFAULT_ROUTES if routes is None else routes)
+        self.default = default
+        self.enabled = enabled
+        self._clients: Dict[Tuple[int, Route], Tuple[Any, Any]] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "ModelRouter":
+        """Build a router; MODEL_ROUTING=0 sends everything to the default model, MODEL_ROUTES adjusts the table."""
+        routes = dict(DEFAULT_ROUTES)
+        spec = os.environ.get("MODEL_ROUTES")
+        if spec:
+            for key, route in parse_routes(spec).items():
+                if route is None:
+                    routes.pop(key, None)
+                else:
+                    routes[key] = route
+        return cls(routes, enabled=os.environ.get("MODEL_ROUTING", "1") != "0")
+
+    def route(self, stage: str, turn: str = REPLY) -> Route:
+        """The route for a turn: exact match, then any turn in the stage, then the turn in any stage."""
+        if not self.enabled:
+            return self.default
+        for key in ((stage, turn), (stage, ANY), (ANY, turn)):
+            if key in self.routes:
+                return self.routes[key]
+        return self.default
+
+    def client(self, base: Any, route: Route) -> Any:
+        """The chat model for `route`, derived from the default model `base` and cached."""
+        if route == self.default or not hasattr(base, "model_name"):
+            return base
+        key = (id(base), route)
+        with self._lock:
+            cached = self._clients.get(key)
+            if cached is None:
+                client = base.model_copy(update={
+                    "model_name": route.model,
+                    "temperature": route.temperature,
+                    "max_tokens": route.max_tokens,
+                })
+                # The base is kept alongside so its id stays a valid key
+                cached = self._clients[key] = (base, client)
+        return cached[1]
+
+    def record(self, route: Route, usage: Optional[Dict[str, int]]):
+        """
+        Tokens and estimated cost of one call on a route.
+
+        Calls, latency and errors per route are recorded by LLMInvoker
+        (llm.calls, llm.latency, llm.errors with the same route label).
+        """
+        if not usage:
+            return
+        metrics.increment("llm.route.prompt_tokens", usage["prompt"], route=route.name)
+        metrics.increment("llm.route.completion_tokens", usage["completion"], route=route.name)
+        prices = PRICES.get(route.model)
+        if prices is not None:
+            cost = (usage["prompt"] * prices[0] + usage["completion"] * prices[1]) / 1_000_000
+            metrics.increment("llm.route.cost_usd", cost, route=route.name)
+            metrics.observe("llm.route.cost_per_call_usd", cost, route=route.name)
+
+    def fallback(self, route: Route, error: Exception) -> Route:
+        """The route to retry on after `route` failed."""
+        print(f"Model route {route.name} ({route.model}) failed, falling back to {self.default.model}: {error}")
+        metrics.increment("llm.route.fallbacks", route=route.name)
+        return self.default
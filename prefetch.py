@@ -0,0 +1,116 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+import metrics
+
+
+class Prefetcher:
+    """
+    Per-session slot holding work prepared ahead of the next turn.
+
+    After serving one step of a predictable sequence, the caller schedules the
+    next step for that session; it is built on a small thread pool while the
+    user reads the current reply. On the next turn `take` returns the prepared
+    result if its key still matches (same step, same inputs). Otherwise the
+    slot is dropped and counted as wasted.
+
+    Slots are per process, so with several workers a session only hits when it
+    lands on the worker that prefetched for it.
+    """
+
+    def __init__(self, max_sessions: int = 10000, ttl: float = 600.0, max_workers: int = 2,
+                 wait_timeout: float = 1.0, name: str = "prefetch"):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.wait_timeout = wait_timeout
+        self.name = name
+        self._slots: "OrderedDict[str, Tuple[Hashable, Future, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._hits = 0
+        self._misses = 0
+
+    @classmethod
+    def from_env(cls, name: str = "prefetch") -> "Prefetcher":
+        """Build a prefetcher from PREFETCH_* environment variables."""
+        return cls(
+            max_sessions=int(os.environ.get("PREFETCH_MAX_SESSIONS", 10000)),
+            ttl=float(os.environ.get("PREFETCH_TTL", 600)),
+            max_workers=int(os.environ.get("PREFETCH_WORKERS", 2)),
+            name=name,
+        )
+
+    def _waste(self, reason: str):
+        metrics.increment(f"{self.name}.wasted", reason=reason)
+
+    def schedule(self, session_id: str, key: Hashable, build: Callable[[], Any]):
+        """
+        Start building `build()` for the session's next turn.
+
+        Args:
+            session_id: Session the slot belongs to
+            key: Identifies what was built; `take` must ask for the same key
+            build: Zero-argument function producing the result
+        """
+        future = self._executor.submit(build)
+        with self._lock:
+            previous = self._slots.pop(session_id, None)
+            if previous is not None:
+                self._waste("superseded")
+            self._slots[session_id] = (key, future, time.monotonic())
+            if len(self._slots) > self.max_sessions:
+                self._slots.popitem(last=False)
+                self._waste("evicted")
+        metrics.increment(f"{self.name}.scheduled")
+
+    def take(self, session_id: Optional[str], key: Hashable) -> Optional[Any]:
+        """
+        Claim the session's prefetched result for `key`.
+
+        Returns:
+            The result, or None on a miss (nothing prefetched, wrong key,
+            expired, failed or still not ready after `wait_timeout`)
+        """
+        with self._lock:
+            slot = self._slots.pop(session_id, None) if session_id else None
+
+        result = None
+        if slot is not None:
+            slot_key, future, created = slot
+            if slot_key != key:
+                self._waste("stale")
+            elif time.monotonic() - created > self.ttl:
+                self._waste("expired")
+            else:
+                try:
+                    result = future.result(timeout=self.wait_timeout)
+                except FutureTimeoutError:
+                    self._waste("late")
+                except Exception as e:
+                    print(f"Prefetch failed: {e}")
+                    self._waste("failed")
+
+        with self._lock:
+            if result is None:
+                self._misses += 1
+            else:
+                self._hits += 1
+            hit_rate = self._hits / (self._hits + self._misses)
+        metrics.increment(f"{self.name}.hits" if result is not None else f"{self.name}.misses")
+        metrics.set_gauge(f"{self.name}.hit_rate", round(hit_rate, 4))
+        return result
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._slots)
+
+    def sessions_snapshot(self) -> Dict[str, Any]:
+        """Per-session slots (finished results only), for memory diagnostics."""
+        with self._lock:
+            slots = list(self._slots.items())
+        return {session_id: (key, future.result()) for session_id, (key, future, _) in slots
+                if future.done() and not future.exception()}
@@ -0,0 +1,203 @@
+import hmac
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+from flask import Flask, g, request
+
+import metrics
+
+PROFILE_HEADER = "X-Profile"
+PROFILE_ID_HEADER = "X-Profile-Id"
+# Paths a PROFILE_SAMPLE_RATE draw applies to; the admin header works on any path
+SAMPLED_PATHS = ("/api/chat",)
+# Stack depth kept per sample, innermost frames first
+MAX_DEPTH = 128
+
+# Synchronization internals: in the top-N summary, time blocked here counts
+# as self time of the caller (e.g. LLMInvoker waiting on the model)
+WAIT_FILES = {"threading.py", "_base.py", "queue.py", "selectors.py"}
+
+Stack = Tuple[str, ...]
+
+
+def _label(code) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _file(label: str) -> str:
+    return label.rsplit("(", 1)[-1].split(":", 1)[0]
+
+
+class SamplingProfiler:
+    """
+    Wall-clock sampling profiler for one thread.
+
+    A background thread records the target thread's stack every `interval`
+    seconds. Time spent blocked (waiting on the LLM, a tool or a lock) shows
+    up like CPU time, which is what matters for a slow conversation. Work
+    handed to pool threads appears as the wait in the requesting frame.
+    """
+
+    def __init__(self, thread_id: Optional[int] = None, interval: float = 0.005):
+        self.thread_id = thread_id if thread_id is not None else threading.get_ident()
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self.started: Optional[float] = None
+        self.elapsed = 0.0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "SamplingProfiler":
+        self.started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> "SamplingProfiler":
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+            self.elapsed = time.perf_counter() - self.started
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None and len(stack) < MAX_DEPTH:
+                stack.append(_label(frame.f_code))
+                frame = frame.f_back
+            if stack:
+                self.samples[tuple(reversed(stack))] += 1
+
+    def folded(self) -> str:
+        """Samples in the folded-stack format read by flamegraph.pl, speedscope and inferno."""
+        return "".join(f"{';'.join(stack)} {count}\n" for stack, count in self.samples.most_common())
+
+    def top(self, n: int = 25) -> List[Tuple[str, int, int]]:
+        """
+        The `n` frames where most time was spent: (frame, self samples, cumulative samples).
+
+        Ranked by self samples; frames on every stack (the WSGI server,
+        Flask) would otherwise fill a cumulative ranking.
+        """
+        own, total = Counter(), Counter()
+        for stack, count in self.samples.items():
+            leaf = len(stack) - 1
+            while leaf > 0 and _file(stack[leaf]) in WAIT_FILES:
+                leaf -= 1
+            own[stack[leaf]] += count
+            for frame in set(stack):
+                total[frame] += count
+        ranked = sorted(own, key=lambda frame: (own[frame], total[frame]), reverse=True)
+        return [(frame, own[frame], total[frame]) for frame in ranked[:n]]
+
+    def summary(self, tags: Dict[str, str], n: int = 25) -> str:
+        samples = sum(self.samples.values()) or 1
+        lines = [" ".join(f"{key}={value}" for key, value in tags.items()),
+                 f"{self.elapsed * 1000:.1f} ms wall, {samples} samples every {self.interval * 1000:g} ms", "",
+                 f"{'self %':>7} {'cum %':>7}  frame"]
+        for frame, own, cumulative in self.top(n):
+            lines.append(f"{own / samples:>7.1%} {cumulative / samples:>7.1%}  {frame}")
+        return "\n".join(lines) + "\n"
+
+
+def _safe(value) -> str:
+    return re.sub(r"[^A-Za-z0-9_.-]", "_", str(value or "none"))[:64]
+
+
+class RequestProfiling:
+    """
+    Opt-in profiling of whole requests.
+
+    A request is profiled when it carries `X-Profile: <PROFILE_TOKEN>`, or,
+    for chat requests, with probability `sample_rate`. Each profile is
+    written to `directory` as `<id>.folded` (flame graph input) and
+    `<id>.txt` (top frames), tagged with the session and planning stage.
+    The id is returned in the X-Profile-Id header.
+    """
+
+    def __init__(self, token: Optional[str] = None, sample_rate: float = 0.0, directory: str = "profiles",
+                 interval: float = 0.005, top: int = 25):
+        self.token = token
+        self.sample_rate = sample_rate
+        self.directory = directory
+        self.interval = interval
+        self.top = top
+
+    @classmethod
+    def from_env(cls) -> "RequestProfiling":
+        """Build from PROFILE_* environment variables."""
+        return cls(
+            token=os.environ.get("PROFILE_TOKEN") or None,
+            sample_rate=float(os.environ.get("PROFILE_SAMPLE_RATE", 0)),
+            directory=os.environ.get("PROFILE_DIR", "profiles"),
+            interval=float(os.environ.get("PROFILE_INTERVAL_MS", 5)) / 1000,
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.token) or self.sample_rate > 0
+
+    def wanted(self) -> bool:
+        """Whether the current request should be profiled."""
+        header = request.headers.get(PROFILE_HEADER)
+        if header and self.token and hmac.compare_digest(header, self.token):
+            return True
+        return self.sample_rate > 0 and request.path in SAMPLED_PATHS and random.random() < self.sample_rate
+
+    def before_request(self):
+        if self.wanted():
+            g.profiler = SamplingProfiler(interval=self.interval).start()
+
+    def after_request(self, response):
+        profiler = g.pop("profiler", None)
+        if profiler is None:
+            return response
+        profiler.stop()
+        tags = {
+            "path": request.path,
+            "session": g.get("session_id"),
+            "stage": g.get("planning_stage"),
+            "status": response.status_code,
+        }
+        profile_id = "-".join([time.strftime("%Y%m%dT%H%M%S", time.gmtime()), _safe(tags["session"]),
+                               _safe(tags["stage"]), f"{random.getrandbits(24):06x}"])
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(os.path.join(self.directory, profile_id + ".folded"), "w") as out:
+                out.write(profiler.folded())
+            with open(os.path.join(self.directory, profile_id + ".txt"), "w") as out:
+                out.write(profiler.summary(tags, self.top))
+        except OSError as e:
+            print(f"Could not write profile {profile_id}: {e}")
+            return response
+        metrics.increment("profiling.requests")
+        metrics.observe("profiling.request_seconds", profiler.elapsed)
+        response.headers[PROFILE_ID_HEADER] = profile_id
+        return response
+
+    def teardown_request(self, error=None):
+        # The response failed before after_request: don't leave the sampler running
+        profiler = g.pop("profiler", None)
+        if profiler is not None:
+            profiler.stop()
+
+
+def init_profiling(app: Flask) -> Optional[RequestProfiling]:
+    """Install request profiling if PROFILE_TOKEN or PROFILE_SAMPLE_RATE is set; otherwise add no hooks at all."""
+    profiling = RequestProfiling.from_env()
+    if not profiling.enabled:
+        return None
+    app.extensions["profiling"] = profiling
+    app.before_request(profiling.before_request)
+    app.after_request(profiling.after_request)
+    app.teardown_request(profiling.teardown_request)
+    return profiling
@@ -0,0 +1,219 @@
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from gazetteer import location_matches
+
+# Price tiers used across the catalog ("$" .. "$$$$")
+PRICE_LEVELS = {"$": 1.0, "$$": 2.0, "$$$": 3.0, "$$$$": 4.0}
+
+# Budget answers collected in the "collecting_info" stage mapped to a price tier
+BUDGET_LEVELS = {
+    "small": 1.0,
+    "affordable": 1.0,
+    "moderate": 2.0,
+    "large": 3.0,
+    "expensive": 3.0,
+    "luxury": 4.0,
+}
+
+# Style keywords recognised by agent_node, plus the catalog's own style words
+STYLE_KEYWORDS = [
+    "modern", "rustic", "boho", "bohemian", "classic", "elegant",
+    "traditional", "contemporary", "vintage", "luxury", "french",
+]
+
+# Some styles are spelled differently by users and in the catalog
+STYLE_ALIASES = {"bohemian": "boho"}
+
+# Relative weight of each signal in the final score
+STYLE_WEIGHT = 2.0
+LOCATION_WEIGHT = 1.5
+BUDGET_WEIGHT = 1.0
+GUEST_WEIGHT = 1.0
+
+
+def _normalize_style(style: str) -> str:
+    style = style.strip().lower()
+    return STYLE_ALIASES.get(style, style)
+
+
+def _item_tags(item: Dict[str, Any]) -> List[str]:
+    """Collect the lowercase tags of an item plus any style keyword in its title."""
+    tags = {_normalize_style(tag) for tag in item.get("tags", []) if tag}
+    title_words = str(item.get("title", "")).lower().replace("-", " ").split()
+    for word in title_words:
+        if word in STYLE_KEYWORDS:
+            tags.add(_normalize_style(word))
+    return sorted(tags)
+
+
+class CatalogRanker:
+    """
+    Scores catalog items against the preferences collected in AgentState.
+
+    The catalog is held as NumPy feature arrays so that a whole category is
+    scored in one vectorized pass:
+        - tags: (n_items, n_tags) float32 multi-hot matrix, column-major so the
+          handful of columns a preference touches are contiguous
+        - prices: (n_items,) float32 price tier, NaN when unknown
+        - capacities: (n_items,) float32 guest capacity, NaN when unknown
+        - location_ids: (n_items,) int32 index into the location vocabulary,
+          i.e. a one-hot location matrix stored as indices
+    """
+
+    def __init__(self, items: Sequence[Dict[str, Any]]):
+        self.items = list(items)
+        n_items = len(self.items)
+
+        tag_lists = [_item_tags(item) for item in self.items]
+        self.tag_index = {
+            tag: i for i, tag in enumerate(sorted({tag for tags in tag_lists for tag in tags}))
+        }
+        self.tags = np.zeros((n_items, len(self.tag_index)), dtype=np.float32, order="F")
+        for row, tags in enumerate(tag_lists):
+            for tag in tags:
+                self.tags[row, self.tag_index[tag]] = 1.0
+
+        self.prices = np.array(
+            [PRICE_LEVELS.get(item.get("price", ""), np.nan) for item in self.items],
+            dtype=np.float32,
+        )
+        # Budget penalty per target tier, precomputed so scoring is one subtraction
+        known_prices = np.nan_to_num(self.prices, nan=0.0)
+        has_price = ~np.isnan(self.prices)
+        self.budget_penalties = {
+            level: np.where(has_price, np.abs(known_prices - level) / 3.0, 0.0).astype(np.float32)
+            for level in sorted(set(BUDGET_LEVELS.values()))
+        }
+        self.capacities = np.array(
+            [item.get("capacity") or np.nan for item in self.items],
+            dtype=np.float32,
+        )
+
+        # Location vocabulary is small, so location matching happens on the
+        # vocabulary and items are then selected by their vocabulary index
+        self.locations: List[str] = []
+        location_index: Dict[str, int] = {}
+        location_ids = []
+        for item in self.items:
+            location = str(item.get("location", "")).strip().lower()
+            if location not in location_index:
+                location_index[location] = len(self.locations)
+                self.locations.append(location)
+            location_ids.append(location_index[location])
+        self.location_ids = np.array(location_ids, dtype=np.int32)
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def _location_mask(self, location: str) -> np.ndarray:
+        """Boolean mask of items in the given place (a gazetteer id) or whose location contains the given text."""
+        location = location.strip().lower()
+        matches = [i for i, known in enumerate(self.locations) if location and location_matches(location, known)]
+        if len(matches) <= 8:
+            # A few equality passes beat a gather for the common single-city case
+            mask = np.zeros(len(self.items), dtype=bool)
+            for location_id in matches:
+                mask |= self.location_ids == location_id
+            return mask
+        vocabulary_mask = np.zeros(len(self.locations), dtype=bool)
+        vocabulary_mask[matches] = True
+        return vocabulary_mask[self.location_ids]
+
+    def score(self, preferences: Dict[str, Any]) -> np.ndarray:
+        """
+        Score every item against a session's preferences.
+
+        Args:
+            preferences: AgentState (or any dict) with style_preference,
+                location_preference, budget and guest_count keys
+
+        Returns:
+            float32 array with one score per catalog item
+        """
+        scores = np.zeros(len(self.items), dtype=np.float32)
+        if not self.items:
+            return scores
+
+        style = preferences.get("style_preference")
+        if style:
+            column = self.tag_index.get(_normalize_style(style))
+            if column is not None:
+                scores += STYLE_WEIGHT * self.tags[:, column]
+
+        location = preferences.get("location_preference")
+        if location:
+            scores += LOCATION_WEIGHT * self._location_mask(location)
+
+        budget = preferences.get("budget")
+        target_price = BUDGET_LEVELS.get(str(budget).lower()) if budget else None
+        if target_price is not None:
+            scores -= BUDGET_WEIGHT * self.budget_penalties[target_price]
+
+        guest_count = preferences.get("guest_count")
+        if guest_count:
+            too_small = self.capacities < float(guest_count)  # NaN compares False
+            scores -= GUEST_WEIGHT * too_small
+
+        return scores
+
+    def filter_mask(self, style: Optional[str] = None, location: Optional[str] = None) -> Optional[np.ndarray]:
+        """Vectorized equivalent of the style/location filters in get_images_by_category."""
+        mask = None
+        if style:
+            column = self.tag_index.get(_normalize_style(style))
+            if column is None:
+                mask = np.zeros(len(self.items), dtype=bool)
+            else:
+                mask = self.tags[:, column] > 0
+        if location:
+            location_mask = self._location_mask(location)
+            mask = location_mask if mask is None else mask & location_mask
+        return mask
+
+    def top_k_indices(self, preferences: Dict[str, Any], k: int, mask: Optional[np.ndarray] = None) -> np.ndarray:
+        """Return indices of the k best items, best first, ties in catalog order."""
+        scores = self.score(preferences)
+        if mask is not None:
+            candidates = np.flatnonzero(mask)
+            scores = scores[candidates]
+        if k <= 0 or scores.size == 0:
+            return np.zeros(0, dtype=np.intp)
+
+        if k < scores.size:
+            top = np.argpartition(-scores, k - 1)[:k]
+        else:
+            top = np.arange(scores.size)
+        top = top[np.lexsort((top, -scores[top]))]
+        return top if mask is None else candidates[top]
+
+    def top_k(self, preferences: Dict[str, Any], k: int, mask: Optional[np.ndarray] = None) -> List[Dict[str, Any]]:
+        """Return the k best items for the given preferences."""
+        return [self.items[i] for i in self.top_k_indices(preferences, k, mask)]
+
+
+if __name__ == "__main__":
+    # Quick latency check against a synthetic 50k item catalog
+    rng = np.random.default_rng(0)
+    cities = ["Austin, TX", "New York, NY", "Napa, CA", "Miami, FL", "Denver, CO"]
+    synthetic = [
+        {
+            "title": f"Venue {i}",
+            "tags": list(rng.choice(STYLE_KEYWORDS + ["garden", "outdoor", "barn", "beach"], 3, replace=False)),
+            "price": "$" * int(rng.integers(1, 5)),
+            "location": cities[i % len(cities)],
+            "capacity": int(rng.integers(20, 400)),
+        }
+        for i in range(50_000)
+    ]
+    ranker = CatalogRanker(synthetic)
+    session = {"style_preference": "rustic", "location_preference": "austin", "budget": "moderate", "guest_count": 150}
+
+    runs = 200
+    start = time.perf_counter()
+    for _ in range(runs):
+        ranker.top_k_indices(session, 10)
+    elapsed = (time.perf_counter() - start) / runs
+    print(f"Ranked {len(ranker)} items in {elapsed * 1000:.3f} ms (top 10)")
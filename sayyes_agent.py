@@ -1,17 +1,31 @@
-from langchain_openai import ChatOpenAI
 from langchain_core.messages import SystemMessage, HumanMessage, AIMessage, FunctionMessage
-from langgraph.graph import StateGraph
-from typing import Dict, List, Optional, Any, Sequence, TypedDict, Union, Tuple
+from typing import Dict, List, Optional, Any, Sequence, TypedDict, Union, Tuple, TYPE_CHECKING
 import json
 import os
-import asyncio
+import uuid
+import metrics
 from dotenv import load_dotenv
-from langchain_core.tools import BaseTool, tool
-from langchain_core.messages import BaseMessage
-from langchain_core.prompts import ChatPromptTemplate, PromptTemplate
-from langchain.memory import ConversationBufferMemory
-from tavily import TavilyClient
-from image_utils import get_images_by_category, get_images_from_url, get_local_images, scrape_and_return
+from langchain_core.tools import tool
+from langchain_core.messages import BaseMessage, messages_from_dict, messages_to_dict
+from image_utils import get_images_by_category, get_images_from_url, get_local_images, scrape_and_return, list_images_by_category
+from image_features import similar_items
+from llm_invoker import LLMInvoker, LLMTimeoutError
+from tool_executor import ToolExecutor
+from token_accounting import TokenAccountant
+from model_routing import ModelRouter, Route, REPLY, TOOL_FOLLOWUP
+from prefetch import Prefetcher
+from catalog import get_catalog
+from gazetteer import get_gazetteer
+from chat_log import ChatLog
+from stage_script import (
+    SOFT_CTA_TEXT, SOFT_CTA_BUTTONS, FINAL_CTA_TEXT, FINAL_CTA_BUTTONS, EMAIL_PROMPT_TEXT, EMAIL_CONFIRMATION_TEXT,
+    wants_planning, wants_waitlist, has_email, scripted_turn, record_turn,
+)
+
+# Heavy clients (langchain_openai, langgraph, tavily) are imported where they are
+# first used, so importing this module stays cheap
+if TYPE_CHECKING:
+    from langchain_openai import ChatOpenAI
 
 # Load environment variables from .env file if it exists, otherwise use OS environment
 load_dotenv(override=True)
@@ -21,17 +35,13 @@ OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY")
 TAVILY_API_KEY = os.environ.get("TAVILY_API_KEY")
 VERCEL_PROJECT_ID = os.environ.get("VERCEL_PROJECT_ID")
 
-if not OPENAI_API_KEY:
-    raise ValueError("OPENAI_API_KEY environment variable is not set")
-if not TAVILY_API_KEY:
-    raise ValueError("TAVILY_API_KEY environment variable is not set")
 if not VERCEL_PROJECT_ID:
     raise ValueError("VERCEL_PROJECT_ID environment variable is not set")
 
 # Define state type
 class AgentState(TypedDict):
     messages: List[BaseMessage]
-    chat_history: List[BaseMessage]
+    chat_history: Sequence[BaseMessage]  # ChatLog: append-only, shared between snapshots
     style_preference: Optional[str]
     location_preference: Optional[str]
     guest_count: Optional[int]
@@ -46,15 +56,17 @@ class AgentState(TypedDict):
     cta_shown: bool
     soft_cta_shown: bool
     email_collected: bool
+    session_id: Optional[str]  # Keys per-session server state such as prefetched carousels
 
 # === Tools ===
 @tool
-def get_wedding_images(category: str) -> Dict[str, Any]:
+def get_wedding_images(category: str, similar_to: Optional[str] = None) -> Dict[str, Any]:
     """
     Get wedding images by category.
     
     Args:
         category: The category to filter by (venues, dresses, hairstyles)
+        similar_to: Optional image URL the user loved, to show visually similar items ("more like this")
         
     Returns:
         Dictionary containing carousel data in the format:
@@ -79,6 +91,14 @@ def get_wedding_images(category: str) -> Dict[str, Any]:
         # Get images from database or fallback
         images = list_images_by_category(category)
         
+        # "More like this": reorder the category by visual similarity, other categories never leak in
+        if similar_to:
+            by_url = {image["url"]: image for image in images}
+            images = [
+                by_url[match["id"]]
+                for match in similar_items(similar_to, k=len(images), candidates=by_url)
+            ]
+        
         if not images:
             return {
                 "text": f"I couldn't find any {category} to show you right now.",
@@ -116,23 +136,213 @@ def get_wedding_images(category: str) -> Dict[str, Any]:
             }
         }
 
+# One Tavily client per process, created by the first search
+_tavily_client = None
+
+def get_tavily_client():
+    global _tavily_client
+    if _tavily_client is None:
+        from tavily import TavilyClient
+
+        if not TAVILY_API_KEY:
+            raise ValueError("TAVILY_API_KEY environment variable is not set")
+        _tavily_client = TavilyClient(api_key=TAVILY_API_KEY)
+    return _tavily_client
+
 @tool
 def tavily_search(query: str) -> str:
     """
     Search the web using Tavily API.
     """
-    client = TavilyClient(api_key=TAVILY_API_KEY)
-    search_result = client.search(query, search_depth="advanced", max_results=3)
+    # Give up when the executor does, instead of holding a pool thread for Tavily's 60s default
+    search_result = get_tavily_client().search(
+        query, search_depth="advanced", max_results=3, timeout=tool_executor.timeout
+    )
     return json.dumps(search_result)
 
+@tool("scrape_and_return")
+def scrape_page(url: str) -> str:
+    """
+    Scrape a web page and return its content as markdown.
+    
+    Args:
+        url: The URL to scrape
+    """
+    return scrape_and_return(url)
+
+TOOLS = [get_wedding_images, tavily_search, scrape_page]
+TOOLS_BY_NAME = {t.name: t for t in TOOLS}
+
 # === Setup LLM ===
-llm = ChatOpenAI(
-    model="gpt-4", 
-    temperature=0.7,
-    openai_api_key=OPENAI_API_KEY
-)
+# Built on first use by get_llm(); tests may assign their own model here
+llm = None
+
+def get_llm() -> "ChatOpenAI":
+    """Get the chat model, constructing the OpenAI client on first use."""
+    global llm
+    if llm is None:
+        from langchain_openai import ChatOpenAI
+
+        if not OPENAI_API_KEY:
+            raise ValueError("OPENAI_API_KEY environment variable is not set")
+        # OPENAI_BASE_URL points the client at another endpoint, e.g. llm_stub.py
+        llm = ChatOpenAI(
+            model="gpt-4", 
+            temperature=0.7,
+            openai_api_key=OPENAI_API_KEY,
+            base_url=os.environ.get("OPENAI_BASE_URL") or None
+        )
+    return llm
+
+# Model, temperature and max_tokens per planning stage and turn type
+model_router = ModelRouter.from_env()
+
+def get_route_llm(route: Optional[Route] = None):
+    """Get the chat model for a route (the default model when route is None)."""
+    return model_router.client(get_llm(), route or model_router.default)
+
+# Models with TOOLS bound, cached per model object
+_tool_llms: Dict[int, Tuple[Any, Any]] = {}
+
+def get_tool_llm(route: Optional[Route] = None):
+    """Get a route's chat model with TOOLS bound, or the plain model if it can't call tools."""
+    model = get_route_llm(route)
+    cached = _tool_llms.get(id(model))
+    if cached is None or cached[0] is not model:
+        try:
+            bound = model.bind_tools(TOOLS)
+        except (AttributeError, NotImplementedError):
+            bound = model
+        cached = _tool_llms[id(model)] = (model, bound)
+    return cached[1]
+
+# Concurrency cap, per-call timeout and optional hedging for every LLM call
+llm_invoker = LLMInvoker.from_env()
+
+# Bounded pool that runs the tool calls of one response concurrently
+tool_executor = ToolExecutor.from_env()
+MAX_TOOL_ROUNDS = 3
+
+# Token totals per session and stage, prompt compaction and the session ceiling
+token_accountant = TokenAccountant.from_env()
+TOKEN_LIMIT_REPLY = "We've covered so much together! 💍 Join our waitlist and we'll pick up your planning right where we left off ✨"
+# Include the session's token totals in /api/chat responses
+TOKEN_USAGE_IN_RESPONSE = os.environ.get("TOKEN_USAGE_IN_RESPONSE", "0").lower() in ("1", "true", "yes")
+
+# === Prompt Templates ===
+# Module-level so servers that preload the app share one copy across workers
+SYSTEM_PROMPT_TEMPLATE = """
+    You are Snatcha, a fun, warm, and helpful AI wedding planning assistant.
+    Keep responses short, friendly, and use emojis where appropriate.
+    Respond like you're helping a close friend, but stay focused on the task.
+    
+    You have access to:
+    1. Show wedding images using the get_wedding_images tool
+    2. Search the web using tavily_search
+    3. Scrape and analyze web content using the scrape_and_return tool
+    
+    Current Planning Stage: {planning_stage}
+    
+    Wedding Planning Information Collected:
+    - Style: {style}
+    - Location: {location}
+    - Guest Count: {guest_count}
+    - Budget: {budget}
+    - Food Preferences: {food_preferences}
+    - Special Requests: {special_requests}
+    
+    Instructions based on planning stage:
+    
+    1. If in "initial" stage:
+       - Greet the user warmly
+       - Ask about their wedding theme/style (modern, rustic, boho, etc.)
+       - Be conversational and friendly
+    
+    2. If in "collecting_info" stage:
+       - Ask ONE question at a time about their wedding preferences
+       - Focus on gathering: location, guest count, budget, food preferences, special requests
+       - After collecting 2-3 pieces of information, move to "sneak_peek" stage
+    
+    3. If in "sneak_peek" stage:
+       - Show a sneak peek of what you can do for their dream day
+       - Use the get_wedding_images tool to show venues, dresses, and hairstyles
+       - After showing images, move to "exploring" stage
+    
+    4. If in "exploring" stage:
+       - Offer a soft CTA: "Would you like to keep exploring more options or dive into planning?"
+       - Provide buttons: "Continue Planning" and "Show Me More"
+       - If user wants to continue planning, move to "final_cta" stage
+    
+    5. If in "final_cta" stage:
+       - Present the final CTA: "I've shown you a sneak peek of what I can do! Ready to take your wedding planning to the next level? Over 500 couples have already joined our exclusive wedding planning community! ✨"
+       - Provide buttons: "Join the Waitlist" and "Continue Exploring"
+       - If user wants to join waitlist, ask for their email
+       - If user wants to continue exploring, move back to "exploring" stage
+    
+    When showing images:
+    - Always use the get_wedding_images tool
+    - Format your response as a JSON with "text" and "carousel" fields
+    - The carousel should have a title and items with image, title, description, etc.
+    """
 
 # === Agent Node Functions ===
+def invoke_route(route: Route, prompt: List[BaseMessage], with_tools: bool = True) -> Tuple[BaseMessage, Route]:
+    """
+    Call a route's model, retrying on the default model if it fails.
+    
+    Timeouts are not retried: the caller has already waited LLM_TIMEOUT.
+    
+    Returns:
+        The response and the route that produced it
+    """
+    try:
+        model = get_tool_llm(route) if with_tools else get_route_llm(route)
+        return llm_invoker.invoke(model, prompt, route=route.name), route
+    except LLMTimeoutError:
+        raise
+    except Exception as e:
+        if route == model_router.default:
+            raise
+        route = model_router.fallback(route, e)
+    model = get_tool_llm(route) if with_tools else get_route_llm(route)
+    return llm_invoker.invoke(model, prompt, route=route.name), route
+
+def call_model(all_messages: List[BaseMessage], session_id: Optional[str] = None,
+               stage: str = "initial") -> List[BaseMessage]:
+    """
+    Get the model's reply, running any tools it asks for.
+    
+    Tool calls from one response run concurrently and their results go back to
+    the model, for up to MAX_TOOL_ROUNDS rounds; the last round uses the model
+    without tools so it has to answer. Each call uses the model model_router
+    picks for the stage and turn. Every call is token-accounted: prompts
+    are compacted to PROMPT_TOKEN_LIMIT and a session past SESSION_TOKEN_LIMIT
+    gets a scripted reply instead of another call.
+    
+    Returns:
+        New messages for the chat history, ending with the final reply
+    """
+    replies: List[BaseMessage] = []
+    for round_number in range(MAX_TOOL_ROUNDS + 1):
+        if token_accountant.over_budget(session_id):
+            metrics.increment("tokens.short_circuits", stage=stage)
+            replies.append(AIMessage(content=TOKEN_LIMIT_REPLY))
+            break
+        route = model_router.route(stage, REPLY if round_number == 0 else TOOL_FOLLOWUP)
+        prompt = token_accountant.fit(all_messages + replies)
+        try:
+            response, route = invoke_route(route, prompt, with_tools=round_number < MAX_TOOL_ROUNDS)
+            model_router.record(route, token_accountant.record(session_id, stage, prompt, response))
+        except LLMTimeoutError as e:
+            print(f"LLM timed out: {e}")
+            response = AIMessage(content="Sorry, I'm taking a little longer than usual 💭 Could you say that again?")
+        replies.append(response)
+        tool_calls = getattr(response, "tool_calls", None)
+        if not tool_calls:
+            break
+        replies.extend(tool_executor.run(tool_calls, TOOLS_BY_NAME))
+    return replies
+
 def should_continue(state: AgentState) -> Union[Tuple[bool, str], bool]:
     """Determine if we should continue running the agent."""
     messages = state["messages"]
@@ -182,76 +392,49 @@ def should_continue(state: AgentState) -> Union[Tuple[bool, str], bool]:
     # Otherwise stop
     return False
 
+# Words in our last reply that mean we asked the user where the wedding is
+LOCATION_QUESTION_WORDS = ("where", "location", "city", "destination")
+
+def asked_for_location(chat_history: List[BaseMessage]) -> bool:
+    """Whether the last assistant message asked about the location."""
+    for message in reversed(chat_history):
+        if isinstance(message, AIMessage) and message.content:
+            text = message.content.lower()
+            return any(word in text for word in LOCATION_QUESTION_WORDS)
+    return False
+
 def agent_node(state: AgentState) -> AgentState:
     """Process the current state and generate a response."""
     messages = state.get("messages", [])
-    chat_history = state.get("chat_history", [])
+    chat_history = ChatLog.of(state.get("chat_history", []))
     planning_stage = state.get("planning_stage", "initial")
     info_collected = state.get("info_collected", 0)
 
     # Setup system message with planning stage context
-    system_message = SystemMessage(content=f"""
-    You are Snatcha, a fun, warm, and helpful AI wedding planning assistant.
-    Keep responses short, friendly, and use emojis where appropriate.
-    Respond like you're helping a close friend, but stay focused on the task.
-    
-    You have access to:
-    1. Show wedding images using the get_wedding_images tool
-    2. Search the web using tavily_search
-    3. Scrape and analyze web content using the scrape_and_return tool
-    
-    Current Planning Stage: {planning_stage}
-    
-    Wedding Planning Information Collected:
-    - Style: {state.get("style_preference") or "Not specified"}
-    - Location: {state.get("location_preference") or "Not specified"}
-    - Guest Count: {state.get("guest_count") or "Not specified"}
-    - Budget: {state.get("budget") or "Not specified"}
-    - Food Preferences: {state.get("food_preferences") or "Not specified"}
-    - Special Requests: {state.get("special_requests") or "Not specified"}
-    
-    Instructions based on planning stage:
-    
-    1. If in "initial" stage:
-       - Greet the user warmly
-       - Ask about their wedding theme/style (modern, rustic, boho, etc.)
-       - Be conversational and friendly
-    
-    2. If in "collecting_info" stage:
-       - Ask ONE question at a time about their wedding preferences
-       - Focus on gathering: location, guest count, budget, food preferences, special requests
-       - After collecting 2-3 pieces of information, move to "sneak_peek" stage
-    
-    3. If in "sneak_peek" stage:
-       - Show a sneak peek of what you can do for their dream day
-       - Use the get_wedding_images tool to show venues, dresses, and hairstyles
-       - After showing images, move to "exploring" stage
-    
-    4. If in "exploring" stage:
-       - Offer a soft CTA: "Would you like to keep exploring more options or dive into planning?"
-       - Provide buttons: "Continue Planning" and "Show Me More"
-       - If user wants to continue planning, move to "final_cta" stage
-    
-    5. If in "final_cta" stage:
-       - Present the final CTA: "I've shown you a sneak peek of what I can do! Ready to take your wedding planning to the next level? Over 500 couples have already joined our exclusive wedding planning community! ✨"
-       - Provide buttons: "Join the Waitlist" and "Continue Exploring"
-       - If user wants to join waitlist, ask for their email
-       - If user wants to continue exploring, move back to "exploring" stage
-    
-    When showing images:
-    - Always use the get_wedding_images tool
-    - Format your response as a JSON with "text" and "carousel" fields
-    - The carousel should have a title and items with image, title, description, etc.
-    """)
+    system_message = SystemMessage(content=SYSTEM_PROMPT_TEMPLATE.format(
+        planning_stage=planning_stage,
+        style=state.get("style_preference") or "Not specified",
+        location=get_gazetteer().display_name(state.get("location_preference")) or "Not specified",
+        guest_count=state.get("guest_count") or "Not specified",
+        budget=state.get("budget") or "Not specified",
+        food_preferences=state.get("food_preferences") or "Not specified",
+        special_requests=state.get("special_requests") or "Not specified",
+    ))
 
     # Combine messages for context
     all_messages = [system_message] + chat_history + messages
 
-    # Get response from LLM
-    response = llm.invoke(all_messages)
+    # Scripted turns (CTAs, email capture, carousels) don't need the model
+    turn = scripted_turn(state, messages[-1].content.lower() if messages else None)
+    record_turn(planning_stage, turn)
+    if turn is not None:
+        replies = [AIMessage(content=turn.reply)] if turn.reply else []
+    else:
+        # Get response from LLM, running any tools it calls
+        replies = call_model(all_messages, state.get("session_id"), planning_stage)
     
-    # Update chat history
-    new_chat_history = chat_history + messages + [response]
+    # Update chat history (appends to the shared log, the input state's view is unchanged)
+    new_chat_history = chat_history + messages + replies
     
     # Update state
     new_state = state.copy()
@@ -263,6 +446,15 @@ def agent_node(state: AgentState) -> AgentState:
         last_input = messages[-1].content.lower()
         
         # Extract information from user input
+        if planning_stage in ("initial", "collecting_info"):
+            # A place counts after "in"/"near"/"at", or anywhere in an answer to our location
+            # question; stored as a gazetteer id for the catalog filters
+            place = get_gazetteer().find(messages[-1].content, cued=not asked_for_location(chat_history))
+            if place is not None:
+                if not new_state.get("location_preference"):
+                    new_state["info_collected"] += 1
+                new_state["location_preference"] = place.id
+
         if planning_stage == "initial":
             # Check for style preference
             style_keywords = ["modern", "rustic", "boho", "bohemian", "classic", "elegant", "traditional", "contemporary", "vintage"]
@@ -274,16 +466,8 @@ def agent_node(state: AgentState) -> AgentState:
                     break
         
         elif planning_stage == "collecting_info":
-            # Check for location preference
-            if "location" in last_input or "where" in last_input or "place" in last_input:
-                # Extract location from the message
-                location = last_input.split("in ")[-1].strip() if "in " in last_input else None
-                if location:
-                    new_state["location_preference"] = location
-                    new_state["info_collected"] += 1
-            
             # Check for guest count
-            elif "guest" in last_input or "people" in last_input or "attend" in last_input:
+            if "guest" in last_input or "people" in last_input or "attend" in last_input:
                 # Try to extract a number
                 import re
                 numbers = re.findall(r'\d+', last_input)
@@ -365,46 +549,208 @@ def agent_node(state: AgentState) -> AgentState:
         
         elif planning_stage == "exploring":
             # Check if user wants to continue planning
-            if "continue planning" in last_input or "dive into planning" in last_input:
+            if wants_planning(last_input):
                 new_state["planning_stage"] = "final_cta"
                 new_state["soft_cta_shown"] = True
         
         elif planning_stage == "final_cta":
             # Check if user wants to join the waitlist
-            if "join" in last_input or "waitlist" in last_input:
+            if wants_waitlist(last_input):
                 # Ask for email
-                email_message = AIMessage(content="Great! Please provide your email address to join our exclusive wedding planning community.")
+                email_message = AIMessage(content=EMAIL_PROMPT_TEXT)
                 new_chat_history.append(email_message)
             
             # Check if email was provided
-            elif "@" in last_input and "." in last_input:
+            elif has_email(last_input):
+                # Queued for the background writer; the turn doesn't wait on disk
+                get_waitlist().add(last_input, state.get("session_id"))
                 new_state["email_collected"] = True
-                email_confirmation = AIMessage(content="Thank you for joining our wedding planning community! We'll be in touch soon with exclusive planning tips and resources.")
+                email_confirmation = AIMessage(content=EMAIL_CONFIRMATION_TEXT)
                 new_chat_history.append(email_confirmation)
     
     return new_state
 
 # === Graph Setup ===
-def create_graph() -> StateGraph:
+def create_graph():
     """Create and configure the agent graph."""
+    from langgraph.graph import StateGraph
+
     workflow = StateGraph(AgentState)
     
     # Add the agent node
     workflow.add_node("agent", agent_node)
     
-    # Add edges
-    workflow.add_edge("agent", "agent")
+    # One agent step per invoke; process_message decides whether to run another
+    workflow.set_finish_point("agent")
     
     # Set entry point
     workflow.set_entry_point("agent")
     
-    return workflow.compile()
+    return workflow.compile(checkpointer=get_session_saver())
+
+# === Waitlist ===
+# Created on the first signup, see get_waitlist(). Construction only touches
+# memory: the sink loads its Bloom filter on its writer thread.
+_waitlist = None
+
+def get_waitlist():
+    """Process-wide waitlist sink (WAITLIST_DB, default waitlist.db)."""
+    global _waitlist
+    if _waitlist is None:
+        from waitlist import WaitlistSink
+        _waitlist = WaitlistSink.from_env()
+    return _waitlist
+
+# === Session Persistence ===
+# Server-side sessions are kept in SQLite when SESSION_DB is set
+_session_saver = None
+
+def get_session_saver():
+    """The durable session checkpointer, or None when SESSION_DB is unset."""
+    global _session_saver
+    if _session_saver is None and os.environ.get("SESSION_DB"):
+        from session_store import SQLiteSessionSaver
+        _session_saver = SQLiteSessionSaver.from_env()
+    return _session_saver
+
+def session_config(session_id: Optional[str]) -> Optional[Dict]:
+    """Graph config that checkpoints under the session, if sessions are persisted."""
+    if get_session_saver() is None or not session_id:
+        return None
+    return {"configurable": {"thread_id": session_id}}
+
+def load_session(session_id: str) -> Optional[Dict]:
+    """Last saved state of a session, or None."""
+    config = session_config(session_id)
+    if config is None:
+        return None
+    values = get_graph().get_state(config).values
+    if not values:
+        return None
+    restored = dict(values)
+    restored["messages"] = []
+    return restored
+
+def session_stores() -> Dict[str, Dict[str, Any]]:
+    """Per-session state this worker holds in memory, by store (for memory diagnostics)."""
+    stores = {
+        "carousel_prefetch": carousel_prefetcher.sessions_snapshot(),
+        "token_totals": token_accountant.sessions_snapshot(),
+    }
+    if _session_saver is not None:
+        stores["session_cache"] = _session_saver.sessions_snapshot()
+    return stores
+
+# Compiled once per process by get_graph()
+_graph = None
+
+def get_graph():
+    """Get the compiled agent graph, compiling it on first use."""
+    global _graph
+    if _graph is None:
+        _graph = create_graph()
+    return _graph
+
+def warm_up():
+    """
+    Load everything a chat turn needs except network clients.
+    
+    Called by the production server before forking workers, so the compiled
+    graph, catalog and rankers are shared copy-on-write.
+    """
+    from image_utils import CATEGORY_LISTS, get_category_ranker
+    
+    get_graph()
+    for category in CATEGORY_LISTS:
+        get_category_ranker(category)
+
+# === Sneak Peek Carousels ===
+# Shown in this order during the sneak_peek stage: (category, seen flag, title)
+SNEAK_PEEK_CAROUSELS = [
+    ("venues", "seen_venues", "Top Wedding Venues"),
+    ("dresses", "seen_dresses", "Stunning Wedding Dresses"),
+    ("hairstyles", "seen_hairstyles", "Beautiful Wedding Hairstyles"),
+]
+CAROUSEL_SIZE = 5
+PREFERENCE_KEYS = ("style_preference", "location_preference", "budget", "guest_count")
+
+# While the user looks at one carousel, the next one is built in the background
+carousel_prefetcher = Prefetcher.from_env(name="carousel.prefetch")
+
+def build_carousel(index: int, preferences: Dict) -> Dict:
+    """Rank a sneak-peek category against the session's preferences."""
+    category, _, title = SNEAK_PEEK_CAROUSELS[index]
+    images = get_images_by_category(category, preferences=preferences, limit=CAROUSEL_SIZE)
+    return {
+        "title": title,
+        "items": [dict(item, share_url=item["image"]) for item in images["carousel"]["items"]]
+    }
+
+def sneak_peek_carousel(state: Dict) -> Optional[Dict]:
+    """
+    Carousel for the first category the user hasn't seen.
+    
+    Served from the session's prefetch slot when the preferences and catalog
+    are unchanged since it was built; the following category is then
+    prefetched for the next turn.
+    """
+    index = next((i for i, (_, seen, _) in enumerate(SNEAK_PEEK_CAROUSELS) if not state.get(seen)), None)
+    if index is None:
+        return None
+    
+    preferences = {key: state.get(key) for key in PREFERENCE_KEYS}
+    fingerprint = (get_catalog().version, tuple(preferences.values()))
+    session_id = state.get("session_id")
+    
+    carousel = carousel_prefetcher.take(session_id, (index, fingerprint))
+    if carousel is None:
+        carousel = build_carousel(index, preferences)
+    
+    if session_id and index + 1 < len(SNEAK_PEEK_CAROUSELS):
+        carousel_prefetcher.schedule(session_id, (index + 1, fingerprint),
+                                     lambda: build_carousel(index + 1, preferences))
+    return carousel
+
+# === State Serialization ===
+MESSAGE_KEYS = ("messages", "chat_history")
+
+def state_to_json(state: Optional[Dict]) -> Optional[Dict]:
+    """Convert the LangChain messages in a state to plain dicts for the HTTP response."""
+    if not isinstance(state, dict):
+        return state
+    serialized = dict(state)
+    for key in MESSAGE_KEYS:
+        if key in serialized:
+            serialized[key] = messages_to_dict(list(serialized[key] or []))
+    return serialized
+
+def state_from_json(state: Optional[Dict]) -> Optional[Dict]:
+    """Rebuild the LangChain messages in a state sent back by the client."""
+    if not isinstance(state, dict):
+        return state
+    restored = dict(state)
+    for key in MESSAGE_KEYS:
+        values = restored.get(key) or []
+        if any(isinstance(value, dict) for value in values):
+            try:
+                restored[key] = messages_from_dict([value for value in values if isinstance(value, dict)])
+            except Exception as e:
+                print(f"Dropping unreadable {key} from client state: {e}")
+                restored[key] = []
+    return restored
 
 # === Main Processing Function ===
-def process_message(data):
-    """Process a message and return the response."""
+def process_message(data, state=None):
+    """
+    Process a message and return the response.
+    
+    Accepts either a request dict ({"messages": [...], "state": {...}}) or the
+    user's message text plus the session state, as app.py passes them.
+    """
+    if isinstance(data, str):
+        data = {"messages": [{"role": "user", "content": data}], "state": state}
     messages = data.get("messages", [])
-    state = data.get("state", {})
+    state = data.get("state") or {}
 
     # Catch missing message content
     if not messages:
@@ -426,6 +772,10 @@ def process_message(data):
     print(f"[Debug] Incoming message: {user_input}")
     print(f"[Debug] Initial state keys: {list(state.keys()) if state else 'None'}")
     
+    # A client that sends only its session id resumes the saved session
+    if isinstance(state, dict) and state.get("session_id") and set(state) == {"session_id"}:
+        state = load_session(state["session_id"]) or state
+    
     # Ensure state is fully initialized
     default_state = {
         "messages": [],
@@ -443,7 +793,8 @@ def process_message(data):
         "seen_hairstyles": False,
         "cta_shown": False,
         "soft_cta_shown": False,
-        "email_collected": False
+        "email_collected": False,
+        "session_id": None
     }
 
     if not state or not isinstance(state, dict):
@@ -451,6 +802,9 @@ def process_message(data):
     else:
         for key, value in default_state.items():
             state.setdefault(key, value)
+    state["chat_history"] = ChatLog.of(state["chat_history"])
+    if not state["session_id"]:
+        state["session_id"] = uuid.uuid4().hex
     
     # Add the new message
     if isinstance(user_input, str):
@@ -459,8 +813,9 @@ def process_message(data):
         print(f"[ERROR] Invalid message format: {user_input}")
         state["messages"].append(HumanMessage(content=""))
     
-    # Create and run the graph
-    graph = create_graph()
+    # Run the graph (compiled once per process), checkpointing under the session
+    graph = get_graph()
+    config = session_config(state["session_id"])
     
     # Handle recursion manually
     max_iterations = 10
@@ -468,7 +823,7 @@ def process_message(data):
     for _ in range(max_iterations):
         try:
             # Run one iteration
-            new_state = graph.invoke(current_state)
+            new_state = graph.invoke(current_state, config)
             
             # Check if we should continue
             if not should_continue(new_state):
@@ -498,72 +853,7 @@ def process_message(data):
     # Check if we need to show a carousel based on planning stage
     if planning_stage == "sneak_peek":
         # Determine which category to show based on what's been seen
-        if not final_state.get("seen_venues"):
-            carousel_data = {
-                "title": "Top Wedding Venues",
-                "items": [
-                    {
-                        "image": "https://sayyes.blob.vercel-storage.com/wedding%20venues/venue1.png",
-                        "title": "Elegant Garden Venue",
-                        "description": "A beautiful outdoor venue with lush gardens",
-                        "location": "California",
-                        "price": "$$$",
-                        "tags": ["outdoor", "garden", "elegant"],
-                        "share_url": "https://sayyes.blob.vercel-storage.com/share/venue1"
-                    },
-                    {
-                        "image": "https://sayyes.blob.vercel-storage.com/wedding%20venues/venue2.png",
-                        "title": "Modern City Loft",
-                        "description": "Contemporary space with city views",
-                        "location": "New York",
-                        "price": "$$$$",
-                        "tags": ["modern", "urban", "contemporary"],
-                        "share_url": "https://sayyes.blob.vercel-storage.com/share/venue2"
-                    }
-                ]
-            }
-        elif not final_state.get("seen_dresses"):
-            carousel_data = {
-                "title": "Stunning Wedding Dresses",
-                "items": [
-                    {
-                        "image": "https://sayyes.blob.vercel-storage.com/wedding%20dresses/dress1.png",
-                        "title": "Classic A-Line Gown",
-                        "description": "Timeless elegance with a modern twist",
-                        "price": "$$$",
-                        "tags": ["classic", "elegant", "a-line"],
-                        "share_url": "https://sayyes.blob.vercel-storage.com/share/dress1"
-                    },
-                    {
-                        "image": "https://sayyes.blob.vercel-storage.com/wedding%20dresses/dress2.png",
-                        "title": "Bohemian Lace Dress",
-                        "description": "Romantic and ethereal design",
-                        "price": "$$",
-                        "tags": ["boho", "lace", "romantic"],
-                        "share_url": "https://sayyes.blob.vercel-storage.com/share/dress2"
-                    }
-                ]
-            }
-        elif not final_state.get("seen_hairstyles"):
-            carousel_data = {
-                "title": "Beautiful Wedding Hairstyles",
-                "items": [
-                    {
-                        "image": "https://sayyes.blob.vercel-storage.com/wedding%20hairstyles/hair1.png",
-                        "title": "Romantic Updo",
-                        "description": "Elegant and sophisticated style",
-                        "tags": ["updo", "romantic", "elegant"],
-                        "share_url": "https://sayyes.blob.vercel-storage.com/share/hair1"
-                    },
-                    {
-                        "image": "https://sayyes.blob.vercel-storage.com/wedding%20hairstyles/hair2.png",
-                        "title": "Bohemian Braids",
-                        "description": "Natural and relaxed look",
-                        "tags": ["boho", "braids", "natural"],
-                        "share_url": "https://sayyes.blob.vercel-storage.com/share/hair2"
-                    }
-                ]
-            }
+        carousel_data = sneak_peek_carousel(final_state)
     
     # If we're in the exploring stage and haven't shown the soft CTA yet
     if planning_stage == "exploring" and not final_state.get("soft_cta_shown"):
@@ -572,8 +862,8 @@ def process_message(data):
         
         # Prepare the soft CTA response
         response = {
-            "text": "Would you like to keep exploring more options or dive into planning?",
-            "buttons": ["Continue Planning", "Show Me More"],
+            "text": SOFT_CTA_TEXT,
+            "buttons": list(SOFT_CTA_BUTTONS),
             "state": final_state
         }
     # If we're in the final CTA stage and haven't shown the CTA yet
@@ -583,8 +873,8 @@ def process_message(data):
         
         # Prepare the CTA response
         response = {
-            "text": "I've shown you a sneak peek of what I can do! Ready to take your wedding planning to the next level? Over 500 couples have already joined our exclusive wedding planning community! ✨",
-            "buttons": ["Join the Waitlist", "Continue Exploring"],
+            "text": FINAL_CTA_TEXT,
+            "buttons": list(FINAL_CTA_BUTTONS),
             "state": final_state
         }
     # If we're asking for email
@@ -610,6 +900,17 @@ def process_message(data):
     if carousel_data:
         response["carousel"] = carousel_data
     
+    if TOKEN_USAGE_IN_RESPONSE:
+        response["usage"] = token_accountant.session_totals(final_state.get("session_id"))
+    
+    # The CTA flags above are set after the graph ran; checkpoint them too
+    if config is not None:
+        try:
+            graph.update_state(config, {key: value for key, value in final_state.items() if key != "messages"},
+                               as_node="agent")
+        except Exception as e:
+            print(f"Error saving session {final_state['session_id']}: {e}")
+    
     return response
 
 # Interactive command-line interface
@@ -1,11 +1,13 @@
 import json
-import requests
 from bs4 import BeautifulSoup
 import html2text
 from urllib.parse import urljoin
 from tavily import TavilyClient
 import os
 from dotenv import load_dotenv
+from image_dedup import dedupe_images
+from image_proxy import proxied_url
+from image_utils import SCRAPE_TIMEOUT, fetch_page
 
 # Load environment variables
 load_dotenv()
@@ -31,17 +33,18 @@ def scrape_and_return(query: str) -> str:
             url = query
         else:
             # Use Tavily search to find relevant URLs
-            search = TavilyClient(api_key=TAVILY_API_KEY).search(query, search_depth="advanced", max_results=1)
+            search = TavilyClient(api_key=TAVILY_API_KEY).search(
+                query, search_depth="advanced", max_results=1, timeout=SCRAPE_TIMEOUT
+            )
             if not search:
                 return json.dumps({"error": "No results found"})
             url = search[0].get('url')
 
         # Fetch and parse the webpage
-        response = requests.get(url, headers={'User-Agent': 'Mozilla/5.0'})
-        response.raise_for_status()
+        page = fetch_page(url, headers={'User-Agent': 'Mozilla/5.0'})
         
         # Parse with BeautifulSoup
-        soup = BeautifulSoup(response.text, 'html.parser')
+        soup = BeautifulSoup(page, 'html.parser')
         
         # Extract title
         title = soup.title.string if soup.title else "No title found"
@@ -69,11 +72,16 @@ def scrape_and_return(query: str) -> str:
                     'alt': alt
                 })
         
+        # First 5 distinct images, loaded through /api/img when IMAGE_PROXY_BASE is set
+        images = dedupe_images(images, url=lambda image: image['url'], limit=5)
+        for image in images:
+            image['url'] = proxied_url(image['url'])
+        
         return json.dumps({
             "title": title,
             "content": content,
             "url": url,
-            "images": images[:5]  # Limit to first 5 images
+            "images": images
         })
     except Exception as e:
         return json.dumps({
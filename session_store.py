@@ -0,0 +1,402 @@
+import atexit
+import os
+import random
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterator, NamedTuple, Optional, Sequence, Tuple
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    copy_checkpoint,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+)
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+
+import metrics
+from chat_log import ChatLog
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS checkpoints (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL,
+    checkpoint_id TEXT NOT NULL,
+    type TEXT NOT NULL,
+    record BLOB NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (thread_id, checkpoint_ns)
+)
+"""
+
+# Checkpoint ids are time-ordered, so a worker never overwrites a newer checkpoint
+UPSERT = """
+INSERT INTO checkpoints (thread_id, checkpoint_ns, checkpoint_id, type, record, updated_at)
+VALUES (?, ?, ?, ?, ?, ?)
+ON CONFLICT (thread_id, checkpoint_ns) DO UPDATE SET
+    checkpoint_id = excluded.checkpoint_id,
+    type = excluded.type,
+    record = excluded.record,
+    updated_at = excluded.updated_at
+WHERE excluded.checkpoint_id >= checkpoints.checkpoint_id
+"""
+
+Key = Tuple[str, str]  # (thread_id, checkpoint_ns)
+
+
+class _Entry(NamedTuple):
+    checkpoint_id: str
+    record: Dict[str, Any]  # checkpoint, metadata, parent_id, writes
+    blob: Optional[Tuple[str, bytes]]  # serialized record; None until the writer flushes it
+    checked_at: float = 0.0  # time.monotonic() when this entry was last known to be current
+
+
+def _plain(value: Any) -> Any:
+    """Copy of `value` with ChatLog views turned into lists, at any depth."""
+    if isinstance(value, ChatLog):
+        return list(value)
+    if isinstance(value, dict):
+        return {key: _plain(item) for key, item in value.items()}
+    if type(value) in (list, tuple):
+        return type(value)(_plain(item) for item in value)
+    return value
+
+
+class SessionSerializer(JsonPlusSerializer):
+    """JsonPlusSerializer that also handles the ChatLog histories in AgentState."""
+
+    def dumps_typed(self, obj: Any) -> Tuple[str, bytes]:
+        return super().dumps_typed(_plain(obj))
+
+
+class SQLiteSessionSaver(BaseCheckpointSaver):
+    """
+    LangGraph checkpointer that keeps each session's latest state in SQLite.
+
+    - The database runs in WAL mode, so reads never wait on the writer and
+      several worker processes can share one file.
+    - Writes are behind: `put` updates memory and marks the session dirty. A
+      background thread serializes and commits all dirty sessions in one
+      transaction every `flush_interval` seconds, so several checkpoints of
+      one turn cost a single encode and row write.
+    - Reads come from an in-memory LRU of decoded checkpoints. A session
+      missing from memory (another worker served it, or after a restart) is
+      rehydrated from disk lazily. A cache hit does not touch SQLite; with
+      `revalidate_after` set, an entry older than that many seconds is
+      checked against the checkpoint id on disk, so another worker's newer
+      state wins. Leave it unset when each session sticks to one worker.
+
+    Only the latest checkpoint per (thread, namespace) is kept: sessions
+    resume from their last turn, not from arbitrary history.
+    """
+
+    def __init__(self, path: str, flush_interval: float = 0.5, max_batch: int = 500, max_cached: int = 10000,
+                 revalidate_after: Optional[float] = None, serde=None):
+        super().__init__(serde=serde or SessionSerializer())
+        self.path = path
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.max_cached = max_cached
+        self.revalidate_after = revalidate_after
+        self._cache: "OrderedDict[Key, _Entry]" = OrderedDict()
+        self._dirty: Dict[Key, _Entry] = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Condition(self._lock)
+        self._local = threading.local()
+        self._writer: Optional[threading.Thread] = None
+        self._writer_pid: Optional[int] = None
+        self._closed = False
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Schema setup uses a throwaway connection: connections must not cross a fork
+        connection = sqlite3.connect(path)
+        try:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(SCHEMA)
+            connection.commit()
+        finally:
+            connection.close()
+        atexit.register(self.close)
+
+    @classmethod
+    def from_env(cls) -> Optional["SQLiteSessionSaver"]:
+        """Build a saver from SESSION_* environment variables, or None if SESSION_DB is unset."""
+        path = os.environ.get("SESSION_DB")
+        if not path:
+            return None
+        revalidate_after = os.environ.get("SESSION_REVALIDATE_AFTER")
+        return cls(
+            path,
+            flush_interval=float(os.environ.get("SESSION_FLUSH_INTERVAL", 0.5)),
+            max_cached=int(os.environ.get("SESSION_CACHE_SIZE", 10000)),
+            revalidate_after=float(revalidate_after) if revalidate_after else None,
+        )
+
+    # === Connections and the writer thread ===
+    def _connection(self) -> sqlite3.Connection:
+        """Connection for the current thread (and process)."""
+        connection = getattr(self._local, "connection", None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=30)
+            connection.execute("PRAGMA journal_mode=WAL")
+            # WAL + NORMAL: durable across process crashes, one fsync per checkpoint of the log
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def _ensure_writer(self):
+        """Start the writer in this process (threads don't survive fork); call with the lock held."""
+        if self._writer_pid != os.getpid() or not self._writer.is_alive():
+            self._writer = threading.Thread(target=self._run_writer, name="session-writer", daemon=True)
+            self._writer_pid = os.getpid()
+            self._writer.start()
+
+    def _run_writer(self):
+        while True:
+            with self._wake:
+                # Collect a batch for flush_interval unless it is already full
+                if not self._closed and len(self._dirty) < self.max_batch:
+                    self._wake.wait(self.flush_interval)
+                closed = self._closed
+            self.flush()
+            if closed:
+                return
+
+    def flush(self) -> int:
+        """Commit every dirty session now. Returns the number of rows written."""
+        with self._lock:
+            batch, self._dirty = self._dirty, {}
+            metrics.set_gauge("sessions.dirty", 0)
+        if not batch:
+            return 0
+
+        start = time.perf_counter()
+        now = time.time()
+        try:
+            # Serialized here, off the request path: a coalesced session is encoded once per flush
+            rows = []
+            for (thread_id, checkpoint_ns), entry in batch.items():
+                kind, blob = entry.blob or self.serde.dumps_typed(entry.record)
+                rows.append((thread_id, checkpoint_ns, entry.checkpoint_id, kind, blob, now))
+            connection = self._connection()
+            with connection:
+                connection.executemany(UPSERT, rows)
+        except (sqlite3.Error, TypeError, ValueError) as e:
+            print(f"Session flush failed, will retry: {e}")
+            metrics.increment("sessions.flush_errors")
+            with self._lock:
+                for key, entry in batch.items():
+                    # Keep anything newer that arrived meanwhile
+                    self._dirty.setdefault(key, entry)
+            return 0
+
+        metrics.increment("sessions.flushes")
+        metrics.increment("sessions.rows_written", len(rows))
+        metrics.observe("sessions.flush_seconds", time.perf_counter() - start)
+        return len(rows)
+
+    def close(self):
+        """Stop the writer after a final flush."""
+        with self._wake:
+            if self._closed:
+                return
+            self._closed = True
+            writer = self._writer if self._writer_pid == os.getpid() else None
+            self._wake.notify()
+        if writer is not None and writer.is_alive():
+            writer.join(timeout=10)
+        self.flush()
+
+    # === Cache ===
+    def _remember(self, key: Key, entry: _Entry):
+        """Cache an entry; call with the lock held."""
+        self._cache[key] = entry
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.max_cached:
+            self._cache.popitem(last=False)
+
+    def _load(self, key: Key) -> Optional[_Entry]:
+        """Latest entry for a key: memory on a hit, disk on a miss or when revalidation is due."""
+        with self._lock:
+            pending = self._dirty.get(key)
+            cached = self._cache.get(key)
+        if pending is not None:
+            metrics.increment("sessions.cache_hits")
+            return pending
+        now = time.monotonic()
+        if cached is not None and (self.revalidate_after is None or now - cached.checked_at < self.revalidate_after):
+            metrics.increment("sessions.cache_hits")
+            return cached
+
+        if cached is not None:
+            metrics.increment("sessions.revalidations")
+            row = self._connection().execute(
+                "SELECT checkpoint_id FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ?", key
+            ).fetchone()
+            if row is None or cached.checkpoint_id >= row[0]:
+                metrics.increment("sessions.cache_hits")
+                with self._lock:
+                    # Don't clobber a checkpoint saved while we were reading
+                    if self._cache.get(key) is cached:
+                        self._remember(key, cached._replace(checked_at=now))
+                return cached
+
+        # Rehydrate: not in memory, or another worker saved a newer turn
+        row = self._connection().execute(
+            "SELECT checkpoint_id, type, record FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ?", key
+        ).fetchone()
+        if row is None:
+            return cached
+        metrics.increment("sessions.rehydrations")
+        blob = (row[1], row[2])
+        entry = _Entry(row[0], self.serde.loads_typed(blob), blob, now)
+        with self._lock:
+            self._remember(key, entry)
+        return entry
+
+    def _save(self, key: Key, checkpoint_id: str, record: Dict[str, Any]):
+        entry = _Entry(checkpoint_id, record, None, time.monotonic())
+        with self._wake:
+            if self._dirty.get(key) is not None:
+                metrics.increment("sessions.coalesced")
+            self._remember(key, entry)
+            self._dirty[key] = entry
+            metrics.set_gauge("sessions.dirty", len(self._dirty))
+            self._ensure_writer()
+            if len(self._dirty) >= self.max_batch:
+                self._wake.notify()
+
+    def _tuple(self, key: Key, entry: _Entry) -> CheckpointTuple:
+        thread_id, checkpoint_ns = key
+        record = entry.record
+        parent_id = record["parent_id"]
+        return CheckpointTuple(
+            config={"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns,
+                                     "checkpoint_id": entry.checkpoint_id}},
+            checkpoint=copy_checkpoint(record["checkpoint"]),
+            metadata=record["metadata"],
+            parent_config=(
+                {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns,
+                                  "checkpoint_id": parent_id}}
+                if parent_id else None
+            ),
+            pending_writes=[(task_id, channel, value) for task_id, channel, value, _ in record["writes"]],
+        )
+
+    def sessions_snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """Decoded checkpoints held in memory per thread, for memory diagnostics."""
+        with self._lock:
+            return {thread_id: entry.record for (thread_id, _), entry in self._cache.items()}
+
+    # === BaseCheckpointSaver ===
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        """Latest checkpoint of a thread (or the requested one, if it is the latest)."""
+        key = (config["configurable"]["thread_id"], config["configurable"].get("checkpoint_ns", ""))
+        entry = self._load(key)
+        if entry is None:
+            return None
+        checkpoint_id = get_checkpoint_id(config)
+        if checkpoint_id and checkpoint_id != entry.checkpoint_id:
+            return None
+        return self._tuple(key, entry)
+
+    def list(self, config: Optional[RunnableConfig], *, filter: Optional[Dict[str, Any]] = None,
+             before: Optional[RunnableConfig] = None, limit: Optional[int] = None) -> Iterator[CheckpointTuple]:
+        """Checkpoints matching the criteria (at most one per thread and namespace)."""
+        if config:
+            thread_id = config["configurable"]["thread_id"]
+            checkpoint_ns = config["configurable"].get("checkpoint_ns")
+            query = "SELECT thread_id, checkpoint_ns FROM checkpoints WHERE thread_id = ?"
+            keys = {tuple(row) for row in self._connection().execute(query, (thread_id,))}
+            with self._lock:
+                keys.update(key for key in self._dirty if key[0] == thread_id)
+            if checkpoint_ns is not None:
+                keys = {key for key in keys if key[1] == checkpoint_ns}
+        else:
+            keys = {tuple(row) for row in self._connection().execute("SELECT thread_id, checkpoint_ns FROM checkpoints")}
+            with self._lock:
+                keys.update(self._dirty)
+
+        before_id = get_checkpoint_id(before) if before else None
+        for key in sorted(keys):
+            if limit is not None and limit <= 0:
+                return
+            entry = self._load(key)
+            if entry is None:
+                continue
+            if config and get_checkpoint_id(config) and entry.checkpoint_id != get_checkpoint_id(config):
+                continue
+            if before_id and entry.checkpoint_id >= before_id:
+                continue
+            metadata = entry.record["metadata"]
+            if filter and not all(metadata.get(name) == value for name, value in filter.items()):
+                continue
+            if limit is not None:
+                limit -= 1
+            yield self._tuple(key, entry)
+
+    def put(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata,
+            new_versions: ChannelVersions) -> RunnableConfig:
+        """Record a thread's new latest checkpoint (written to disk by the writer thread)."""
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        record = {
+            "checkpoint": copy_checkpoint(checkpoint),
+            "metadata": get_checkpoint_metadata(config, metadata),
+            "parent_id": config["configurable"].get("checkpoint_id"),
+            "writes": [],
+        }
+        self._save((thread_id, checkpoint_ns), checkpoint["id"], record)
+        metrics.increment("sessions.puts")
+        return {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns,
+                                 "checkpoint_id": checkpoint["id"]}}
+
+    def put_writes(self, config: RunnableConfig, writes: Sequence[Tuple[str, Any]], task_id: str,
+                   task_path: str = "") -> None:
+        """Attach intermediate writes to the thread's latest checkpoint."""
+        key = (config["configurable"]["thread_id"], config["configurable"].get("checkpoint_ns", ""))
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+        entry = self._load(key)
+        if entry is None or entry.checkpoint_id != checkpoint_id:
+            # Writes for a superseded checkpoint can't be resumed from
+            return
+        existing = {(w[0], WRITES_IDX_MAP.get(w[1], i)) for i, w in enumerate(entry.record["writes"])}
+        added = []
+        for index, (channel, value) in enumerate(writes):
+            inner = (task_id, WRITES_IDX_MAP.get(channel, index))
+            if inner[1] >= 0 and inner in existing:
+                continue
+            added.append((task_id, channel, value, task_path))
+        if added:
+            record = dict(entry.record, writes=entry.record["writes"] + added)
+            self._save(key, checkpoint_id, record)
+
+    def delete_thread(self, thread_id: str) -> None:
+        """Delete a thread's checkpoints from memory and disk."""
+        with self._lock:
+            for key in [key for key in self._cache if key[0] == thread_id]:
+                del self._cache[key]
+            for key in [key for key in self._dirty if key[0] == thread_id]:
+                del self._dirty[key]
+        connection = self._connection()
+        with connection:
+            connection.execute("DELETE FROM checkpoints WHERE thread_id = ?", (thread_id,))
+
+    def get_next_version(self, current: Optional[str], channel: None) -> str:
+        if current is None:
+            current_v = 0
+        elif isinstance(current, int):
+            current_v = current
+        else:
+            current_v = int(current.split(".")[0])
+        return f"{current_v + 1:032}.{random.random():016}"
@@ -0,0 +1,99 @@
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+
+import metrics
+from waitlist import normalize_email
+
+# === Scripted copy shown by the funnel ===
+SOFT_CTA_TEXT = "Would you like to keep exploring more options or dive into planning?"
+SOFT_CTA_BUTTONS = ["Continue Planning", "Show Me More"]
+FINAL_CTA_TEXT = "I've shown you a sneak peek of what I can do! Ready to take your wedding planning to the next level? Over 500 couples have already joined our exclusive wedding planning community! ✨"
+FINAL_CTA_BUTTONS = ["Join the Waitlist", "Continue Exploring"]
+EMAIL_PROMPT_TEXT = "Great! Please provide your email address to join our exclusive wedding planning community."
+EMAIL_CONFIRMATION_TEXT = "Thank you for joining our wedding planning community! We'll be in touch soon with exclusive planning tips and resources."
+
+
+# === Intent checks shared with agent_node ===
+def wants_planning(text: str) -> bool:
+    return "continue planning" in text or "dive into planning" in text
+
+def wants_waitlist(text: str) -> bool:
+    return "join" in text or "waitlist" in text
+
+def has_email(text: str) -> bool:
+    return normalize_email(text) is not None
+
+def sneak_peek_pending(state: Dict) -> bool:
+    return not (state.get("seen_venues") and state.get("seen_dresses") and state.get("seen_hairstyles"))
+
+
+@dataclass(frozen=True)
+class ScriptedTurn:
+    """
+    A turn whose reply is fully determined by the funnel, so the LLM is skipped.
+
+    Attributes:
+        name: Label used in metrics
+        stage: planning_stage the turn starts in
+        when: Predicate on (state, lowercased user input)
+        reply: Assistant message recorded in chat history, or None when the
+            stage handler in agent_node adds its own message (email prompt,
+            carousel)
+    """
+    name: str
+    stage: str
+    when: Callable[[Dict, str], bool]
+    reply: Optional[str] = None
+
+
+# Checked in order; the first match wins. Each rule mirrors a branch of
+# agent_node + process_message whose output never uses the model's text.
+STAGE_SCRIPT: List[ScriptedTurn] = [
+    # Carousel turns: the reply is the carousel intro added by agent_node
+    ScriptedTurn("sneak_peek_carousel", "sneak_peek",
+                 lambda state, text: sneak_peek_pending(state)),
+    # Moving on to planning shows the waitlist CTA
+    ScriptedTurn("final_cta", "exploring",
+                 lambda state, text: wants_planning(text) and not state.get("cta_shown"),
+                 FINAL_CTA_TEXT),
+    # First exploring turn shows the soft CTA
+    ScriptedTurn("soft_cta", "exploring",
+                 lambda state, text: not wants_planning(text) and not state.get("soft_cta_shown"),
+                 SOFT_CTA_TEXT),
+    ScriptedTurn("final_cta", "final_cta",
+                 lambda state, text: not state.get("cta_shown"),
+                 FINAL_CTA_TEXT),
+    # Joining the waitlist asks for an email, then confirms it
+    ScriptedTurn("email_prompt", "final_cta",
+                 lambda state, text: wants_waitlist(text)),
+    ScriptedTurn("email_confirmation", "final_cta",
+                 lambda state, text: has_email(text)),
+]
+
+
+def scripted_turn(state: Dict, last_input: Optional[str]) -> Optional[ScriptedTurn]:
+    """
+    Decide, before calling the LLM, whether this turn is fully templated.
+
+    Args:
+        state: Current AgentState
+        last_input: Lowercased text of the user's message, None if there is none
+
+    Returns:
+        The matching ScriptedTurn, or None if the model must answer
+    """
+    if last_input is None:
+        return None
+    stage = state.get("planning_stage", "initial")
+    for turn in STAGE_SCRIPT:
+        if turn.stage == stage and turn.when(state, last_input):
+            return turn
+    return None
+
+
+def record_turn(stage: str, turn: Optional[ScriptedTurn]) -> None:
+    """Count LLM calls made and avoided per stage."""
+    if turn is None:
+        metrics.increment("agent.llm_calls", stage=stage)
+    else:
+        metrics.increment("agent.llm_avoided", stage=stage, turn=turn.name)
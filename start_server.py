@@ -1,8 +1,11 @@
 import os
 import sys
+import gc
+import argparse
 import logging
+import multiprocessing
 from dotenv import load_dotenv
-from app import app
+from app import create_app
 
 # Configure logging
 logging.basicConfig(
@@ -17,23 +20,103 @@ logger = logging.getLogger("SayYes-API")
 # Load environment variables
 load_dotenv()
 
-def start_server():
+def production_options(host: str, port: int) -> dict:
+    """
+    Gunicorn settings for production, overridable through the environment.
+
+    Chat turns mostly wait on OpenAI, so each worker also runs a few threads.
+    """
+    workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+    return {
+        'bind': f"{host}:{port}",
+        'workers': workers,
+        'worker_class': 'gthread',
+        # More threads than CHAT_MAX_IN_FLIGHT, so spare threads can answer health checks and shed load quickly
+        'threads': int(os.environ.get('WORKER_THREADS', 8)),
+        # Import the app and shared state once in the master, then fork
+        'preload_app': True,
+        # Recycle workers periodically to bound memory growth, jittered so they don't restart together
+        'max_requests': int(os.environ.get('MAX_REQUESTS', 1000)),
+        'max_requests_jitter': int(os.environ.get('MAX_REQUESTS_JITTER', 100)),
+        # LLM calls can be slow; on SIGTERM let in-flight requests finish before exiting
+        'timeout': int(os.environ.get('WORKER_TIMEOUT', 120)),
+        'graceful_timeout': int(os.environ.get('GRACEFUL_TIMEOUT', 30)),
+        'keepalive': int(os.environ.get('KEEPALIVE', 5)),
+        'accesslog': '-',
+        'post_fork': post_fork,
+    }
+
+def preload_shared_state():
+    """
+    Build the app plus everything requests share before workers are forked.
+
+    The compiled graph, prompt templates, catalog and rankers are created once
+    in the master and shared copy-on-write. gc.freeze() keeps the collector from
+    touching those objects (and dirtying their pages) in the workers.
+    """
+    app = create_app(start_reloader=False)
+
+    from sayyes_agent import warm_up
+    warm_up()
+
+    gc.freeze()
+    return app
+
+def post_fork(server, worker):
+    """Start per-worker background threads, which don't survive fork."""
+    from catalog import start_catalog_reloader
+    start_catalog_reloader()
+
+def start_production_server(host: str, port: int):
+    """Run the app under a pre-fork gunicorn server."""
+    from gunicorn.app.base import BaseApplication
+
+    class ProductionServer(BaseApplication):
+        def __init__(self, application, options):
+            self.application = application
+            self.options = options
+            super().__init__()
+
+        def load_config(self):
+            for key, value in self.options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            return self.application
+
+    options = production_options(host, port)
+    logger.info(f"Preloading shared state for {options['workers']} workers x {options['threads']} threads")
+    ProductionServer(preload_shared_state(), options).run()
+
+def start_server(production: bool = False):
     try:
         # Get port from environment variable or use 8080 as default
         port = int(os.environ.get('PORT', 8080))
         host = os.environ.get('HOST', '0.0.0.0')
-        
+
         logger.info(f"Starting SayYes.ai Wedding Planner API on {host}:{port}")
-        
+
         # Check for OpenAI API key
         if not os.environ.get('OPENAI_API_KEY'):
             logger.warning("OPENAI_API_KEY not set! Please set it in your .env file or environment variables.")
-        
-        # Run the Flask app
-        app.run(host=host, port=port, debug=False)
+
+        if production:
+            start_production_server(host, port)
+        else:
+            # Run the Flask development server
+            app = create_app()
+            app.run(host=host, port=port, debug=False)
     except Exception as e:
         logger.error(f"Error starting server: {e}")
         sys.exit(1)
 
 if __name__ == "__main__":
-    start_server() 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Start the SayYes.ai API server")
+    parser.add_argument(
+        "--production",
+        action="store_true",
+        default=os.environ.get("SERVER_MODE") == "production",
+        help="Run a pre-fork multi-worker server (also enabled by SERVER_MODE=production)"
+    )
+    args = parser.parse_args()
+    start_server(production=args.production)
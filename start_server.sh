@@ -26,6 +26,6 @@ if [ -f "requirements.txt" ]; then
     pip install -r requirements.txt
 fi
 
-# Start the Flask server
+# Start the production server (pre-fork workers)
 echo "Starting server..."
-python app.py 
\ No newline at end of file
+python start_server.py --production 
\ No newline at end of file
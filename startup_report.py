@@ -0,0 +1,143 @@
+"""
+Reproducible cold-start report: module import times and first-request latency.
+
+Every measurement runs in a fresh interpreter so nothing is cached between
+runs. The chat request uses a fake LLM, so no API keys or network are needed.
+
+Usage:
+    python startup_report.py [--runs 5] [--top 15]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# Modules whose import cost matters for cold starts, cheapest first
+MODULES = ["catalog", "image_utils", "app", "sayyes_agent"]
+
+# Placeholders so modules that validate their environment can be imported
+DUMMY_ENV = {
+    "OPENAI_API_KEY": "sk-startup-report",
+    "TAVILY_API_KEY": "tvly-startup-report",
+    "VERCEL_PROJECT_ID": "sayyes",
+    "CATALOG_RELOAD_INTERVAL": "0",
+}
+
+IMPORT_SNIPPET = """
+import time, json
+start = time.perf_counter()
+import {module}
+print(json.dumps({{"ms": (time.perf_counter() - start) * 1000}}))
+"""
+
+FIRST_REQUEST_SNIPPET = """
+import json, time
+timings = {}
+start = time.perf_counter()
+from app import create_app
+app = create_app()
+client = app.test_client()
+timings["create_app_ms"] = (time.perf_counter() - start) * 1000
+
+start = time.perf_counter()
+client.get("/api/health")
+timings["first_health_ms"] = (time.perf_counter() - start) * 1000
+
+# Load the agent the way the first chat request does, then swap in a fake LLM
+start = time.perf_counter()
+import sayyes_agent
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+sayyes_agent.llm = FakeListChatModel(responses=["Hi! What's your wedding style?"])
+timings["agent_load_ms"] = (time.perf_counter() - start) * 1000
+
+body = {"messages": [{"role": "user", "content": "Hi, we want a rustic wedding"}]}
+start = time.perf_counter()
+response = client.post("/api/chat", json=body)
+timings["first_chat_ms"] = (time.perf_counter() - start) * 1000
+timings["first_chat_status"] = response.status_code
+
+start = time.perf_counter()
+client.post("/api/chat", json=body)
+timings["second_chat_ms"] = (time.perf_counter() - start) * 1000
+print(json.dumps(timings))
+"""
+
+
+def _run(snippet: str, *args: str) -> subprocess.CompletedProcess:
+    env = dict(os.environ)
+    for key, value in DUMMY_ENV.items():
+        env.setdefault(key, value)
+    return subprocess.run(
+        [sys.executable, *args, "-c", snippet],
+        capture_output=True, text=True, env=env, cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+
+
+def _last_json_line(output: str) -> dict:
+    for line in reversed(output.strip().splitlines()):
+        if line.startswith("{"):
+            return json.loads(line)
+    raise ValueError(f"No JSON result in output:\n{output}")
+
+
+def measure_import(module: str, runs: int) -> float:
+    """Median wall time in ms to import a module in a fresh interpreter."""
+    samples = []
+    for _ in range(runs):
+        result = _run(IMPORT_SNIPPET.format(module=module))
+        if result.returncode != 0:
+            raise RuntimeError(f"Importing {module} failed:\n{result.stderr}")
+        samples.append(_last_json_line(result.stdout)["ms"])
+    return statistics.median(samples)
+
+
+def slowest_imports(module: str, top: int) -> list:
+    """Top imports by self time from `python -X importtime`."""
+    result = _run(f"import {module}", "-X", "importtime")
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = [part.strip() for part in line[len("import time:"):].split("|")]
+        rows.append((int(self_us), int(cumulative_us), name.strip()))
+    rows.sort(reverse=True)
+    return rows[:top]
+
+
+def measure_first_request(runs: int) -> dict:
+    """Median timings of app creation, the first health check and the first chat turns."""
+    samples = []
+    for _ in range(runs):
+        result = _run(FIRST_REQUEST_SNIPPET)
+        if result.returncode != 0:
+            raise RuntimeError(f"First request run failed:\n{result.stderr}")
+        samples.append(_last_json_line(result.stdout))
+    return {key: statistics.median(sample[key] for sample in samples) for key in samples[0]}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure import time and first-request latency")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters per measurement")
+    parser.add_argument("--top", type=int, default=15, help="Slowest imports to list")
+    args = parser.parse_args()
+
+    print(f"Python {sys.version.split()[0]}, median of {args.runs} runs\n")
+    print("Import time (fresh interpreter)")
+    for module in MODULES:
+        print(f"  {module:<16} {measure_import(module, args.runs):8.1f} ms")
+
+    print(f"\nSlowest imports under sayyes_agent (self time)")
+    for self_us, cumulative_us, name in slowest_imports("sayyes_agent", args.top):
+        print(f"  {name:<48} {self_us / 1000:8.1f} ms  (cumulative {cumulative_us / 1000:.1f} ms)")
+
+    timings = measure_first_request(args.runs)
+    print("\nFirst request")
+    print(f"  create_app()              {timings['create_app_ms']:8.1f} ms")
+    print(f"  first GET /api/health     {timings['first_health_ms']:8.1f} ms")
+    print(f"  agent module load         {timings['agent_load_ms']:8.1f} ms")
+    print(f"  first POST /api/chat      {timings['first_chat_ms']:8.1f} ms  (status {int(timings['first_chat_status'])})")
+    print(f"  second POST /api/chat     {timings['second_chat_ms']:8.1f} ms")
+    first_request = timings["agent_load_ms"] + timings["first_chat_ms"]
+    print(f"  => first chat turn total  {first_request:8.1f} ms")
@@ -0,0 +1,80 @@
+import threading
+import time
+import pytest
+import metrics
+from admission import AdmissionController, AdmissionRejected, TokenBucket
+
+def test_token_bucket_refills():
+    """A bucket allows its burst, then refills at its rate."""
+    bucket = TokenBucket(rate=2.0, capacity=2)
+    now = bucket.updated
+    assert bucket.take(now)[0]
+    assert bucket.take(now)[0]
+    allowed, wait = bucket.take(now)
+    assert not allowed
+    assert wait == pytest.approx(0.5)
+    assert bucket.take(now + 0.5)[0]
+
+def test_rate_limit_is_per_client():
+    """One noisy client is limited without affecting others."""
+    metrics.reset()
+    controller = AdmissionController(max_in_flight=10, rate=0.1, burst=1)
+    controller.acquire("noisy")
+    controller.release()
+    with pytest.raises(AdmissionRejected) as rejected:
+        controller.acquire("noisy")
+    assert rejected.value.status == 429
+    assert rejected.value.retry_after >= 1
+    controller.acquire("quiet")
+    controller.release()
+    assert metrics.get_counter("chat.shed", reason="rate_limited") == 1
+
+def test_queue_full_and_timeout():
+    """Requests beyond the in-flight limit queue briefly, then are shed with 503."""
+    metrics.reset()
+    controller = AdmissionController(max_in_flight=1, max_queue=1, queue_timeout=0.05, rate=100, burst=100)
+    controller.acquire("a")
+
+    errors = []
+    def wait_in_queue():
+        try:
+            controller.acquire("b")
+        except AdmissionRejected as e:
+            errors.append(e)
+    waiter = threading.Thread(target=wait_in_queue)
+    waiter.start()
+    time.sleep(0.01)
+    with pytest.raises(AdmissionRejected) as rejected:
+        controller.acquire("c")
+    assert rejected.value.status == 503
+    assert rejected.value.reason == "queue_full"
+
+    waiter.join()
+    assert errors and errors[0].reason == "queue_timeout"
+    assert controller.waiting == 0
+    assert metrics.snapshot()["gauges"]["chat.queue_depth"] == 0
+    controller.release()
+
+def test_queued_request_is_admitted_on_release():
+    """A waiter gets the slot as soon as a running request finishes."""
+    controller = AdmissionController(max_in_flight=1, max_queue=1, queue_timeout=2, rate=100, burst=100)
+    controller.acquire("a")
+    admitted = threading.Event()
+    def wait_in_queue():
+        with controller.admit("b"):
+            admitted.set()
+    waiter = threading.Thread(target=wait_in_queue)
+    waiter.start()
+    time.sleep(0.01)
+    assert not admitted.is_set()
+    controller.release()
+    waiter.join(timeout=1)
+    assert admitted.is_set()
+    assert controller.in_flight == 0
+
+if __name__ == "__main__":
+    test_token_bucket_refills()
+    test_rate_limit_is_per_client()
+    test_queue_full_and_timeout()
+    test_queued_request_is_admitted_on_release()
+    print("All admission tests passed!")
@@ -0,0 +1,56 @@
+from app import create_app, IMMUTABLE_CACHE_CONTROL
+from catalog import get_catalog
+
+def make_client():
+    return create_app(start_reloader=False).test_client()
+
+def test_images_endpoint_filters_and_versions():
+    """Catalog pages carry the version, a strong ETag and cache headers."""
+    client = make_client()
+    response = client.get("/api/images/venues?location=austin")
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body["version"] == get_catalog().version
+    assert body["carousel"]["items"]
+    assert all("austin" in item["location"].lower() for item in body["carousel"]["items"])
+    assert response.headers["ETag"].startswith(f'"{get_catalog().version}-')
+    assert "max-age" in response.headers["Cache-Control"]
+
+def test_images_endpoint_revalidation():
+    """A matching If-None-Match gets an empty 304; other filters get another ETag."""
+    client = make_client()
+    etag = client.get("/api/images/dresses").headers["ETag"]
+    response = client.get("/api/images/dresses", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.data == b""
+    assert response.headers["ETag"] == etag
+    assert client.get("/api/images/dresses?style=boho").headers["ETag"] != etag
+
+def test_versioned_images_url_is_immutable():
+    """Only a URL pinned to the current version is cached as immutable."""
+    client = make_client()
+    version = get_catalog().version
+    assert client.get(f"/api/images/cakes?v={version}").headers["Cache-Control"] == IMMUTABLE_CACHE_CONTROL
+    assert client.get("/api/images/cakes?v=old").headers["Cache-Control"] != IMMUTABLE_CACHE_CONTROL
+
+def test_client_id_ignores_spoofed_forwarded_hops(monkeypatch):
+    """Only the hop added by the trusted proxy identifies the client."""
+    import app as app_module
+    flask_app = create_app(start_reloader=False)
+
+    def identify(forwarded=None):
+        headers = {"X-Forwarded-For": forwarded} if forwarded else {}
+        with flask_app.test_request_context(headers=headers, environ_base={"REMOTE_ADDR": "10.0.0.1"}):
+            return app_module.client_id()
+
+    assert identify("1.2.3.4, 203.0.113.7") == "203.0.113.7"
+    assert identify("203.0.113.7") == "203.0.113.7"
+    assert identify() == "10.0.0.1"
+    monkeypatch.setattr(app_module, "TRUSTED_PROXY_COUNT", 2)
+    assert identify("1.2.3.4, 198.51.100.2, 203.0.113.7") == "198.51.100.2"
+    assert identify("203.0.113.7") == "10.0.0.1"
+    monkeypatch.setattr(app_module, "TRUSTED_PROXY_COUNT", 0)
+    assert identify("1.2.3.4") == "10.0.0.1"
+
+def test_unknown_category_is_404():
+    assert make_client().get("/api/images/shoes").status_code == 404
@@ -0,0 +1,151 @@
+import json
+import os
+import numpy as np
+import catalog as catalog_module
+from catalog import build_catalog, open_catalog, blob_url, get_catalog, CatalogReloader
+from image_utils import list_venue_images, list_hairstyle_images
+
+SOURCE = {
+    "categories": {
+        "venues": {"folder": "wedding venues", "items": [
+            {"filename": "Rustic_barn.png", "description": "Barn", "location": "Austin, TX", "price": "$$", "tags": ["Rustic", "Outdoor"]},
+            {"filename": "Grand_hall.png", "title": "The Grand Hall", "description": "Hall", "location": "Dallas, TX", "price": "$$$", "tags": []},
+        ]},
+        "hairstyles": {"folder": "wedding hairstyles", "items": [
+            {"filename": "Braids.png", "description": "Braids", "tags": ["Boho"]},
+        ]},
+    }
+}
+
+def _write_source(tmp_path, source=SOURCE):
+    path = tmp_path / "catalog.json"
+    path.write_text(json.dumps(source))
+    return str(path)
+
+def test_build_and_open_catalog(tmp_path):
+    """The compiled catalog round-trips items in the list_*_images format."""
+    output = str(tmp_path / "build")
+    version = build_catalog(_write_source(tmp_path), output)
+    catalog = open_catalog(output, project_id="demo")
+
+    assert catalog.version == version
+    assert len(catalog) == 3
+    assert isinstance(catalog._columns["image"][0], np.memmap)
+
+    venues = catalog.category_items("venues")
+    assert venues[0] == {
+        "image": "https://demo.public.blob.vercel-storage.com/wedding%20venues/Rustic_barn.png",
+        "title": "Rustic Barn",
+        "description": "Barn",
+        "location": "Austin, TX",
+        "price": "$$",
+        "tags": ["Rustic", "Outdoor"],
+    }
+    assert venues[1]["title"] == "The Grand Hall"
+    assert venues[1]["tags"] == []
+    assert "price" not in catalog.category_items("hairstyles")[0]
+    assert catalog.category_items("cakes") == []
+
+def test_versions_follow_source(tmp_path):
+    """Rebuilding unchanged source keeps the version; changes produce a new one."""
+    output = str(tmp_path / "build")
+    source_path = _write_source(tmp_path)
+    first = build_catalog(source_path, output)
+    assert build_catalog(source_path, output) == first
+
+    changed = json.loads(json.dumps(SOURCE))
+    changed["categories"]["venues"]["items"].pop()
+    second = build_catalog(_write_source(tmp_path, changed), output)
+    assert second != first
+    assert len(open_catalog(output)) == 2
+    assert sorted(name for name in os.listdir(output) if not name.startswith(".")) == sorted([first, second, "CURRENT"])
+
+def test_blob_host_comes_from_the_runtime_environment(tmp_path, monkeypatch):
+    """The artifact has no host baked in, is world-readable and needs a project id to open."""
+    output = str(tmp_path / "build")
+    version = build_catalog(_write_source(tmp_path), output)
+    assert os.stat(os.path.join(output, version)).st_mode & 0o777 == 0o755
+    assert os.stat(os.path.join(output, "CURRENT")).st_mode & 0o777 == 0o644
+
+    monkeypatch.setenv("VERCEL_PROJECT_ID", "realproj")
+    image = open_catalog(output).category_items("venues")[0]["image"]
+    assert image == "https://realproj.public.blob.vercel-storage.com/wedding%20venues/Rustic_barn.png"
+
+    monkeypatch.delenv("VERCEL_PROJECT_ID")
+    try:
+        open_catalog(output)
+    except ValueError as e:
+        assert "VERCEL_PROJECT_ID" in str(e)
+    else:
+        raise AssertionError("opening without VERCEL_PROJECT_ID should fail")
+
+def test_list_functions_read_catalog():
+    """The list_*_images functions serve the compiled catalog with one blob host."""
+    venues = list_venue_images()
+    assert len(venues) == 5
+    assert all(".public.blob.vercel-storage.com/wedding%20venues/" in venue["image"] for venue in venues)
+    venues[0]["tags"].append("mutated")
+    assert "mutated" not in list_venue_images()[0]["tags"]
+    assert list_hairstyle_images()[0]["tags"] == ["Hairstyle", "Wedding"]
+
+def test_reloader_swaps_catalog(tmp_path):
+    """Editing the source swaps a new catalog in and reports the reload."""
+    output = str(tmp_path / "build")
+    source_path = _write_source(tmp_path)
+    build_catalog(source_path, output)
+
+    previous = catalog_module._CATALOG
+    try:
+        catalog_module._CATALOG = open_catalog(output)
+        reloader = CatalogReloader(source_path, output, interval=60)
+        assert reloader.poll() is False
+
+        changed = json.loads(json.dumps(SOURCE))
+        changed["categories"]["venues"]["items"].append(
+            {"filename": "Beach.png", "description": "Beach", "location": "Miami, FL", "tags": ["Beach"]})
+        with open(source_path, "w") as f:
+            json.dump(changed, f)
+        os.utime(source_path, ns=(1, 1))  # make sure the mtime differs on coarse clocks
+
+        assert reloader.poll() is True
+        assert len(get_catalog()) == 4
+        assert get_catalog().category_items("venues")[-1]["title"] == "Beach"
+        assert reloader.last_reload["items"] == 4
+        assert reloader.last_reload["duration_ms"] >= 0
+        assert reloader.poll() is False
+    finally:
+        catalog_module._CATALOG = previous
+
+def test_startup_rebuilds_a_stale_artifact(tmp_path, monkeypatch):
+    """Source edits made while no server was running are compiled on the next start."""
+    output = str(tmp_path / "build")
+    source_path = _write_source(tmp_path)
+    first = build_catalog(source_path, output)
+
+    changed = json.loads(json.dumps(SOURCE))
+    changed["categories"]["venues"]["items"].pop()
+    _write_source(tmp_path, changed)
+
+    reloader = CatalogReloader(source_path, output, interval=60)
+    monkeypatch.setattr(catalog_module, "CATALOG_SOURCE", source_path)
+    monkeypatch.setattr(catalog_module, "CATALOG_DIR", output)
+    monkeypatch.setattr(catalog_module, "_CATALOG", None)
+    assert get_catalog().version != first
+    assert len(get_catalog()) == 2
+
+    # The reloader created before the restart's rebuild still treats it as a change
+    assert reloader._fingerprint[0] is None
+    assert reloader.poll() is False
+    assert reloader._fingerprint[0] is not None
+
+def test_blob_url_quotes_folder():
+    assert blob_url("wedding cakes", "a b.png", "demo") == "https://demo.public.blob.vercel-storage.com/wedding%20cakes/a%20b.png"
+
+if __name__ == "__main__":
+    import tempfile, pathlib
+    test_build_and_open_catalog(pathlib.Path(tempfile.mkdtemp()))
+    test_versions_follow_source(pathlib.Path(tempfile.mkdtemp()))
+    test_list_functions_read_catalog()
+    test_reloader_swaps_catalog(pathlib.Path(tempfile.mkdtemp()))
+    test_blob_url_quotes_folder()
+    print("All catalog tests passed!")
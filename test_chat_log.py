@@ -0,0 +1,36 @@
+import copy
+import pickle
+from langchain_core.messages import AIMessage, HumanMessage, messages_to_dict
+from chat_log import ChatLog
+
+def test_snapshots_share_storage():
+    """Appending to the newest view reuses the store and leaves older views intact."""
+    first = ChatLog(["a", "b"])
+    second = first + ["c"]
+    second.append("d")
+    assert list(first) == ["a", "b"]
+    assert list(second) == ["a", "b", "c", "d"]
+    assert second._store is first._store
+    assert second[-1] == "d" and second[1:3] == ["b", "c"]
+
+def test_branching_copies_once():
+    """Appending to an older view forks it without touching the newer one."""
+    base = ChatLog(["a"])
+    newer = base + ["b"]
+    branch = base + ["x"]
+    assert list(newer) == ["a", "b"]
+    assert list(branch) == ["a", "x"]
+    assert branch._store is not newer._store
+    # The branch is now the tip of its own store
+    branch.append("y")
+    assert list(branch) == ["a", "x", "y"]
+
+def test_list_compatibility():
+    """ChatLog compares, concatenates, pickles and serializes like a list."""
+    log = ChatLog([HumanMessage(content="hi"), AIMessage(content="hello")])
+    assert log == [HumanMessage(content="hi"), AIMessage(content="hello")]
+    assert ["sys"] + log == ["sys", HumanMessage(content="hi"), AIMessage(content="hello")]
+    assert messages_to_dict(log)[1]["data"]["content"] == "hello"
+    assert pickle.loads(pickle.dumps(log)) == log
+    assert copy.deepcopy(log) == log
+    assert not ChatLog() and ChatLog.of(log) is log
@@ -0,0 +1,66 @@
+import gzip
+import pytest
+import compression
+import metrics
+from app import create_app
+from compression import negotiate
+
+def make_client():
+    return create_app(start_reloader=False).test_client()
+
+def test_negotiate_prefers_best_available():
+    """Highest q-value wins; ties go to the strongest codec installed."""
+    assert negotiate("gzip") == "gzip"
+    assert negotiate("gzip;q=1, br;q=0.5") == "gzip"
+    assert negotiate("gzip;q=0") is None
+    assert negotiate("identity") is None
+    assert negotiate("") is None
+    assert negotiate("*") == next(iter(compression.CODECS))
+    if "br" in compression.CODECS:
+        assert negotiate("gzip, deflate, br") == "br"
+
+def test_large_json_is_compressed_and_cached():
+    """A catalog page is gzipped once; the repeat is served from the cache."""
+    metrics.reset()
+    client = make_client()
+    first = client.get("/api/images/venues", headers={"Accept-Encoding": "gzip"})
+    assert first.headers["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in first.headers["Vary"]
+    assert first.headers["ETag"].endswith('-gzip"')
+    plain = client.get("/api/images/venues").data
+    assert gzip.decompress(first.data) == plain
+
+    second = client.get("/api/images/venues", headers={"Accept-Encoding": "gzip"})
+    assert second.data == first.data
+    assert metrics.get_counter("compression.cache_hits", encoding="gzip") == 1
+    assert metrics.get_counter("compression.bytes_out", encoding="gzip") == 2 * len(first.data)
+
+def test_only_static_routes_are_cached():
+    """Responses of views not marked cache_compressed are compressed but not cached."""
+    metrics.reset()
+    for i in range(50):
+        metrics.increment("test.padding", shard=i)
+    app = create_app(start_reloader=False)
+    response = app.test_client().get("/api/metrics", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert len(app.extensions["compression_cache"]) == 0
+
+def test_compressed_etag_revalidates():
+    """The compressed variant's ETag still gets a 304, echoing that ETag."""
+    client = make_client()
+    etag = client.get("/api/images/cakes", headers={"Accept-Encoding": "gzip"}).headers["ETag"]
+    response = client.get("/api/images/cakes", headers={"Accept-Encoding": "gzip", "If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag
+
+def test_small_bodies_are_not_compressed():
+    response = make_client().get("/", headers={"Accept-Encoding": "gzip"})
+    assert "Content-Encoding" not in response.headers
+
+@pytest.mark.skipif("zstd" not in compression.CODECS, reason="zstandard not installed")
+def test_zstd():
+    import zstandard
+    client = make_client()
+    response = client.get("/api/images/dresses", headers={"Accept-Encoding": "zstd"})
+    assert response.headers["Content-Encoding"] == "zstd"
+    assert zstandard.ZstdDecompressor().decompress(response.data) == client.get("/api/images/dresses").data
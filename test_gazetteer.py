@@ -0,0 +1,120 @@
+import time
+
+import sayyes_agent
+from gazetteer import Gazetteer, get_gazetteer, location_matches
+from ranking import CatalogRanker
+
+def test_longest_match_and_canonical_id():
+    """The longest alias wins and normalizes to the canonical id."""
+    gazetteer = get_gazetteer()
+    assert gazetteer.find("We're dreaming of napa valley").id == "us-ca-napa-valley"
+    assert gazetteer.find("somewhere in Austin, TX please").id == "us-tx-austin"
+    assert gazetteer.find("New York, NY").id == "us-ny-new-york-city"
+    assert gazetteer.find("a beach wedding in Cancún").id == "mx-cancun"
+    assert gazetteer.find("the texas hill country, maybe Austin").id == "us-tx-hill-country"
+
+def test_no_false_positives_on_common_words():
+    """State abbreviations and place names that are everyday words need a qualifier."""
+    gazetteer = get_gazetteer()
+    for message in ["I'm in love", "tell me more", "we might split the costs", "a champagne toast", "hi", "or maybe ok"]:
+        assert gazetteer.find(message) is None, message
+    assert gazetteer.find("Split, Croatia").id == "hr-split"
+
+def test_find_all_spans():
+    """Mentions come back in order with spans into the original text."""
+    message = "Either Tuscany or the Amalfi Coast, or back home in Charleston"
+    matches = get_gazetteer().find_all(message)
+    assert [message[m.start:m.end] for m in matches] == ["Tuscany", "Amalfi Coast", "Charleston"]
+    assert [m.place.id for m in matches] == ["it-tuscany", "it-amalfi-coast", "us-sc-charleston"]
+
+def test_hierarchy_filter():
+    """An id matches the place and everything inside it; plain text stays a substring filter."""
+    assert get_gazetteer().ancestors("us-tx-austin") == ["us-tx-austin", "us-tx", "us"]
+    assert location_matches("us-tx", "Austin, TX")
+    assert location_matches("us-tx-austin", "Austin, TX")
+    assert not location_matches("us-tx-dallas", "Austin, TX")
+    assert location_matches("austin", "Austin, TX")
+
+    ranker = CatalogRanker([
+        {"title": "Barn", "location": "Austin, TX"},
+        {"title": "Loft", "location": "New York, NY"},
+        {"title": "Ballroom", "location": "Dallas, TX"},
+    ])
+    assert ranker.filter_mask(location="us-tx").tolist() == [True, False, True]
+    assert ranker.top_k({"location_preference": "us-ny-new-york-city"}, 1)[0]["title"] == "Loft"
+
+class EchoLLM:
+    def invoke(self, messages, **kwargs):
+        from langchain_core.messages import AIMessage
+        return AIMessage(content="Lovely!")
+
+def test_agent_stores_the_canonical_id(monkeypatch):
+    """Locations are picked up without keywords and stored as gazetteer ids."""
+    monkeypatch.setattr(sayyes_agent, "llm", EchoLLM())
+    result = sayyes_agent.process_message("A modern wedding in Napa, please")
+    assert result["state"]["location_preference"] == "us-ca-napa-valley"
+    assert result["state"]["info_collected"] == 2
+
+    result = sayyes_agent.process_message("About 120 guests, near Austin TX", result["state"])
+    assert result["state"]["location_preference"] == "us-tx-austin"
+    assert result["state"]["guest_count"] == 120
+    assert result["state"]["planning_stage"] == "sneak_peek"
+
+def test_places_need_a_location_cue():
+    """Place names used as other words aren't taken as the location without "in", "near" or "at"."""
+    gazetteer = get_gazetteer()
+    for message in ["turkey for dinner", "chicago style pizza", "a jamaica themed menu",
+                    "my friend Austin is officiating", "charlotte and jordan are my bridesmaids"]:
+        assert gazetteer.find(message, cued=True) is None, message
+    assert gazetteer.find("getting married in Jamaica", cued=True).id == "jm"
+    assert gazetteer.find("somewhere near the Amalfi Coast", cued=True).id == "it-amalfi-coast"
+
+def test_agent_keeps_the_location_on_uncued_mentions(monkeypatch):
+    """A name in passing doesn't replace the location, but an answer to "where?" sets it."""
+    monkeypatch.setattr(sayyes_agent, "llm", EchoLLM())
+    result = sayyes_agent.process_message("A modern wedding in Napa, please")
+    for message in ["turkey for dinner", "chicago style pizza", "a jamaica themed menu",
+                    "my friend Austin", "charlotte and jordan"]:
+        result = sayyes_agent.process_message(message, result["state"])
+        assert result["state"]["location_preference"] == "us-ca-napa-valley", message
+
+    class WhereLLM(EchoLLM):
+        def invoke(self, messages, **kwargs):
+            from langchain_core.messages import AIMessage
+            return AIMessage(content="Where are you thinking of getting married?")
+
+    monkeypatch.setattr(sayyes_agent, "llm", WhereLLM())
+    result = sayyes_agent.process_message("A rustic wedding")
+    monkeypatch.setattr(sayyes_agent, "llm", EchoLLM())
+    result = sayyes_agent.process_message("Charleston!", result["state"])
+    assert result["state"]["location_preference"] == "us-sc-charleston"
+
+def test_bad_data_is_rejected():
+    """Aliases claimed by two places and unknown parents fail at load time."""
+    for places in (
+        [{"id": "a", "name": "Springfield", "kind": "city"}, {"id": "b", "name": "Springfield", "kind": "city"}],
+        [{"id": "a", "name": "Somewhere", "kind": "city", "parent": "nowhere"}],
+    ):
+        try:
+            Gazetteer(places)
+        except ValueError:
+            continue
+        raise AssertionError(f"{places} should be rejected")
+
+def test_long_message_is_fast():
+    """Scanning stays linear in the message length."""
+    message = "we would love something intimate with lots of flowers and candles " * 2000 + "in Sedona"
+    start = time.perf_counter()
+    place = get_gazetteer().find(message)
+    assert place.id == "us-az-sedona"
+    assert time.perf_counter() - start < 0.5
+
+if __name__ == "__main__":
+    test_longest_match_and_canonical_id()
+    test_no_false_positives_on_common_words()
+    test_find_all_spans()
+    test_hierarchy_filter()
+    test_places_need_a_location_cue()
+    test_bad_data_is_rejected()
+    test_long_message_is_fast()
+    print("All gazetteer tests passed!")
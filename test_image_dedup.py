@@ -0,0 +1,123 @@
+import io
+import random
+import numpy as np
+import pytest
+from PIL import Image
+from image_proxy import ProxyError
+from image_dedup import HashCache, HashIndex, ImageDeduplicator, fetch_catalog_image, fetch_image, hamming, phash
+
+def _photo(seed, size=(256, 192)):
+    """A smooth random 'photo': blurred noise upscaled, so resizing keeps its structure."""
+    rng = np.random.default_rng(seed)
+    small = Image.fromarray(rng.integers(0, 255, (6, 8, 3), dtype=np.uint8))
+    return small.resize(size, Image.BICUBIC)
+
+def _encode(image, fmt="PNG"):
+    out = io.BytesIO()
+    image.save(out, fmt)
+    return out.getvalue()
+
+def test_phash_survives_resize_and_reencoding():
+    """The same photo at another size or format hashes a few bits apart; another photo doesn't."""
+    original = phash(_photo(1))
+    assert hamming(original, phash(_photo(1, (640, 480)))) <= 4
+    assert hamming(original, phash(Image.open(io.BytesIO(_encode(_photo(1, (128, 96)), "JPEG"))))) <= 6
+    assert hamming(original, phash(_photo(2))) > 12
+    assert 0 <= original < 2 ** 64
+
+def test_index_finds_everything_within_threshold():
+    """Banded lookup returns exactly what an all-pairs scan would."""
+    rng = random.Random(0)
+    hashes = [rng.getrandbits(64) for _ in range(500)]
+    # Near copies of the first 50 hashes
+    hashes += [value ^ (1 << rng.randrange(64)) ^ (1 << rng.randrange(64)) for value in hashes[:50]]
+    index = HashIndex(threshold=6)
+    for position, value in enumerate(hashes):
+        index.add(position, value)
+    for value in hashes[:60]:
+        expected = sorted(p for p, other in enumerate(hashes) if hamming(value, other) <= 6)
+        assert sorted(key for key, _ in index.query(value)) == expected
+
+def test_dedupe_keeps_order_and_largest_copy():
+    """Duplicates collapse into the first slot, which takes the largest copy."""
+    files = {
+        "https://cdn.example.com/w300/barn.png": _encode(_photo(1, (300, 225))),
+        "https://cdn.example.com/beach.png": _encode(_photo(2)),
+        "https://cdn.example.com/w1200/barn.jpg": _encode(_photo(1, (1200, 900)), "JPEG"),
+        "https://other-cdn.example.com/beach.png": _encode(_photo(2)),
+    }
+    fetched = []
+
+    def fetch(url):
+        fetched.append(url)
+        if url not in files:
+            raise OSError("404")
+        return files[url]
+
+    deduplicator = ImageDeduplicator(HashCache(), workers=1, fetch=fetch)
+    urls = list(files) + ["https://cdn.example.com/missing.png", "https://cdn.example.com/beach.png"]
+    assert deduplicator.dedupe(urls) == [
+        "https://cdn.example.com/w1200/barn.jpg",
+        "https://cdn.example.com/beach.png",
+        "https://cdn.example.com/missing.png",
+    ]
+    assert deduplicator.dedupe(urls, limit=1) == ["https://cdn.example.com/w300/barn.png"]
+
+    # Second pass: known URLs are not downloaded again
+    fetched.clear()
+    records = [{"url": url} for url in files]
+    assert len(deduplicator.dedupe(records, url=lambda record: record["url"])) == 2
+    assert fetched == []
+
+def test_cache_by_content_and_persistence(tmp_path):
+    """Identical bytes are hashed once, and the cache survives a reload."""
+    path = str(tmp_path / "hashes.json")
+    cache = HashCache(path)
+    data = _encode(_photo(3))
+    first = cache.put("https://a.example.com/x.png", data)
+    assert cache.put("https://b.example.com/y.png", data) == first
+    cache.save()
+
+    reloaded = HashCache(path)
+    assert reloaded.get("https://b.example.com/y.png") == first
+
+def test_groups_for_bulk_ingestion(tmp_path):
+    """Catalog checks report each photo's duplicate ids together."""
+    paths = {}
+    for name, image in [("a.png", _photo(4)), ("b.png", _photo(5)), ("a_large.png", _photo(4, (800, 600)))]:
+        paths[name] = str(tmp_path / name)
+        image.save(paths[name])
+    deduplicator = ImageDeduplicator(HashCache(), workers=2, fetch=fetch_catalog_image)
+    assert deduplicator.groups(paths.items()) == [["a.png", "a_large.png"]]
+
+def test_deadline_bounds_slow_downloads():
+    """Past the deadline images are kept unhashed instead of waiting on slow hosts."""
+    import time
+
+    def fetch(url):
+        time.sleep(0.5 if "slow" in url else 0)
+        return _encode(_photo(1))
+
+    deduplicator = ImageDeduplicator(HashCache(), workers=4, fetch=fetch)
+    urls = ["https://fast.example/a.png", "https://fast.example/b.png"] + [f"https://slow.example/{i}.png" for i in range(8)]
+    start = time.perf_counter()
+    kept = deduplicator.dedupe(urls, deadline=0.1)
+    assert time.perf_counter() - start < 0.4
+    # The two fast copies collapse; slow ones are kept as they are
+    assert kept == ["https://fast.example/a.png"] + urls[2:]
+
+def test_scraped_urls_are_fetched_through_the_proxy_checks():
+    """Per-request fetches refuse local files and internal hosts."""
+    for url in ["/etc/passwd", "file:///etc/passwd", "http://127.0.0.1/x.png", "http://169.254.169.254/latest"]:
+        with pytest.raises(ProxyError):
+            fetch_image(url)
+
+if __name__ == "__main__":
+    import tempfile, pathlib
+    test_phash_survives_resize_and_reencoding()
+    test_index_finds_everything_within_threshold()
+    test_dedupe_keeps_order_and_largest_copy()
+    test_cache_by_content_and_persistence(pathlib.Path(tempfile.mkdtemp()))
+    test_groups_for_bulk_ingestion(pathlib.Path(tempfile.mkdtemp()))
+    test_deadline_bounds_slow_downloads()
+    print("All image dedup tests passed!")
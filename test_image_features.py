@@ -0,0 +1,52 @@
+import os
+import numpy as np
+from PIL import Image
+import image_features
+from image_features import build_feature_index, extract_features, load_feature_index, similar_items, FEATURE_DIM
+
+def _save(path, color, noise=0):
+    rng = np.random.default_rng(noise)
+    pixels = np.clip(np.array(color) + rng.integers(-20, 20, (32, 32, 3)), 0, 255).astype(np.uint8)
+    Image.fromarray(pixels).save(path)
+
+def test_extract_features_is_unit_vector():
+    """Features are float32 unit vectors of the expected size."""
+    features = extract_features(Image.new("RGB", (40, 30), (200, 10, 10)))
+    assert features.dtype == np.float32
+    assert features.shape == (FEATURE_DIM,)
+    assert abs(np.linalg.norm(features) - 1.0) < 1e-5
+
+def test_similar_items_prefers_similar_colors(tmp_path):
+    """A reddish image is closest to the other reddish image."""
+    assets = tmp_path / "assets" / "venues"
+    os.makedirs(assets)
+    _save(assets / "red1.png", (220, 30, 30), 1)
+    _save(assets / "red2.png", (210, 40, 40), 2)
+    _save(assets / "blue.png", (30, 30, 220), 3)
+    open(assets / "empty.jpg", "w").close()  # unreadable files are skipped
+
+    output = tmp_path / "build"
+    count = build_feature_index(str(tmp_path / "assets"), include_blob=False, output_dir=str(output))
+    assert count == 3
+
+    image_features._INDEX = None
+    matrix, ids, _ = load_feature_index(str(output))
+    assert isinstance(matrix, np.memmap)
+
+    red1 = next(image_id for image_id in ids if image_id.endswith("red1.png"))
+    matches = similar_items(red1, k=2)
+    assert matches[0]["id"].endswith("red2.png")
+    assert matches[0]["score"] > matches[1]["score"]
+    assert similar_items("missing.png") == []
+
+    # Candidates restrict the search, e.g. to one category's catalog items
+    blue = next(image_id for image_id in ids if image_id.endswith("blue.png"))
+    assert [match["id"] for match in similar_items(red1, k=5, candidates=[blue, red1, "other.png"])] == [blue]
+    assert similar_items(red1, candidates=[]) == []
+    image_features._INDEX = None
+
+if __name__ == "__main__":
+    import tempfile, pathlib
+    test_extract_features_is_unit_vector()
+    test_similar_items_prefers_similar_colors(pathlib.Path(tempfile.mkdtemp()))
+    print("All image feature tests passed!")
@@ -0,0 +1,217 @@
+import io
+import os
+import threading
+import pytest
+from flask import Flask, Response, redirect, request
+from PIL import Image
+from werkzeug.serving import make_server
+from app import create_app
+from image_proxy import ImageProxy, ProxyError, proxied_url, sniff_image_type, url_signature
+
+def _png(color, size=(40, 30)):
+    out = io.BytesIO()
+    Image.new("RGB", size, color).save(out, "PNG")
+    return out.getvalue()
+
+RED, BLUE = _png((200, 0, 0)), _png((0, 0, 200))
+
+@pytest.fixture(scope="module")
+def upstream():
+    """A third-party image host on localhost."""
+    site = Flask("upstream")
+    site.hits = 0
+
+    @site.route("/red.png")
+    def red():
+        site.hits += 1
+        return Response(RED, mimetype="image/png")
+
+    @site.route("/blue.png")
+    def blue():
+        return Response(BLUE, mimetype="image/png")
+
+    @site.route("/moved.png")
+    def moved():
+        return redirect("/red.png")
+
+    @site.route("/escape.png")
+    def escape():
+        return redirect(f"http://127.0.0.2:{request.host.rsplit(':', 1)[1]}/red.png")
+
+    @site.route("/page.html")
+    def page():
+        return Response("<html></html>", mimetype="text/html")
+
+    @site.route("/disguised.png")
+    def disguised():
+        return Response(b"<svg onload=alert(1)></svg>", mimetype="image/png")
+
+    @site.route("/huge.png")
+    def huge():
+        return Response(RED + b"\0" * 200_000, mimetype="image/png")
+
+    server = make_server("127.0.0.1", 0, site, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield site, f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+
+def _get(proxy, url):
+    """Fetch through the proxy and close the file it hands back."""
+    entry = proxy.get(url)
+    entry.file.close()
+    return entry
+
+def test_fetches_once_and_follows_redirects(upstream, tmp_path):
+    """The first request downloads, later ones and redirected URLs come from disk."""
+    site, base = upstream
+    proxy = ImageProxy(str(tmp_path), allow_private=True)
+    hits = site.hits
+    first = proxy.get(f"{base}/red.png")
+    with first.file:
+        assert first.file.read() == RED
+    again = _get(proxy, f"{base}/red.png")
+    assert (again.key, again.path, again.size) == (first.key, first.path, first.size)
+    assert site.hits == hits + 1
+    assert first.mimetype == "image/png"
+
+    moved = _get(proxy, f"{base}/moved.png")
+    assert moved.size == len(RED) and moved.key != first.key
+
+def test_rejects_non_images_and_oversized_bodies(upstream, tmp_path):
+    """HTML, disguised non-images and bodies over the limit are refused and not cached."""
+    _, base = upstream
+    proxy = ImageProxy(str(tmp_path), max_image_bytes=100_000, allow_private=True)
+    for path, status in [("/page.html", 415), ("/disguised.png", 415), ("/huge.png", 413), ("/missing.png", 502)]:
+        with pytest.raises(ProxyError) as error:
+            proxy.get(base + path)
+        assert error.value.status == status, path
+    assert proxy.stats()["entries"] == 0
+    assert not [name for _, _, files in os.walk(tmp_path) for name in files]
+
+class LoopbackIsPublic(ImageProxy):
+    """Treats the test server on 127.0.0.1 as a public host, any other address as internal."""
+
+    def _address_allowed(self, address):
+        return address == "127.0.0.1"
+
+def test_refuses_private_addresses(upstream, tmp_path):
+    """Internal hosts are refused, also when a public host redirects to one."""
+    _, base = upstream
+    proxy = ImageProxy(str(tmp_path))
+    for url in [f"{base}/red.png", "http://169.254.169.254/latest/meta-data", "http://[::1]/x.png", "file:///etc/passwd"]:
+        with pytest.raises(ProxyError) as error:
+            proxy.get(url)
+        assert error.value.status in (400, 403), url
+
+    proxy = LoopbackIsPublic(str(tmp_path))
+    assert _get(proxy, f"{base}/red.png").size == len(RED)
+    with pytest.raises(ProxyError) as error:
+        proxy.get(f"{base}/escape.png")
+    assert error.value.status == 403
+
+def test_connects_to_the_checked_address(upstream, tmp_path):
+    """A DNS answer that changes after the check (rebinding) can't redirect the connection."""
+    _, base = upstream
+    port = base.rsplit(":", 1)[1]
+    answers = {"images.test": ["127.0.0.1"], "rebind.test": ["127.0.0.1", "127.0.0.2"]}
+
+    def resolve(host, port, **kwargs):
+        # rebind.test answers public first, internal on every later lookup
+        address = answers[host][0] if len(answers[host]) == 1 else answers[host].pop(0)
+        return [(None, None, None, "", (address, port))]
+
+    proxy = LoopbackIsPublic(str(tmp_path), resolve=resolve)
+    # images.test only exists in `resolve`, so the fetch proves the session connects where it was told
+    assert _get(proxy, f"http://images.test:{port}/red.png").size == len(RED)
+    with pytest.raises(ProxyError) as error:
+        proxy.get(f"http://rebind.test:{port}/blue.png")
+    assert error.value.status == 403
+
+def test_lru_eviction_and_reload(upstream, tmp_path):
+    """The least recently used image goes when the cache is full; the index is the directory."""
+    _, base = upstream
+    proxy = ImageProxy(str(tmp_path), max_cache_bytes=len(RED) + len(BLUE) - 1, allow_private=True)
+    red = _get(proxy, f"{base}/red.png")
+    blue = _get(proxy, f"{base}/blue.png")
+    assert not os.path.exists(red.path) and os.path.exists(blue.path)
+    assert proxy.stats()["entries"] == 1
+
+    reloaded = ImageProxy(str(tmp_path), allow_private=True)
+    assert reloaded.stats() == {"entries": 1, "bytes": len(BLUE), "max_bytes": reloaded.max_cache_bytes}
+
+def test_workers_share_one_budget(upstream, tmp_path):
+    """Proxies on one directory (one per worker) serve each other's files and keep to one budget."""
+    site, base = upstream
+    budget = len(RED) + len(BLUE) - 1
+    first, second = (ImageProxy(str(tmp_path), max_cache_bytes=budget, allow_private=True) for _ in range(2))
+    hits = site.hits
+    _get(first, f"{base}/red.png")
+    _get(second, f"{base}/red.png")
+    assert site.hits == hits + 1
+
+    _get(second, f"{base}/blue.png")
+    _get(first, f"{base}/moved.png")
+    assert first.stats()["bytes"] <= budget
+
+def test_served_file_survives_eviction(upstream, tmp_path):
+    """An image being served stays readable when another worker evicts it, and the next get refetches."""
+    site, base = upstream
+    proxy = ImageProxy(str(tmp_path), allow_private=True)
+    _get(proxy, f"{base}/red.png")
+    entry = proxy.get(f"{base}/red.png")
+    os.remove(entry.path)
+    with entry.file:
+        assert entry.file.read() == RED
+
+    hits = site.hits
+    assert _get(proxy, f"{base}/red.png").size == len(RED)
+    assert site.hits == hits + 1
+
+def test_endpoint_serves_ranges_and_cache_headers(upstream, tmp_path):
+    """/api/img answers signed URLs with long-lived, conditional, range-capable file responses."""
+    _, base = upstream
+    app = create_app(start_reloader=False)
+    app.extensions["image_proxy"] = ImageProxy(str(tmp_path), allow_private=True, secret="s3cret")
+    client = app.test_client()
+
+    url = proxied_url(f"{base}/red.png", "http://api.test", "s3cret").replace("http://api.test", "")
+    with client.get(url) as response:
+        assert response.status_code == 200
+        assert response.data == RED
+        assert response.mimetype == "image/png"
+        assert "immutable" in response.headers["Cache-Control"]
+        assert response.headers["X-Content-Type-Options"] == "nosniff"
+        assert "Content-Encoding" not in response.headers
+
+    with client.get(url, headers={"Range": "bytes=0-7"}) as partial:
+        assert partial.status_code == 206
+        assert partial.data == RED[:8]
+
+    assert client.get(url, headers={"If-None-Match": response.headers["ETag"]}).status_code == 304
+    page = f"{base}/page.html"
+    assert client.get(f"/api/img?url={page}&sig={url_signature(page, 's3cret')}").status_code == 415
+    assert client.get("/api/img").status_code == 400
+
+def test_endpoint_only_fetches_signed_urls(upstream, tmp_path):
+    """Unsigned or re-signed URLs are refused, and without a secret the endpoint is off."""
+    site, base = upstream
+    app = create_app(start_reloader=False)
+    app.extensions["image_proxy"] = ImageProxy(str(tmp_path), allow_private=True, secret="s3cret")
+    client = app.test_client()
+    hits = site.hits
+    assert client.get(f"/api/img?url={base}/red.png").status_code == 403
+    assert client.get(f"/api/img?url={base}/red.png&sig={url_signature(base + '/red.png', 'guess')}").status_code == 403
+    assert site.hits == hits
+
+    app.extensions["image_proxy"] = ImageProxy(str(tmp_path), allow_private=True)
+    assert client.get(f"/api/img?url={base}/red.png&sig={url_signature(base + '/red.png', '')}").status_code == 404
+
+def test_helpers():
+    """Format sniffing and URL rewriting."""
+    assert sniff_image_type(RED) == "png"
+    assert sniff_image_type(b"<svg") is None
+    assert proxied_url("https://x.example/a b.jpg", "https://api.example", "k") == \
+        "https://api.example/api/img?url=https%3A%2F%2Fx.example%2Fa%20b.jpg&sig=" + url_signature("https://x.example/a b.jpg", "k")
+    assert proxied_url("https://x.example/a.jpg", "", "k") == "https://x.example/a.jpg"
+    assert proxied_url("https://x.example/a.jpg", "https://api.example", "") == "https://x.example/a.jpg"
@@ -0,0 +1,97 @@
+import threading
+import time
+import pytest
+import metrics
+from llm_invoker import LLMInvoker, LLMTimeoutError
+
+class FakeLLM:
+    """Fake chat model with injected latency: one delay per call, in order."""
+    def __init__(self, delays, fail_first=False):
+        self.delays = list(delays)
+        self.fail_first = fail_first
+        self.calls = 0
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+
+    def invoke(self, messages, **kwargs):
+        with self._lock:
+            call = self.calls
+            self.calls += 1
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        try:
+            time.sleep(self.delays[min(call, len(self.delays) - 1)])
+            if self.fail_first and call == 0:
+                raise RuntimeError("upstream error")
+            return f"reply {call}"
+        finally:
+            with self._lock:
+                self.active -= 1
+
+def _warm(invoker, seconds, samples):
+    """Seed the latency window so hedging has a p95 to work with."""
+    for _ in range(samples):
+        invoker._record(seconds, "default")
+
+def test_concurrency_is_capped():
+    """No more than max_concurrency calls reach the model at once."""
+    invoker = LLMInvoker(max_concurrency=2, timeout=5)
+    llm = FakeLLM([0.05])
+    threads = [threading.Thread(target=invoker.invoke, args=(llm, ["hi"])) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert llm.calls == 6
+    assert llm.max_active == 2
+
+def test_timeout_raises():
+    """A call slower than the timeout raises LLMTimeoutError."""
+    invoker = LLMInvoker(max_concurrency=2, timeout=0.05)
+    with pytest.raises(LLMTimeoutError):
+        invoker.invoke(FakeLLM([0.5]), ["hi"])
+
+def test_hedge_wins_over_slow_primary():
+    """A slow primary is hedged after the p95 delay and the hedge answers first."""
+    metrics.reset()
+    invoker = LLMInvoker(max_concurrency=4, timeout=2, hedge=True, hedge_min_samples=5, hedge_min_delay=0.01)
+    _warm(invoker, 0.02, 10)
+    llm = FakeLLM([0.5, 0.01])
+    start = time.perf_counter()
+    assert invoker.invoke(llm, ["hi"]) == "reply 1"
+    assert time.perf_counter() - start < 0.3
+    assert metrics.get_counter("llm.hedges", route="default") == 1
+    assert metrics.get_counter("llm.hedge_wins", route="default") == 1
+
+def test_fast_primary_is_not_hedged():
+    """Calls that finish before the hedge delay send a single request."""
+    metrics.reset()
+    invoker = LLMInvoker(max_concurrency=4, timeout=2, hedge=True, hedge_min_samples=5, hedge_min_delay=0.01)
+    _warm(invoker, 0.2, 10)
+    llm = FakeLLM([0.01])
+    assert invoker.invoke(llm, ["hi"]) == "reply 0"
+    assert llm.calls == 1
+    assert metrics.get_counter("llm.hedges", route="default") == 0
+
+def test_hedge_covers_primary_error():
+    """If the primary fails, a running hedge can still answer."""
+    invoker = LLMInvoker(max_concurrency=4, timeout=2, hedge=True, hedge_min_samples=5, hedge_min_delay=0.01)
+    _warm(invoker, 0.02, 10)
+    assert invoker.invoke(FakeLLM([0.1, 0.15], fail_first=True), ["hi"]) == "reply 1"
+
+def test_errors_propagate_without_hedging():
+    invoker = LLMInvoker(max_concurrency=1, timeout=1)
+    with pytest.raises(RuntimeError):
+        invoker.invoke(FakeLLM([0.0], fail_first=True), ["hi"])
+    # The slot was released despite the error
+    assert invoker.invoke(FakeLLM([0.0]), ["hi"]) == "reply 0"
+
+if __name__ == "__main__":
+    test_concurrency_is_capped()
+    test_timeout_raises()
+    test_hedge_wins_over_slow_primary()
+    test_fast_primary_is_not_hedged()
+    test_hedge_covers_primary_error()
+    test_errors_propagate_without_hedging()
+    print("All LLM invoker tests passed!")
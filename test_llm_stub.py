@@ -0,0 +1,54 @@
+import asyncio
+import random
+import threading
+import pytest
+import openai
+from aiohttp import web
+from langchain_core.messages import HumanMessage, SystemMessage
+from langchain_openai import ChatOpenAI
+from llm_stub import STAGE_REPLIES, StubConfig, create_stub_app, parse_latency
+
+def serve(config):
+    """Run the stub on a free port in a background thread; returns its base URL."""
+    loop = asyncio.new_event_loop()
+    runner = web.AppRunner(create_stub_app(config))
+    loop.run_until_complete(runner.setup())
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    loop.run_until_complete(site.start())
+    port = site._server.sockets[0].getsockname()[1]
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    return f"http://127.0.0.1:{port}/v1"
+
+def client(base_url, **kwargs):
+    return ChatOpenAI(model="gpt-4", openai_api_key="stub", base_url=base_url, max_retries=0, **kwargs)
+
+def test_parse_latency():
+    rng = random.Random(1)
+    assert parse_latency("fixed:0.25")(rng) == 0.25
+    assert 0.1 <= parse_latency("uniform:0.1:0.2")(rng) <= 0.2
+    assert parse_latency("lognormal:0.5:0.3")(rng) > 0
+    with pytest.raises(ValueError):
+        parse_latency("gaussian:1")
+
+def test_stage_aware_replies_streamed_and_not():
+    base_url = serve(StubConfig(latency="fixed:0", tokens_per_second=0, seed=1))
+    prompt = [SystemMessage(content="Current Planning Stage: collecting_info"), HumanMessage(content="hi")]
+    reply = client(base_url).invoke(prompt)
+    assert reply.content in STAGE_REPLIES["collecting_info"]
+    assert reply.usage_metadata["input_tokens"] > 0
+    streamed = "".join(chunk.content for chunk in client(base_url).stream(prompt))
+    assert streamed in STAGE_REPLIES["collecting_info"]
+
+def test_tool_calls_and_injected_failures():
+    base_url = serve(StubConfig(latency="fixed:0", tokens_per_second=0, tool_call_rate=1.0, requests_per_minute=2))
+    model = client(base_url).bind_tools([{"type": "function", "function": {
+        "name": "get_wedding_images", "parameters": {"type": "object", "properties": {"category": {"type": "string"}}}}}])
+    reply = model.invoke([HumanMessage(content="show me venues")])
+    assert reply.tool_calls[0]["name"] == "get_wedding_images"
+    client(base_url).invoke([HumanMessage(content="hi")])
+    with pytest.raises(openai.RateLimitError):
+        client(base_url).invoke([HumanMessage(content="hi")])
+
+    base_url = serve(StubConfig(latency="fixed:0", error_rate=1.0))
+    with pytest.raises(openai.InternalServerError):
+        client(base_url).invoke([HumanMessage(content="hi")])
@@ -0,0 +1,67 @@
+import asyncio
+import random
+import threading
+from werkzeug.serving import make_server
+import sayyes_agent
+from app import create_app
+from loadgen import VirtualUser, percentile, run
+from waitlist import WaitlistSink
+
+class EchoLLM:
+    def invoke(self, messages, **kwargs):
+        from langchain_core.messages import AIMessage
+        return AIMessage(content="Lovely!")
+
+def test_percentile():
+    samples = [float(i) for i in range(1, 101)]
+    assert percentile(samples, 50) == 50
+    assert percentile(samples, 99) == 99
+    assert percentile([3.0], 90) == 3.0
+
+def test_virtual_users_walk_the_whole_funnel(monkeypatch, tmp_path):
+    """Every stage gets traffic and users who join reach email capture."""
+    monkeypatch.setattr(sayyes_agent, "llm", EchoLLM())
+    monkeypatch.setattr(sayyes_agent, "_waitlist", WaitlistSink(str(tmp_path / "waitlist.db")))
+    stages = set()
+    for seed in range(5):
+        user = VirtualUser.create(random.Random(seed), join_rate=0.5)
+        while not user.done:
+            stages.add(user.stage)
+            response = sayyes_agent.process_message(user.next_message(), user.state)
+            user.update({"state": response["state"]})
+        assert user.state["email_collected"], seed
+    assert stages == {"initial", "collecting_info", "sneak_peek", "exploring", "final_cta"}
+
+def test_run_reports_per_stage(monkeypatch, tmp_path):
+    monkeypatch.setattr(sayyes_agent, "llm", EchoLLM())
+    monkeypatch.setattr(sayyes_agent, "_waitlist", WaitlistSink(str(tmp_path / "waitlist.db")))
+    monkeypatch.setenv("CHAT_RATE_PER_CLIENT", "1000")
+    monkeypatch.setenv("CHAT_BURST_PER_CLIENT", "1000")
+    server = make_server("127.0.0.1", 0, create_app(start_reloader=False), threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        summary = asyncio.run(run(f"http://127.0.0.1:{server.server_port}", rps=40, duration=1.5,
+                                  think=0.01, seed=1))
+    finally:
+        server.shutdown()
+    assert summary["requests"] >= 40
+    assert summary["error_rate"] == 0
+    assert {"initial", "collecting_info", "sneak_peek"} <= set(summary["stages"])
+    assert summary["stages"]["initial"]["p50_ms"] > 0
+
+def test_thinking_users_do_not_hold_connections(monkeypatch, tmp_path):
+    """Think time neither counts against --connections nor extends the elapsed time."""
+    monkeypatch.setattr(sayyes_agent, "llm", EchoLLM())
+    monkeypatch.setattr(sayyes_agent, "_waitlist", WaitlistSink(str(tmp_path / "waitlist.db")))
+    monkeypatch.setenv("CHAT_RATE_PER_CLIENT", "1000")
+    monkeypatch.setenv("CHAT_BURST_PER_CLIENT", "1000")
+    server = make_server("127.0.0.1", 0, create_app(start_reloader=False), threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        summary = asyncio.run(run(f"http://127.0.0.1:{server.server_port}", rps=20, duration=1.0,
+                                  connections=4, think=30, seed=1))
+    finally:
+        server.shutdown()
+    assert summary["requests"] >= 15
+    assert summary["late_ticks"] <= 5
+    assert summary["elapsed_s"] < 5
@@ -0,0 +1,86 @@
+import os
+import tracemalloc
+import app as app_module
+import sayyes_agent
+from app import create_app
+from chat_log import ChatLog
+from langchain_core.messages import AIMessage, HumanMessage
+from memory_diagnostics import MemoryDiagnostics, deep_size, object_counts, session_memory
+
+def test_deep_size_follows_containers_and_slots():
+    messages = [HumanMessage(content=f"{i}" + "x" * 1000) for i in range(10)]
+    assert deep_size(messages) > 10 * 1000
+    assert deep_size(ChatLog(messages)) > deep_size(messages)
+    assert deep_size({"a": "b" * 500}) > 500
+
+def test_object_counts_and_session_memory():
+    keep = [HumanMessage(content="hi"), AIMessage(content="hello"), ChatLog()]
+    counts = object_counts()
+    assert counts["messages"]["HumanMessage"] >= 1 and counts["messages"]["AIMessage"] >= 1
+    assert counts["chat_logs"] >= 1
+    report = session_memory({"a": {"s1": "x" * 1000, "s2": "y" * 3000}, "b": {"s1": [1, 2, 3]}})
+    assert report["sessions"] == 2
+    assert report["stores"]["a"]["sessions"] == 2
+    assert 2000 < report["avg_bytes_per_session"] < 3000
+    assert keep
+
+def test_snapshot_diff_finds_the_growing_site():
+    diagnostics = MemoryDiagnostics()
+    try:
+        first = diagnostics.take_snapshot()["id"]
+        leak = [bytearray(1024) for _ in range(2000)]
+        second = diagnostics.take_snapshot()["id"]
+        diff = diagnostics.diff(first, second)
+        assert diff["size_diff"] > 2000 * 1024
+        assert "test_memory_diagnostics.py" in diff["top"][0]["site"]
+        assert isinstance(diagnostics.diff(first, second, "traceback")["top"][0]["site"], list)
+        assert leak
+    finally:
+        diagnostics.stop()
+    assert diagnostics.status() == {"tracing": False, "snapshots": [], "traced_bytes": 0, "peak_bytes": 0}
+
+def test_interval_diff_takes_both_snapshots_in_one_request(monkeypatch):
+    """?interval= diffs within the serving worker and leaves tracing as it found it."""
+    client = create_app(start_reloader=False).test_client()
+    monkeypatch.setattr(app_module, "ADMIN_TOKEN", "secret")
+    headers = {"Authorization": "Bearer secret"}
+    response = client.get("/api/admin/memory/diff?interval=0.05&limit=3", headers=headers)
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body["pid"] == os.getpid()
+    assert body["interval"] == 0.05
+    assert len(body["top"]) <= 3
+    assert not tracemalloc.is_tracing()
+    assert client.get("/api/admin/memory/diff?interval=3600", headers=headers).status_code == 400
+    assert client.get("/api/admin/memory/diff?interval=1&group=bogus", headers=headers).status_code == 400
+
+class EchoLLM:
+    def invoke(self, messages, **kwargs):
+        return AIMessage(content="Hello!")
+
+def test_admin_endpoints_require_the_token(monkeypatch):
+    monkeypatch.setattr(sayyes_agent, "llm", EchoLLM())
+    client = create_app(start_reloader=False).test_client()
+    monkeypatch.setattr(app_module, "ADMIN_TOKEN", None)
+    assert client.get("/api/admin/memory").status_code == 404
+
+    monkeypatch.setattr(app_module, "ADMIN_TOKEN", "secret")
+    assert client.get("/api/admin/memory").status_code == 401
+    assert client.get("/api/admin/memory", headers={"Authorization": "Bearer nope"}).status_code == 401
+    headers = {"Authorization": "Bearer secret"}
+    sayyes_agent.process_message("hi", {"session_id": "mem-1"})
+    report = client.get("/api/admin/memory?collect=1", headers=headers).get_json()
+    assert report["rss_bytes"] > 0
+    assert report["objects"]["compiled_graphs"] <= 1
+    assert "token_totals" in report["sessions"]["stores"]
+
+    try:
+        assert client.post("/api/admin/memory/snapshots", headers=headers).status_code == 201
+        assert client.post("/api/admin/memory/snapshots", headers=headers).status_code == 201
+        diff = client.get("/api/admin/memory/diff?limit=5", headers=headers).get_json()
+        assert len(diff["top"]) <= 5
+        assert client.get("/api/admin/memory/diff?from=99&to=1", headers=headers).status_code == 404
+        assert client.get("/api/admin/memory/diff?group=bogus", headers=headers).status_code == 400
+        assert client.get("/api/admin/memory/diff?from=99&to=1", headers=headers).get_json()["pid"] == os.getpid()
+    finally:
+        assert client.delete("/api/admin/memory/snapshots", headers=headers).get_json()["tracing"] is False
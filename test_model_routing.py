@@ -0,0 +1,68 @@
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+from langchain_openai import ChatOpenAI
+import metrics
+import sayyes_agent
+from model_routing import DEFAULT_ROUTE, ModelRouter, Route, parse_routes
+
+def test_route_lookup_order():
+    router = ModelRouter({
+        ("collecting_info", "*"): Route("slot", "gpt-4o-mini"),
+        ("*", "tool_followup"): Route("summary", "gpt-4o-mini"),
+        ("exploring", "tool_followup"): Route("browse_summary", "gpt-4o"),
+    })
+    assert router.route("collecting_info", "reply").name == "slot"
+    assert router.route("collecting_info", "tool_followup").name == "slot"
+    assert router.route("exploring", "tool_followup").name == "browse_summary"
+    assert router.route("sneak_peek", "tool_followup").name == "summary"
+    assert router.route("exploring", "reply") is DEFAULT_ROUTE
+    assert ModelRouter(enabled=False).route("collecting_info") is DEFAULT_ROUTE
+
+def test_routes_from_env(monkeypatch):
+    monkeypatch.setenv("MODEL_ROUTES", '{"exploring/reply": {"model": "gpt-4o", "max_tokens": 300}, "*/tool_followup": null}')
+    router = ModelRouter.from_env()
+    assert router.route("exploring", "reply") == Route("exploring_reply", "gpt-4o", 0.7, 300)
+    assert router.route("sneak_peek", "tool_followup") is DEFAULT_ROUTE
+    assert router.route("collecting_info").model == "gpt-4o-mini"
+    with pytest.raises(KeyError):
+        parse_routes('{"initial": {"temperature": 0.2}}')
+
+def test_each_route_gets_its_own_client():
+    base = ChatOpenAI(model="gpt-4", openai_api_key="test")
+    router = ModelRouter()
+    slot = router.route("collecting_info")
+    client = router.client(base, slot)
+    assert client is not base and client is router.client(base, slot)
+    assert (client.model_name, client.temperature, client.max_tokens) == ("gpt-4o-mini", 0.5, 150)
+    assert base.model_name == "gpt-4"
+    assert router.client(base, DEFAULT_ROUTE) is base
+
+def test_cost_is_recorded_per_route():
+    metrics.reset()
+    ModelRouter().record(Route("slot", "gpt-4o-mini"), {"prompt": 1000, "completion": 100})
+    assert metrics.get_counter("llm.route.prompt_tokens", route="slot") == 1000
+    assert metrics.get_counter("llm.route.cost_usd", route="slot") == pytest.approx((1000 * 0.15 + 100 * 0.6) / 1e6)
+
+class FailingModel:
+    def invoke(self, messages, **kwargs):
+        raise RuntimeError("model not found")
+
+def test_failed_route_falls_back_to_default(monkeypatch):
+    """A failing routed model is retried once on the default model."""
+    metrics.reset()
+    default = AIMessage(content="from default")
+
+    class DefaultModel:
+        def invoke(self, messages, **kwargs):
+            return default
+
+    router = ModelRouter({("collecting_info", "*"): Route("slot", "gpt-4o-mini")})
+    monkeypatch.setattr(sayyes_agent, "llm", DefaultModel())
+    monkeypatch.setattr(sayyes_agent, "model_router", router)
+    monkeypatch.setattr(router, "client", lambda base, route: FailingModel() if route.name == "slot" else base)
+
+    replies = sayyes_agent.call_model([SystemMessage(content="system"), HumanMessage(content="hi")], "s1", "collecting_info")
+    assert replies == [default]
+    assert metrics.get_counter("llm.route.fallbacks", route="slot") == 1
+    assert metrics.get_counter("llm.errors", route="slot") == 1
+    assert metrics.get_counter("llm.calls", route="default") == 1
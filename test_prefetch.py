@@ -0,0 +1,70 @@
+import threading
+import metrics
+import sayyes_agent
+from prefetch import Prefetcher
+
+def test_hit_returns_prefetched_result():
+    """A matching take gets the built result and counts as a hit."""
+    metrics.reset()
+    prefetcher = Prefetcher(name="test")
+    prefetcher.schedule("s1", ("dresses", 1), lambda: {"items": [1, 2]})
+    assert prefetcher.take("s1", ("dresses", 1)) == {"items": [1, 2]}
+    assert metrics.get_counter("test.hits") == 1
+    # The slot is consumed
+    assert prefetcher.take("s1", ("dresses", 1)) is None
+    assert metrics.snapshot()["gauges"]["test.hit_rate"] == 0.5
+
+def test_wasted_prefetches_are_counted():
+    """Stale keys, superseded slots and evictions are all wasted work."""
+    metrics.reset()
+    prefetcher = Prefetcher(max_sessions=2, name="test")
+    prefetcher.schedule("s1", "a", lambda: 1)
+    assert prefetcher.take("s1", "b") is None
+    assert metrics.get_counter("test.wasted", reason="stale") == 1
+
+    prefetcher.schedule("s1", "a", lambda: 1)
+    prefetcher.schedule("s1", "b", lambda: 2)
+    assert metrics.get_counter("test.wasted", reason="superseded") == 1
+
+    prefetcher.schedule("s2", "a", lambda: 1)
+    prefetcher.schedule("s3", "a", lambda: 1)
+    assert metrics.get_counter("test.wasted", reason="evicted") == 1
+    assert len(prefetcher) == 2
+
+def test_take_waits_for_build_in_progress():
+    """A build still running when the next turn arrives is waited for."""
+    prefetcher = Prefetcher(wait_timeout=2, name="test")
+    started = threading.Event()
+    release = threading.Event()
+
+    def build():
+        started.set()
+        release.wait()
+        return "ready"
+
+    prefetcher.schedule("s1", "a", build)
+    started.wait()
+    threading.Timer(0.1, release.set).start()
+    assert prefetcher.take("s1", "a") == "ready"
+
+def test_sneak_peek_serves_next_carousel_from_prefetch(monkeypatch):
+    """Showing venues prefetches dresses, and the dresses turn uses it."""
+    metrics.reset()
+    monkeypatch.setattr(sayyes_agent, "carousel_prefetcher", Prefetcher(name="carousel.prefetch"))
+    state = {"session_id": "abc", "style_preference": "modern", "seen_venues": False}
+
+    venues = sayyes_agent.sneak_peek_carousel(state)
+    assert venues["title"] == "Top Wedding Venues"
+    assert venues["items"] and all("wedding%20venues" in item["image"] for item in venues["items"])
+
+    state["seen_venues"] = True
+    dresses = sayyes_agent.sneak_peek_carousel(state)
+    assert dresses["title"] == "Stunning Wedding Dresses"
+    assert metrics.get_counter("carousel.prefetch.hits") == 1
+
+    # Changed preferences make the prefetched hairstyles stale
+    state["seen_dresses"] = True
+    state["budget"] = "luxury"
+    hairstyles = sayyes_agent.sneak_peek_carousel(state)
+    assert hairstyles["title"] == "Beautiful Wedding Hairstyles"
+    assert metrics.get_counter("carousel.prefetch.wasted", reason="stale") == 1
@@ -0,0 +1,53 @@
+import os
+import time
+import sayyes_agent
+from app import create_app
+from profiling import SamplingProfiler
+
+class SlowLLM:
+    def invoke(self, messages, **kwargs):
+        from langchain_core.messages import AIMessage
+        time.sleep(0.05)
+        return AIMessage(content="Hello!")
+
+def busy_wait(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+def test_sampler_attributes_time_to_frames():
+    profiler = SamplingProfiler(interval=0.001).start()
+    busy_wait(0.1)
+    profiler.stop()
+    assert sum(profiler.samples.values()) > 10
+    # Folded format: "outer;...;inner count"
+    stacks = [line.rsplit(" ", 1) for line in profiler.folded().splitlines()]
+    assert all(count.isdigit() for _, count in stacks)
+    assert any(stack.split(";")[-1].startswith("busy_wait (test_profiling.py:") for stack, _ in stacks)
+    assert any(frame.startswith("busy_wait") and own > 0 for frame, own, _ in profiler.top(50))
+
+def test_disabled_adds_no_hooks(monkeypatch):
+    monkeypatch.delenv("PROFILE_TOKEN", raising=False)
+    monkeypatch.delenv("PROFILE_SAMPLE_RATE", raising=False)
+    app = create_app(start_reloader=False)
+    assert "profiling" not in app.extensions
+    assert not app.before_request_funcs
+
+def test_admin_header_profiles_the_request(monkeypatch, tmp_path):
+    monkeypatch.setenv("PROFILE_TOKEN", "secret")
+    monkeypatch.setenv("PROFILE_DIR", str(tmp_path))
+    monkeypatch.setenv("PROFILE_INTERVAL_MS", "1")
+    monkeypatch.setattr(sayyes_agent, "llm", SlowLLM())
+    client = create_app(start_reloader=False).test_client()
+    body = {"messages": [{"role": "user", "content": "hi"}], "session_id": "abc"}
+
+    assert "X-Profile-Id" not in client.post("/api/chat", json=body).headers
+    assert "X-Profile-Id" not in client.post("/api/chat", json=body, headers={"X-Profile": "wrong"}).headers
+    response = client.post("/api/chat", json=body, headers={"X-Profile": "secret"})
+    profile_id = response.headers["X-Profile-Id"]
+    assert "-abc-initial-" in profile_id
+    assert sorted(os.listdir(tmp_path)) == [profile_id + ".folded", profile_id + ".txt"]
+    summary = (tmp_path / (profile_id + ".txt")).read_text()
+    assert summary.startswith("path=/api/chat session=abc stage=initial status=200")
+    # The slow model call is where the time went (waiting in LLMInvoker)
+    assert "  invoke (llm_invoker.py:" in summary.splitlines()[4]
@@ -0,0 +1,88 @@
+from ranking import CatalogRanker
+from image_utils import get_images_by_category
+
+CATALOG = [
+    {"title": "Rustic Barn", "tags": ["Rustic", "Outdoor"], "price": "$", "location": "Austin, TX", "capacity": 200},
+    {"title": "Modern Loft", "tags": ["Modern", "Urban"], "price": "$$$$", "location": "New York, NY", "capacity": 80},
+    {"title": "Bohemian Garden", "tags": ["Garden"], "price": "$$", "location": "Austin, TX"},
+    {"title": "Classic Ballroom", "tags": ["Classic", "Indoor"], "price": "$$$", "location": "Dallas, TX", "capacity": 300},
+]
+
+def test_style_and_location_rank_first():
+    """Items matching style and location should come first."""
+    ranker = CatalogRanker(CATALOG)
+    top = ranker.top_k({"style_preference": "rustic", "location_preference": "Austin"}, 2)
+    assert [item["title"] for item in top] == ["Rustic Barn", "Bohemian Garden"]
+
+def test_style_keyword_from_title_and_alias():
+    """Style keywords in titles count as tags and 'bohemian' matches 'boho'."""
+    ranker = CatalogRanker(CATALOG)
+    top = ranker.top_k({"style_preference": "boho"}, 1)
+    assert top[0]["title"] == "Bohemian Garden"
+
+def test_budget_and_guest_count():
+    """Budget pulls matching price tiers up and small venues drop for big weddings."""
+    ranker = CatalogRanker(CATALOG)
+    top = ranker.top_k({"budget": "luxury"}, 1)
+    assert top[0]["title"] == "Modern Loft"
+
+    top = ranker.top_k({"budget": "luxury", "guest_count": 150}, 1)
+    assert top[0]["title"] == "Classic Ballroom"
+
+def test_ties_keep_catalog_order():
+    """Without preferences the catalog order is preserved."""
+    ranker = CatalogRanker(CATALOG)
+    assert ranker.top_k({}, 10) == CATALOG
+
+def test_filter_mask_matches_filters():
+    """Vectorized filters keep only matching items."""
+    ranker = CatalogRanker(CATALOG)
+    mask = ranker.filter_mask(location="tx")
+    top = ranker.top_k({"budget": "small"}, 10, mask)
+    assert [item["title"] for item in top] == ["Rustic Barn", "Bohemian Garden", "Classic Ballroom"]
+
+    mask = ranker.filter_mask(style="vintage")
+    assert ranker.top_k({"budget": "small"}, 10, mask) == []
+
+def test_get_images_by_category_with_preferences():
+    """Ranked results go through get_images_by_category with a limit."""
+    result = get_images_by_category("venues", preferences={"style_preference": "rustic"}, limit=2)
+    items = result["carousel"]["items"]
+    assert len(items) == 2
+    assert "Rustic" in items[0]["title"]
+
+def test_category_rankers_survive_concurrent_version_swaps():
+    """Threads dropping stale rankers at once neither fail nor keep old versions."""
+    import threading
+    import image_utils
+    from image_utils import get_category_ranker
+
+    # Start from a catalog version change: only older rankers are cached
+    image_utils._RANKERS.clear()
+    for i in range(50):
+        image_utils._RANKERS[(f"old{i}", "venues")] = None
+    errors = []
+
+    def rank():
+        try:
+            assert get_category_ranker("venues") is get_category_ranker("venues")
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=rank) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert not [key for key in image_utils._RANKERS if key[0].startswith("old")]
+
+if __name__ == "__main__":
+    test_style_and_location_rank_first()
+    test_style_keyword_from_title_and_alias()
+    test_budget_and_guest_count()
+    test_ties_keep_catalog_order()
+    test_filter_mask_matches_filters()
+    test_get_images_by_category_with_preferences()
+    test_category_rankers_survive_concurrent_version_swaps()
+    print("All ranking tests passed!")
@@ -0,0 +1,115 @@
+import sqlite3
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.checkpoint.base import empty_checkpoint
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+import metrics
+import sayyes_agent
+from chat_log import ChatLog
+from session_store import SQLiteSessionSaver
+
+def _config(thread_id="t1"):
+    return {"configurable": {"thread_id": thread_id, "checkpoint_ns": ""}}
+
+def _checkpoint(history):
+    checkpoint = empty_checkpoint()
+    checkpoint["channel_values"] = {"chat_history": history, "planning_stage": "initial"}
+    return checkpoint
+
+def _rows(path):
+    connection = sqlite3.connect(path)
+    try:
+        return connection.execute("SELECT thread_id, checkpoint_id FROM checkpoints").fetchall()
+    finally:
+        connection.close()
+
+def test_put_get_roundtrip_through_disk(tmp_path):
+    """A checkpoint written by one saver is rehydrated by another on the same file."""
+    path = str(tmp_path / "sessions.db")
+    saver = SQLiteSessionSaver(path, flush_interval=60)
+    history = ChatLog([HumanMessage(content="hi"), AIMessage(content="hello")])
+    checkpoint = _checkpoint(history)
+    saver.put(_config(), checkpoint, {"step": 1}, {})
+    assert saver.get_tuple(_config()).checkpoint["id"] == checkpoint["id"]
+    saver.close()
+
+    metrics.reset()
+    restored = SQLiteSessionSaver(path).get_tuple(_config())
+    assert restored.checkpoint["channel_values"]["chat_history"] == list(history)
+    assert restored.metadata["step"] == 1
+    assert metrics.get_counter("sessions.rehydrations") == 1
+
+def test_puts_coalesce_into_one_row(tmp_path):
+    path = str(tmp_path / "sessions.db")
+    saver = SQLiteSessionSaver(path, flush_interval=60)
+    metrics.reset()
+    history = ChatLog()
+    for i in range(10):
+        history = history + [HumanMessage(content=f"message {i}")]
+        last = _checkpoint(history)
+        saver.put(_config(), last, {"step": i}, {})
+    assert _rows(path) == []
+    assert saver.flush() == 1
+    assert _rows(path) == [("t1", last["id"])]
+    assert metrics.get_counter("sessions.coalesced") == 9
+    saver.close()
+
+def test_older_checkpoint_never_overwrites_newer(tmp_path):
+    """Two workers flushing the same session: the newest checkpoint wins."""
+    path = str(tmp_path / "sessions.db")
+    older, newer = _checkpoint(ChatLog(["a"])), _checkpoint(ChatLog(["a", "b"]))
+    first = SQLiteSessionSaver(path, flush_interval=60, revalidate_after=0)
+    second = SQLiteSessionSaver(path, flush_interval=60)
+    second.put(_config(), newer, {}, {})
+    second.flush()
+    first.put(_config(), older, {}, {})
+    first.flush()
+    assert _rows(path) == [("t1", newer["id"])]
+    # The stale worker picks up the newer state on its next read
+    assert first.get_tuple(_config()).checkpoint["id"] == newer["id"]
+    first.close()
+    second.close()
+
+def test_cache_hits_skip_disk_unless_revalidation_is_due(tmp_path):
+    path = str(tmp_path / "sessions.db")
+    older, newer = _checkpoint(ChatLog(["a"])), _checkpoint(ChatLog(["a", "b"]))
+    trusting = SQLiteSessionSaver(path, flush_interval=60)
+    revalidating = SQLiteSessionSaver(path, flush_interval=60, revalidate_after=60)
+    for saver in (trusting, revalidating):
+        saver.put(_config(), older, {}, {})
+        saver.flush()
+    other = SQLiteSessionSaver(path, flush_interval=60)
+    other.put(_config(), newer, {}, {})
+    other.flush()
+
+    metrics.reset()
+    assert trusting.get_tuple(_config()).checkpoint["id"] == older["id"]
+    assert revalidating.get_tuple(_config()).checkpoint["id"] == older["id"]
+    assert metrics.get_counter("sessions.revalidations") == 0
+    # Once the entry is older than revalidate_after, the next read checks the disk
+    revalidating.revalidate_after = 0
+    assert revalidating.get_tuple(_config()).checkpoint["id"] == newer["id"]
+    assert metrics.get_counter("sessions.revalidations") == 1
+    assert metrics.get_counter("sessions.rehydrations") == 1
+    for saver in (trusting, revalidating, other):
+        saver.close()
+
+def test_process_message_resumes_by_session_id(tmp_path, monkeypatch):
+    """With SESSION_DB set, a client only needs to send its session_id."""
+    monkeypatch.setenv("SESSION_DB", str(tmp_path / "sessions.db"))
+    monkeypatch.setattr(sayyes_agent, "_session_saver", None)
+    monkeypatch.setattr(sayyes_agent, "_graph", None)
+    monkeypatch.setattr(sayyes_agent, "llm", FakeListChatModel(responses=["Hello!", "Lovely."]))
+
+    first = sayyes_agent.process_message("hi", {"session_id": "s1"})
+    second = sayyes_agent.process_message("we love modern weddings", {"session_id": "s1"})
+    assert len(second["state"]["chat_history"]) == len(first["state"]["chat_history"]) + 2
+    assert second["state"]["style_preference"] == "modern"
+
+    # A fresh process (new saver, new graph) picks the session up from disk
+    sayyes_agent.get_session_saver().close()
+    monkeypatch.setattr(sayyes_agent, "_session_saver", None)
+    monkeypatch.setattr(sayyes_agent, "_graph", None)
+    restored = sayyes_agent.load_session("s1")
+    assert restored["chat_history"] == second["state"]["chat_history"]
+    assert restored["style_preference"] == "modern"
+    sayyes_agent.get_session_saver().close()
@@ -0,0 +1,58 @@
+import metrics
+import sayyes_agent
+from sayyes_agent import process_message
+from waitlist import WaitlistSink
+from stage_script import scripted_turn, FINAL_CTA_TEXT, SOFT_CTA_TEXT, EMAIL_PROMPT_TEXT, EMAIL_CONFIRMATION_TEXT
+
+class CountingLLM:
+    """Fake chat model that counts calls."""
+    def __init__(self):
+        self.calls = 0
+
+    def invoke(self, messages, **kwargs):
+        from langchain_core.messages import AIMessage
+        self.calls += 1
+        return AIMessage(content=f"model reply {self.calls}")
+
+def test_scripted_turns():
+    """Each templated branch of the funnel is recognised, free-form turns are not."""
+    assert scripted_turn({"planning_stage": "sneak_peek"}, "show me").name == "sneak_peek_carousel"
+    assert scripted_turn({"planning_stage": "sneak_peek", "seen_venues": True, "seen_dresses": True,
+                          "seen_hairstyles": True}, "show me") is None
+    assert scripted_turn({"planning_stage": "exploring"}, "more please").reply == SOFT_CTA_TEXT
+    assert scripted_turn({"planning_stage": "exploring", "soft_cta_shown": True}, "more please") is None
+    assert scripted_turn({"planning_stage": "exploring", "soft_cta_shown": True}, "continue planning").reply == FINAL_CTA_TEXT
+    assert scripted_turn({"planning_stage": "final_cta", "cta_shown": True}, "join the waitlist").name == "email_prompt"
+    assert scripted_turn({"planning_stage": "final_cta", "cta_shown": True}, "me@example.com").name == "email_confirmation"
+    assert scripted_turn({"planning_stage": "final_cta", "cta_shown": True}, "tell me more") is None
+    assert scripted_turn({"planning_stage": "final_cta", "cta_shown": True}, "me@example") is None
+    assert scripted_turn({"planning_stage": "initial"}, "modern wedding") is None
+    assert scripted_turn({"planning_stage": "exploring"}, None) is None
+
+def test_funnel_skips_llm_for_scripted_turns(monkeypatch, tmp_path):
+    """The CTAs and email capture come from the script without calling the model."""
+    llm = CountingLLM()
+    monkeypatch.setattr(sayyes_agent, "llm", llm)
+    waitlist = WaitlistSink(str(tmp_path / "waitlist.db"))
+    monkeypatch.setattr(sayyes_agent, "_waitlist", waitlist)
+    metrics.reset()
+
+    state = None
+    texts = []
+    for message in ["hi", "modern wedding", "100 guests", "show me", "next", "more",
+                    "continue planning", "join the waitlist", "me@example.com"]:
+        response = process_message(message, state)
+        state = response["state"]
+        texts.append(response["text"])
+
+    assert texts[5] == SOFT_CTA_TEXT
+    assert texts[6] == FINAL_CTA_TEXT
+    assert texts[7] == EMAIL_PROMPT_TEXT
+    assert texts[8] == EMAIL_CONFIRMATION_TEXT
+    assert state["email_collected"] is True
+    assert [row[:2] for row in waitlist.rows()] == [("me@example.com", state["session_id"])]
+    # Only the three information-gathering turns needed the model
+    assert llm.calls == 3
+    assert metrics.get_counter("agent.llm_avoided", stage="sneak_peek", turn="sneak_peek_carousel") == 3
+    assert metrics.get_counter("agent.llm_avoided", stage="final_cta", turn="email_confirmation") == 1
+    assert metrics.get_counter("agent.llm_calls", stage="initial") == 2
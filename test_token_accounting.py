@@ -0,0 +1,72 @@
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage
+from langchain_core.language_models.fake_chat_models import FakeMessagesListChatModel
+import metrics
+import sayyes_agent
+from token_accounting import TokenAccountant, count_message_tokens, count_tokens
+
+def test_counts_grow_with_text():
+    short = count_tokens([HumanMessage(content="hi")])
+    long = count_tokens([HumanMessage(content="hi " * 200)])
+    assert 0 < short < long
+    assert count_message_tokens(HumanMessage(content="")) > 0
+
+def test_fit_keeps_system_prompt_and_recent_history():
+    """Oldest history is dropped first; the system prompt and latest message stay."""
+    metrics.reset()
+    history = [HumanMessage(content=f"message {i} " + "word " * 50) for i in range(20)]
+    messages = [SystemMessage(content="system")] + history
+    accountant = TokenAccountant(prompt_limit=300)
+    fitted = accountant.fit(messages)
+    assert fitted[0].content == "system"
+    assert fitted[-1] is history[-1]
+    assert 2 <= len(fitted) < len(messages)
+    assert count_tokens(fitted) <= 300
+    assert metrics.get_counter("tokens.compactions") == 1
+    # Under the limit nothing changes
+    assert TokenAccountant(prompt_limit=100000).fit(messages) == messages
+
+def test_fit_does_not_start_with_a_tool_result():
+    messages = [SystemMessage(content="system"), HumanMessage(content="word " * 100),
+                ToolMessage(content="result " * 20, tool_call_id="a"), HumanMessage(content="thanks")]
+    fitted = TokenAccountant(prompt_limit=60).fit(messages)
+    assert [m.type for m in fitted] == ["system", "human"]
+
+def test_fit_keeps_a_tool_call_with_its_results():
+    """A large tool result under a tight budget keeps the AIMessage that called it."""
+    call = AIMessage(content="", tool_calls=[{"name": "tavily_search", "args": {"query": "venues"}, "id": "a"}])
+    result = ToolMessage(content="result " * 200, tool_call_id="a")
+    messages = [SystemMessage(content="system"), HumanMessage(content="word " * 50),
+                AIMessage(content="word " * 50), HumanMessage(content="find venues"), call, result]
+    fitted = TokenAccountant(prompt_limit=count_tokens([messages[0], result])).fit(messages)
+    assert fitted == [messages[0], call, result]
+
+    # With room to spare, older messages are dropped before the pair
+    limit = count_tokens([messages[0], messages[3], call, result])
+    assert TokenAccountant(prompt_limit=limit).fit(messages) == [messages[0], messages[3], call, result]
+
+def test_reported_usage_is_recorded_per_session_and_stage():
+    metrics.reset()
+    accountant = TokenAccountant()
+    response = AIMessage(content="hello", usage_metadata={"input_tokens": 120, "output_tokens": 30, "total_tokens": 150})
+    accountant.record("s1", "initial", [HumanMessage(content="hi")], response)
+    accountant.record("s1", "initial", [HumanMessage(content="hi")], response)
+    assert accountant.session_totals("s1") == {"prompt": 240, "completion": 60, "calls": 2, "total": 300}
+    assert metrics.get_counter("tokens.prompt", stage="initial") == 240
+    assert metrics.get_counter("tokens.completion", stage="initial") == 60
+
+def test_session_over_budget_short_circuits(monkeypatch):
+    """Once a session reaches its ceiling the model is no longer called."""
+    metrics.reset()
+    model = FakeMessagesListChatModel(responses=[
+        AIMessage(content="first", usage_metadata={"input_tokens": 90, "output_tokens": 20, "total_tokens": 110}),
+        AIMessage(content="second"),
+    ])
+    monkeypatch.setattr(sayyes_agent, "llm", model)
+    monkeypatch.setattr(sayyes_agent, "token_accountant", TokenAccountant(session_limit=100))
+    prompt = [SystemMessage(content="system"), HumanMessage(content="hi")]
+
+    assert sayyes_agent.call_model(prompt, "s1", "exploring")[-1].content == "first"
+    assert sayyes_agent.call_model(prompt, "s1", "exploring")[-1].content == sayyes_agent.TOKEN_LIMIT_REPLY
+    assert metrics.get_counter("tokens.short_circuits", stage="exploring") == 1
+    # Other sessions are unaffected
+    assert sayyes_agent.call_model(prompt, "s2", "exploring")[-1].content == "second"
@@ -0,0 +1,97 @@
+import time
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from langchain_core.language_models.fake_chat_models import FakeMessagesListChatModel
+from langchain_core.tools import tool
+import metrics
+import sayyes_agent
+from tool_executor import ToolExecutor
+
+@tool
+def slow_search(query: str) -> str:
+    """Search slowly."""
+    time.sleep(0.3)
+    return f"results for {query}"
+
+@tool
+def slow_images(category: str) -> dict:
+    """Fetch images slowly."""
+    time.sleep(0.3)
+    return {"carousel": {"title": category, "items": []}}
+
+@tool
+def stuck(url: str) -> str:
+    """Never finishes in time."""
+    time.sleep(1)
+    return "too late"
+
+@tool
+def broken(url: str) -> str:
+    """Always fails."""
+    raise RuntimeError("boom")
+
+TOOLS = {t.name: t for t in [slow_search, slow_images, stuck, broken]}
+
+def test_calls_run_concurrently():
+    """Two 0.3s tools finish in about 0.3s, with results in call order."""
+    executor = ToolExecutor(max_workers=4, timeout=5)
+    start = time.perf_counter()
+    results = executor.run([
+        {"name": "slow_search", "args": {"query": "venues"}, "id": "a"},
+        {"name": "slow_images", "args": {"category": "dresses"}, "id": "b"},
+    ], TOOLS)
+    elapsed = time.perf_counter() - start
+    assert elapsed < 0.5
+    assert [r.tool_call_id for r in results] == ["a", "b"]
+    assert results[0].content == "results for venues"
+    assert '"title": "dresses"' in results[1].content
+
+def test_timeouts_and_errors_become_tool_messages():
+    """Slow, failing and unknown tools each get an error result; the others still succeed."""
+    metrics.reset()
+    executor = ToolExecutor(max_workers=4, timeout=0.5)
+    results = executor.run([
+        {"name": "stuck", "args": {"url": "x"}, "id": "a"},
+        {"name": "broken", "args": {"url": "x"}, "id": "b"},
+        {"name": "missing", "args": {}, "id": "c"},
+        {"name": "slow_search", "args": {"query": "cakes"}, "id": "d"},
+    ], TOOLS)
+    assert "did not finish" in results[0].content
+    assert "boom" in results[1].content
+    assert "unknown tool" in results[2].content
+    assert results[3].content == "results for cakes"
+    assert metrics.get_counter("tool.timeouts", tool="stuck") == 1
+    assert metrics.get_counter("tool.errors", tool="broken") == 1
+
+def test_queued_calls_get_their_own_timeout():
+    """With one pool thread, the second call's timeout starts when it runs, not when it was queued."""
+    executor = ToolExecutor(max_workers=1, timeout=0.5)
+    results = executor.run([
+        {"name": "slow_search", "args": {"query": "venues"}, "id": "a"},
+        {"name": "slow_search", "args": {"query": "cakes"}, "id": "b"},
+    ], TOOLS)
+    assert [r.content for r in results] == ["results for venues", "results for cakes"]
+
+def test_abandoned_calls_are_tracked_until_they_return():
+    metrics.reset()
+    executor = ToolExecutor(max_workers=2, timeout=0.2)
+    results = executor.run([{"name": "stuck", "args": {"url": "x"}, "id": "a"}], TOOLS)
+    assert "did not finish" in results[0].content
+    assert metrics.get_counter("tool.abandoned", tool="stuck") == 1
+    assert metrics.snapshot()["gauges"]["tool.abandoned_running"] == 1
+    time.sleep(1)
+    assert metrics.snapshot()["gauges"]["tool.abandoned_running"] == 0
+
+def test_call_model_runs_tools_and_returns_final_reply(monkeypatch):
+    """Tool results are fed back to the model, and its answer ends the turn."""
+    model = FakeMessagesListChatModel(responses=[
+        AIMessage(content="", tool_calls=[
+            {"name": "slow_search", "args": {"query": "venues"}, "id": "a"},
+            {"name": "slow_images", "args": {"category": "venues"}, "id": "b"},
+        ]),
+        AIMessage(content="Here's what I found!"),
+    ])
+    monkeypatch.setattr(sayyes_agent, "llm", model)
+    monkeypatch.setattr(sayyes_agent, "TOOLS_BY_NAME", TOOLS)
+    replies = sayyes_agent.call_model([HumanMessage(content="find venues")])
+    assert [type(r) for r in replies] == [AIMessage, ToolMessage, ToolMessage, AIMessage]
+    assert replies[-1].content == "Here's what I found!"
@@ -0,0 +1,80 @@
+import io
+import sqlite3
+import metrics
+from waitlist import BloomFilter, WaitlistSink, normalize_email
+
+def test_normalize_email():
+    assert normalize_email("Sure, it's Jane.Doe+wedding@Example.COM!") == "jane.doe+wedding@example.com"
+    assert normalize_email("me@example.com.") == "me@example.com"
+    for text in ["", "no address here", "me@example", "me@@example.com", "me@-example.com",
+                 "a" * 65 + "@example.com", "me@example.c0m"]:
+        assert normalize_email(text) is None, text
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = BloomFilter(capacity=1000, error_rate=0.01)
+    words = [f"user{i}@example.com" for i in range(1000)]
+    for word in words:
+        bloom.add(word)
+    assert all(word in bloom for word in words)
+    false_positives = sum(f"other{i}@example.com" in bloom for i in range(10000))
+    assert false_positives < 300
+
+def test_signups_are_buffered_and_deduplicated(tmp_path):
+    """add() only touches memory; the flush writes each address once."""
+    path = str(tmp_path / "waitlist.db")
+    sink = WaitlistSink(path, flush_interval=60)
+    metrics.reset()
+    assert sink.add("JANE@example.com", "s1") == "jane@example.com"
+    assert sink.add("my email is jane@example.com", "s2") == "jane@example.com"
+    assert sink.add("not an email", "s3") is None
+    sink.add("sam@example.com", "s4")
+    sink._load()  # the writer may not have created the table yet
+    connection = sqlite3.connect(path)
+    assert connection.execute("SELECT COUNT(*) FROM waitlist").fetchone()[0] == 0
+
+    assert sink.flush() == 2
+    assert [row[:2] for row in sink.rows()] == [("jane@example.com", "s1"), ("sam@example.com", "s4")]
+    assert metrics.get_counter("waitlist.signups") == 2
+    assert metrics.get_counter("waitlist.duplicates") == 1
+    assert metrics.get_counter("waitlist.invalid") == 1
+    sink.close()
+
+def test_existing_signups_survive_restart_and_export(tmp_path):
+    path = str(tmp_path / "waitlist.db")
+    first = WaitlistSink(path)
+    first.add("jane@example.com", "s1")
+    first.close()
+
+    metrics.reset()
+    second = WaitlistSink(path)
+    second.add("jane@example.com", "s2")
+    second.add("sam@example.com")
+    assert second.flush() == 1
+    assert metrics.get_counter("waitlist.duplicates") == 1
+    out = io.StringIO()
+    assert second.export(out) == 2
+    lines = out.getvalue().splitlines()
+    assert lines[0] == "email,session_id,created_at"
+    assert lines[1].startswith("jane@example.com,s1,")
+    assert lines[2].startswith("sam@example.com,,")
+    second.close()
+
+def test_repeats_are_checked_before_inserting(tmp_path):
+    """Construction does no disk I/O; known addresses never reach an INSERT."""
+    path = str(tmp_path / "waitlist.db")
+    sink = WaitlistSink(path, flush_interval=60)
+    assert not (tmp_path / "waitlist.db").exists()
+    sink.add("jane@example.com", "s1")
+    assert sink.flush() == 1
+
+    metrics.reset()
+    for _ in range(20):
+        sink.add("Jane@Example.com", "again")
+    assert sink._pending == [] and len(sink._maybe) == 20
+    connection = sink._connection()
+    changes = connection.total_changes
+    assert sink.flush() == 0
+    assert connection.total_changes == changes
+    assert metrics.get_counter("waitlist.duplicates") == 20
+    assert [row[:2] for row in sink.rows()] == [("jane@example.com", "s1")]
+    sink.close()
@@ -0,0 +1,191 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence
+
+import metrics
+
+# Per-message framing tokens in the OpenAI chat format, plus reply priming
+TOKENS_PER_MESSAGE = 3
+TOKENS_PER_REPLY = 3
+# Rough size of a token in English text when no tokenizer is available
+CHARS_PER_TOKEN = 4
+
+_encoding = None
+_encoding_lock = threading.Lock()
+_encoding_failed = False
+
+
+def _get_encoding(model: str):
+    """The tiktoken encoding for `model`, or None if tiktoken can't load it."""
+    global _encoding, _encoding_failed
+    if _encoding is None and not _encoding_failed:
+        with _encoding_lock:
+            if _encoding is None and not _encoding_failed:
+                try:
+                    import tiktoken
+                    try:
+                        _encoding = tiktoken.encoding_for_model(model)
+                    except KeyError:
+                        _encoding = tiktoken.get_encoding("cl100k_base")
+                except Exception as e:
+                    # Not installed, or its BPE file can't be downloaded
+                    print(f"tiktoken unavailable, estimating tokens from length: {e}")
+                    _encoding_failed = True
+    return _encoding
+
+
+def _text(message: Any) -> str:
+    content = getattr(message, "content", message)
+    if isinstance(content, list):
+        return " ".join(part.get("text", "") if isinstance(part, dict) else str(part) for part in content)
+    return str(content)
+
+
+def _is_tool_result(message: Any) -> bool:
+    return getattr(message, "type", None) == "tool"
+
+
+def count_message_tokens(message: Any, model: str = "gpt-4") -> int:
+    """Tokens one chat message takes in a prompt."""
+    text = _text(message)
+    encoding = _get_encoding(model)
+    if encoding is not None:
+        return TOKENS_PER_MESSAGE + len(encoding.encode(text))
+    return TOKENS_PER_MESSAGE + (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def count_tokens(messages: Sequence[Any], model: str = "gpt-4") -> int:
+    """Prompt tokens for a list of chat messages."""
+    return sum(count_message_tokens(message, model) for message in messages) + TOKENS_PER_REPLY
+
+
+def reported_usage(response: Any) -> Optional[Dict[str, int]]:
+    """Prompt and completion tokens reported by the provider, if the response carries them."""
+    usage = getattr(response, "usage_metadata", None)
+    if usage:
+        return {"prompt": usage.get("input_tokens", 0), "completion": usage.get("output_tokens", 0)}
+    usage = (getattr(response, "response_metadata", None) or {}).get("token_usage")
+    if usage:
+        return {"prompt": usage.get("prompt_tokens", 0), "completion": usage.get("completion_tokens", 0)}
+    return None
+
+
+class TokenAccountant:
+    """
+    Counts LLM tokens per session and per stage and enforces ceilings.
+
+    - `fit` trims the oldest history so a prompt stays under `prompt_limit`.
+    - `over_budget` tells the agent to stop calling the model for a session
+      that has used `session_limit` tokens.
+    - `record` adds the provider's reported usage (or the local estimate when
+      none is reported) to the session and per-stage totals.
+
+    Totals live in the worker process, bounded to `max_sessions` sessions.
+    """
+
+    def __init__(self, session_limit: int = 100000, prompt_limit: int = 6000, max_sessions: int = 10000,
+                 model: str = "gpt-4"):
+        self.session_limit = session_limit
+        self.prompt_limit = prompt_limit
+        self.max_sessions = max_sessions
+        self.model = model
+        self._sessions: "OrderedDict[str, Dict[str, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "TokenAccountant":
+        """Build an accountant from *_TOKEN_LIMIT environment variables (0 disables a limit)."""
+        return cls(
+            session_limit=int(os.environ.get("SESSION_TOKEN_LIMIT", 100000)),
+            prompt_limit=int(os.environ.get("PROMPT_TOKEN_LIMIT", 6000)),
+        )
+
+    def fit(self, messages: List[Any]) -> List[Any]:
+        """
+        Compact a prompt to `prompt_limit` tokens.
+
+        Keeps the first message (the system prompt) and the longest run of
+        recent messages that fits; the latest message is always kept. A
+        tool-calling AIMessage and the ToolMessages answering it are kept or
+        dropped together, since the API rejects a tool result without its call.
+        """
+        if not self.prompt_limit or len(messages) < 3:
+            return messages
+        sizes = [count_message_tokens(message, self.model) for message in messages]
+        # (first index, tokens) of each unit that is kept or dropped as a whole
+        units: List[List[int]] = []
+        for i in range(1, len(messages)):
+            if _is_tool_result(messages[i]) and units and getattr(messages[units[-1][0]], "tool_calls", None):
+                units[-1][1] += sizes[i]
+            else:
+                units.append([i, sizes[i]])
+        budget = self.prompt_limit - TOKENS_PER_REPLY - sizes[0]
+        keep = len(units) - 1
+        budget -= units[keep][1]
+        while keep > 0 and units[keep - 1][1] <= budget:
+            keep -= 1
+            budget -= units[keep][1]
+        # A tool result whose call was already gone can't open the window
+        while keep < len(units) - 1 and _is_tool_result(messages[units[keep][0]]):
+            keep += 1
+        start = units[keep][0]
+        if start == 1:
+            return messages
+        metrics.increment("tokens.compactions")
+        metrics.increment("tokens.compacted_messages", start - 1)
+        return [messages[0]] + messages[start:]
+
+    def over_budget(self, session_id: Optional[str]) -> bool:
+        """True once the session has used its token ceiling."""
+        if not self.session_limit or not session_id:
+            return False
+        return self.session_totals(session_id)["total"] >= self.session_limit
+
+    def record(self, session_id: Optional[str], stage: str, prompt: Sequence[Any], response: Any) -> Dict[str, int]:
+        """
+        Account for one model call.
+
+        Args:
+            session_id: Session the call belongs to
+            stage: Planning stage, for per-stage totals
+            prompt: Messages that were sent
+            response: The model's reply
+
+        Returns:
+            The tokens used by this call ({"prompt", "completion"})
+        """
+        estimate = count_tokens(prompt, self.model)
+        usage = reported_usage(response)
+        if usage is not None:
+            metrics.observe("tokens.estimate_error", estimate - usage["prompt"])
+        else:
+            usage = {"prompt": estimate, "completion": count_message_tokens(response, self.model)}
+            metrics.increment("tokens.estimated_calls", stage=stage)
+
+        metrics.increment("tokens.prompt", usage["prompt"], stage=stage)
+        metrics.increment("tokens.completion", usage["completion"], stage=stage)
+        if session_id:
+            with self._lock:
+                totals = self._sessions.pop(session_id, None) or {"prompt": 0, "completion": 0, "calls": 0}
+                totals["prompt"] += usage["prompt"]
+                totals["completion"] += usage["completion"]
+                totals["calls"] += 1
+                self._sessions[session_id] = totals
+                if len(self._sessions) > self.max_sessions:
+                    self._sessions.popitem(last=False)
+                tracked = len(self._sessions)
+            metrics.set_gauge("tokens.sessions", tracked)
+        return usage
+
+    def session_totals(self, session_id: Optional[str]) -> Dict[str, int]:
+        """Running totals for a session: prompt, completion, total and calls."""
+        with self._lock:
+            totals = dict(self._sessions.get(session_id) or {"prompt": 0, "completion": 0, "calls": 0})
+        totals["total"] = totals["prompt"] + totals["completion"]
+        return totals
+
+    def sessions_snapshot(self) -> Dict[str, Dict[str, int]]:
+        """Per-session totals, for memory diagnostics."""
+        with self._lock:
+            return dict(self._sessions)
@@ -0,0 +1,131 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Any, Dict, List, Sequence
+
+from langchain_core.messages import ToolMessage
+
+import metrics
+
+
+class _Started(threading.Event):
+    """Set by the pool thread when a call leaves the queue; `at` is when it started."""
+
+    at = 0.0
+
+    def mark(self):
+        self.at = time.monotonic()
+        self.set()
+
+
+class ToolExecutor:
+    """
+    Runs the tool calls from one model response concurrently.
+
+    Calls are independent, so they are submitted together to a bounded thread
+    pool and a multi-tool turn takes about as long as its slowest tool. Each
+    call has its own timeout, counted from when it starts running; a call
+    still queued after `timeout` is cancelled. A call that fails or times out
+    becomes an error ToolMessage, so the model still gets one result per call
+    and can recover.
+
+    A running thread can't be stopped, so a timed-out call keeps its pool
+    thread until the tool returns. Tools pass their own timeouts down to the
+    network, and abandoned calls are counted (`tool.abandoned`) and tracked
+    while they run (`tool.abandoned_running`).
+    """
+
+    def __init__(self, max_workers: int = 4, timeout: float = 15.0):
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tool")
+        self._lock = threading.Lock()
+        self._abandoned = 0
+
+    @classmethod
+    def from_env(cls) -> "ToolExecutor":
+        """Build an executor from TOOL_* environment variables."""
+        return cls(
+            max_workers=int(os.environ.get("TOOL_MAX_WORKERS", 4)),
+            timeout=float(os.environ.get("TOOL_TIMEOUT", 15)),
+        )
+
+    def _call(self, tool: Any, args: Dict, started: _Started) -> Any:
+        started.mark()
+        start = time.perf_counter()
+        try:
+            return tool.invoke(args)
+        finally:
+            metrics.observe("tool.latency", time.perf_counter() - start, tool=tool.name)
+
+    def _result(self, future: Future, started: _Started) -> Any:
+        """Wait for a call's result, allowing `timeout` seconds from when it started."""
+        if not started.wait(self.timeout) and future.cancel():
+            raise FutureTimeoutError()
+        # Either running or just picked up by a pool thread, which marks it first
+        started.wait()
+        return future.result(timeout=max(0.0, started.at + self.timeout - time.monotonic()))
+
+    def _abandon(self, future: Future, name: str):
+        """Track a timed-out call that is still holding a pool thread."""
+        metrics.increment("tool.abandoned", tool=name)
+        print(f"Tool {name} timed out after {self.timeout}s and is still running")
+        with self._lock:
+            self._abandoned += 1
+            metrics.set_gauge("tool.abandoned_running", self._abandoned)
+        future.add_done_callback(self._release)
+
+    def _release(self, future: Future):
+        with self._lock:
+            self._abandoned -= 1
+            metrics.set_gauge("tool.abandoned_running", self._abandoned)
+
+    def run(self, tool_calls: Sequence[Dict], tools: Dict[str, Any]) -> List[ToolMessage]:
+        """
+        Execute tool calls and return their results in call order.
+
+        Args:
+            tool_calls: The `tool_calls` of an AIMessage ({"name", "args", "id"})
+            tools: Tools by name
+
+        Returns:
+            One ToolMessage per call
+        """
+        start = time.perf_counter()
+        futures = {}
+        for call in tool_calls:
+            tool = tools.get(call["name"])
+            metrics.increment("tool.calls", tool=call["name"])
+            if tool is not None:
+                started = _Started()
+                future = self._executor.submit(self._call, tool, call.get("args") or {}, started)
+                futures[call["id"]] = (future, started)
+
+        results = []
+        for call in tool_calls:
+            name = call["name"]
+            job = futures.get(call["id"])
+            if job is None:
+                metrics.increment("tool.errors", tool=name)
+                content = f"Error: unknown tool {name}"
+            else:
+                future, started = job
+                try:
+                    output = self._result(future, started)
+                    content = output if isinstance(output, str) else json.dumps(output)
+                except FutureTimeoutError:
+                    metrics.increment("tool.timeouts", tool=name)
+                    if future.cancelled():
+                        content = f"Error: {name} could not start within {self.timeout}s, the tool pool is busy"
+                    else:
+                        self._abandon(future, name)
+                        content = f"Error: {name} did not finish within {self.timeout}s"
+                except Exception as e:
+                    metrics.increment("tool.errors", tool=name)
+                    content = f"Error: {name} failed: {e}"
+            results.append(ToolMessage(content=content, tool_call_id=call["id"], name=name))
+
+        metrics.observe("tool.batch_latency", time.perf_counter() - start)
+        return results
@@ -0,0 +1,334 @@
+"""
+Waitlist email capture.
+
+Addresses collected in the final CTA are validated, de-duplicated and
+appended to SQLite by a background writer, so the chat turn never waits on
+disk. Export the list with:
+    python waitlist.py export waitlist.csv
+"""
+import argparse
+import atexit
+import csv
+import hashlib
+import math
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from typing import IO, Iterator, List, Optional, Tuple
+
+import metrics
+
+# Practical subset of RFC 5321: dot-atom local part, LDH domain labels, alphabetic TLD
+EMAIL_PATTERN = re.compile(
+    r"(?<![\w.+-])"
+    r"([a-z0-9!#$%&'*+/=?^_`{|}~-]+(?:\.[a-z0-9!#$%&'*+/=?^_`{|}~-]+)*"
+    r"@(?:[a-z0-9](?:[a-z0-9-]{0,61}[a-z0-9])?\.)+[a-z]{2,63})"
+    r"(?![\w-])",
+    re.IGNORECASE,
+)
+MAX_EMAIL_LENGTH = 254
+MAX_LOCAL_LENGTH = 64
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS waitlist (
+    email TEXT NOT NULL,
+    session_id TEXT,
+    created_at REAL NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS waitlist_email ON waitlist (email);
+"""
+INSERT = "INSERT OR IGNORE INTO waitlist (email, session_id, created_at) VALUES (?, ?, ?)"
+
+# Rows fetched per round trip when loading or exporting
+EXPORT_CHUNK = 1000
+
+
+def normalize_email(text: str) -> Optional[str]:
+    """
+    First valid email address in `text`, normalized, or None.
+
+    Addresses are lowercased: mailbox names are case-insensitive at every
+    provider the waitlist will realistically see, and this is what makes
+    "Jane@Example.com" and "jane@example.com" one signup.
+    """
+    if not text or "@" not in text:
+        return None
+    for match in EMAIL_PATTERN.finditer(text.strip()):
+        email = match.group(1).rstrip(".").lower()
+        local = email.rsplit("@", 1)[0]
+        if len(email) <= MAX_EMAIL_LENGTH and len(local) <= MAX_LOCAL_LENGTH:
+            return email
+    return None
+
+
+class BloomFilter:
+    """
+    Fixed-size Bloom filter over strings.
+
+    Sized for `capacity` items at `error_rate` false positives; "not present"
+    answers are always right.
+    """
+
+    def __init__(self, capacity: int = 100000, error_rate: float = 0.01):
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item: str) -> Iterator[int]:
+        # Double hashing: k positions from one 128-bit digest
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.hashes):
+            yield (first + i * second) % self.size
+
+    def add(self, item: str) -> None:
+        for position in self._positions(item):
+            self._bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item: str) -> bool:
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+class WaitlistSink:
+    """
+    Buffered, de-duplicated store for waitlist signups.
+
+    - `add` validates the address and checks a Bloom filter of every address
+      seen. It only touches memory: signups go onto a buffer that a
+      background thread commits to SQLite every `flush_interval` seconds.
+    - Addresses the filter has never seen are inserted directly. Probable
+      repeats (and everything queued before the filter is loaded) are
+      looked up in the unique index first and only the missing ones are
+      inserted, so repeats cost one read and a false positive never loses
+      a signup.
+    - The schema and the filter are loaded by the writer thread, so the
+      first signup doesn't wait on disk either.
+    - `export` streams every signup, oldest first.
+    """
+
+    def __init__(self, path: str, flush_interval: float = 1.0, max_batch: int = 500,
+                 capacity: int = 100000, error_rate: float = 0.01):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.capacity = capacity
+        self.error_rate = error_rate
+        # Filled from disk by _load(); None until then
+        self.seen: Optional[BloomFilter] = None
+        self._pending: List[Tuple[str, Optional[str], float]] = []
+        self._maybe: List[Tuple[str, Optional[str], float]] = []
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._wake = threading.Condition(self._lock)
+        self._local = threading.local()
+        self._writer: Optional[threading.Thread] = None
+        self._writer_pid: Optional[int] = None
+        self._closed = False
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        atexit.register(self.close)
+
+    @classmethod
+    def from_env(cls) -> "WaitlistSink":
+        """Build a sink from WAITLIST_* environment variables."""
+        return cls(
+            os.environ.get("WAITLIST_DB", "waitlist.db"),
+            flush_interval=float(os.environ.get("WAITLIST_FLUSH_INTERVAL", 1.0)),
+            capacity=int(os.environ.get("WAITLIST_CAPACITY", 100000)),
+        )
+
+    def _connection(self) -> sqlite3.Connection:
+        """Connection for the current thread (and process)."""
+        connection = getattr(self._local, "connection", None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=30)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def _load(self):
+        """Create the schema and fill the Bloom filter with every stored address, once."""
+        with self._load_lock:
+            if self.seen is not None:
+                return
+            connection = self._connection()
+            connection.executescript(SCHEMA)
+            count = connection.execute("SELECT COUNT(*) FROM waitlist").fetchone()[0]
+            seen = BloomFilter(max(self.capacity, 2 * count), self.error_rate)
+            cursor = connection.execute("SELECT email FROM waitlist")
+            while True:
+                rows = cursor.fetchmany(EXPORT_CHUNK)
+                if not rows:
+                    break
+                for (email,) in rows:
+                    seen.add(email)
+            with self._lock:
+                self.seen = seen
+
+    def _ensure_writer(self):
+        """Start the writer in this process (threads don't survive fork); call with the lock held."""
+        if self._writer_pid != os.getpid() or not self._writer.is_alive():
+            self._writer = threading.Thread(target=self._run_writer, name="waitlist-writer", daemon=True)
+            self._writer_pid = os.getpid()
+            self._writer.start()
+
+    def _run_writer(self):
+        try:
+            self._load()
+        except sqlite3.Error as e:
+            # flush() retries the load
+            print(f"Waitlist load failed, will retry: {e}")
+        while True:
+            with self._wake:
+                if not self._closed and len(self._pending) + len(self._maybe) < self.max_batch:
+                    self._wake.wait(self.flush_interval)
+                closed = self._closed
+            self.flush()
+            if closed:
+                return
+
+    def add(self, text: str, session_id: Optional[str] = None) -> Optional[str]:
+        """
+        Queue a signup.
+
+        Args:
+            text: An email address, or a message containing one
+            session_id: Session the signup came from
+
+        Returns:
+            The normalized address, or None if `text` holds no valid address
+        """
+        email = normalize_email(text)
+        if email is None:
+            metrics.increment("waitlist.invalid")
+            return None
+        with self._wake:
+            if self.seen is not None and email not in self.seen:
+                self.seen.add(email)
+                metrics.increment("waitlist.signups")
+                self._pending.append((email, session_id, time.time()))
+            else:
+                # Probably a repeat: the writer checks the unique index before inserting
+                self._maybe.append((email, session_id, time.time()))
+            metrics.set_gauge("waitlist.pending", len(self._pending) + len(self._maybe))
+            if self._closed:
+                return email
+            self._ensure_writer()
+            if len(self._pending) + len(self._maybe) >= self.max_batch:
+                self._wake.notify()
+        return email
+
+    def _missing(self, connection: sqlite3.Connection, maybe: List[Tuple[str, Optional[str], float]]):
+        """The entries of `maybe` whose address isn't stored yet."""
+        emails = sorted({email for email, _, _ in maybe})
+        stored = set()
+        # Stay under SQLite's bound-parameter limit
+        for start in range(0, len(emails), 500):
+            chunk = emails[start:start + 500]
+            query = f"SELECT email FROM waitlist WHERE email IN ({','.join('?' * len(chunk))})"
+            stored.update(email for (email,) in connection.execute(query, chunk))
+        return [entry for entry in maybe if entry[0] not in stored]
+
+    def flush(self) -> int:
+        """Commit buffered signups now. Returns the number of new rows."""
+        with self._lock:
+            batch, self._pending = self._pending, []
+            maybe, self._maybe = self._maybe, []
+            metrics.set_gauge("waitlist.pending", 0)
+        if not batch and not maybe:
+            return 0
+        try:
+            self._load()
+            connection = self._connection()
+            with connection:
+                before = connection.total_changes
+                if batch:
+                    connection.executemany(INSERT, batch)
+                inserted = connection.total_changes - before
+                # After the batch, so an address queued twice is found stored
+                missing = self._missing(connection, maybe) if maybe else []
+                if missing:
+                    connection.executemany(INSERT, missing)
+                recovered = connection.total_changes - before - inserted
+        except sqlite3.Error as e:
+            print(f"Waitlist flush failed, will retry: {e}")
+            metrics.increment("waitlist.flush_errors")
+            with self._lock:
+                self._pending[:0] = batch
+                self._maybe[:0] = maybe
+            return 0
+        if maybe:
+            with self._lock:
+                for email, _, _ in missing:
+                    self.seen.add(email)
+            metrics.increment("waitlist.signups", recovered)
+            metrics.increment("waitlist.duplicates", len(maybe) - recovered)
+        metrics.increment("waitlist.flushes")
+        metrics.increment("waitlist.rows_written", inserted + recovered)
+        return inserted + recovered
+
+    def close(self):
+        """Stop the writer after a final flush."""
+        with self._wake:
+            if self._closed:
+                return
+            self._closed = True
+            writer = self._writer if self._writer_pid == os.getpid() else None
+            self._wake.notify()
+        if writer is not None and writer.is_alive():
+            writer.join(timeout=10)
+        self.flush()
+
+    def __len__(self) -> int:
+        """Signups on disk (pending ones are flushed first)."""
+        self.flush()
+        self._load()
+        return self._connection().execute("SELECT COUNT(*) FROM waitlist").fetchone()[0]
+
+    def rows(self) -> Iterator[Tuple[str, Optional[str], float]]:
+        """Every signup as (email, session_id, created_at), oldest first."""
+        self.flush()
+        self._load()
+        cursor = self._connection().execute(
+            "SELECT email, session_id, created_at FROM waitlist ORDER BY created_at, rowid"
+        )
+        while True:
+            rows = cursor.fetchmany(EXPORT_CHUNK)
+            if not rows:
+                return
+            yield from rows
+
+    def export(self, out: IO[str]) -> int:
+        """Write every signup to `out` as CSV. Returns the number of rows."""
+        writer = csv.writer(out)
+        writer.writerow(["email", "session_id", "created_at"])
+        count = 0
+        for email, session_id, created_at in self.rows():
+            writer.writerow([email, session_id or "",
+                             time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(created_at))])
+            count += 1
+        return count
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage the waitlist")
+    parser.add_argument("command", choices=["export", "count"])
+    parser.add_argument("output", nargs="?", default="-", help="CSV file for export (default: stdout)")
+    args = parser.parse_args()
+
+    sink = WaitlistSink.from_env()
+    if args.command == "count":
+        print(len(sink))
+    elif args.output == "-":
+        sink.export(sys.stdout)
+    else:
+        with open(args.output, "w", newline="") as out:
+            exported = sink.export(out)
+        print(f"Exported {exported} signups to {args.output}")